@@ -0,0 +1,9 @@
+"""
+Бенчмарки читателей форматов.
+
+generators — детерминированные синтетические FASTA/FASTQ/SAM/VCF файлы;
+suites — замеры пропускной способности, пикового RSS и времени импорта;
+run — запуск наборов и отчёт о регрессиях относительно сохранённого baseline.
+
+Запуск: python -m benchmarks.run --size small
+"""
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности разбора SAM.
+
+Сравнивает последовательный Samreader.read() с параллельным
+Samreader.read_batches() для разного числа процессов.
+Запуск: python benchmarks/bench_sam_parallel.py [число_выравниваний]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.generators import write_sam
+from formats.sam import Samreader
+
+WORKERS = (1, 2, 4, 8, 16)
+
+
+def measure(label, func, records, size):
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    assert count == records, f"{label}: разобрано {count} из {records}"
+    print(f"{label:<24}{elapsed:>8.2f} s{records / elapsed:>14,.0f} rec/s"
+          f"{size / elapsed / 1e6:>10.1f} MB/s")
+    return elapsed
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sam')
+    write_sam(path, records)
+    size = os.path.getsize(path)
+    print(f"Файл: {records} выравниваний, {size / 1e6:.1f} MB, CPU: {os.cpu_count()}")
+    try:
+        measure("Samreader.read", lambda: sum(1 for _ in Samreader(path).read()), records, size)
+        for workers in WORKERS:
+            measure(f"read_batches({workers:>2})",
+                    lambda: sum(len(b) for b in Samreader(path).read_batches(workers=workers)),
+                    records, size)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк передачи пакетов между процессами: pickle против разделяемой памяти.
+
+Сравнивает Samreader.iter_batches(workers=N) с shared_memory=False и True,
+а также двухстадийный конвейер (разбор, затем фильтр в пуле процессов),
+где результаты первой стадии передаются второй через ordered_map или
+shared_map. Главный процесс читает только числовые колонки, как это
+обычно делают агрегирующие стадии.
+Запуск: python benchmarks/bench_shared_memory.py [число_выравниваний] [процессы]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.generators import write_sam
+from formats.parallel import ordered_map
+from formats.sam import Samreader
+from formats.sharedmem import shared_map
+
+
+def keep_mapped(batch):
+    return batch.select(batch['MAPQ'] >= 30)
+
+
+def read(path, workers, shared):
+    batches = Samreader(path).iter_batches(workers=workers, shared_memory=shared)
+    return sum(len(batch) for batch in batches if batch['POS'].size)
+
+
+def pipeline(path, workers, shared):
+    batches = Samreader(path).iter_batches(workers=workers, shared_memory=shared)
+    stage = shared_map if shared else ordered_map
+    return sum(len(kept) for kept in stage(keep_mapped, batches, workers))
+
+
+def measure(label, func):
+    """Печатает время и процессорное время главного процесса (его предел пропускной способности)."""
+    start, cpu = time.perf_counter(), time.process_time()
+    count = func()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    print(f"{label:<28}{elapsed:>8.2f} s{cpu:>8.2f} s CPU{count:>12,}")
+    return elapsed, cpu
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else min(4, os.cpu_count() or 1)
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sam')
+    write_sam(path, records)
+    print(f"Файл: {records} выравниваний, {os.path.getsize(path) / 1e6:.1f} MB, "
+          f"процессов: {workers}, CPU: {os.cpu_count()}")
+    try:
+        for name, func in (('iter_batches', read), ('конвейер', pipeline)):
+            pickled = measure(f"{name} (pickle)", lambda: func(path, workers, False))
+            shared = measure(f"{name} (shared_memory)", lambda: func(path, workers, True))
+            print(f"{'ускорение':<28}{pickled[0] / shared[0]:>8.2f}x"
+                  f"{pickled[1] / shared[1]:>8.2f}x")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Генераторы синтетических файлов для бенчмарков.
+
+Все генераторы детерминированы: одинаковые параметры и seed дают побайтно
+одинаковый файл. Последовательности берутся срезами из заранее созданного
+случайного пула, поэтому генерация больших файлов занимает секунды.
+"""
+
+import bz2
+import gzip
+import os
+import random
+from typing import Optional, Sequence, Tuple, Union
+
+POOL_SIZE = 1 << 20
+
+_OPENERS = {
+    None: open,
+    'gzip': gzip.open,
+    'bz2': bz2.open,
+}
+_SUFFIXES = {None: '', 'gzip': '.gz', 'bz2': '.bz2'}
+
+Length = Union[int, Tuple[int, int]]
+
+
+class _Pool:
+    """Случайный пул нуклеотидов и качеств, из которого режутся последовательности."""
+
+    def __init__(self, rng: random.Random, total: int, n_fraction: float = 0.0):
+        # Для маленьких файлов пул меньше, иначе его создание дольше записи файла
+        self.size = size = min(POOL_SIZE, max(1 << 16, total))
+        bases = rng.choices('ACGT', k=size)
+        if n_fraction:
+            # Серии N длиной 50-500, как в реальных сборках
+            position = 0
+            while True:
+                position += int(rng.expovariate(n_fraction / 275))
+                if position >= size:
+                    break
+                run = rng.randint(50, 500)
+                bases[position:position + run] = 'N' * len(bases[position:position + run])
+                position += run
+        self.bases = ''.join(bases)
+        # Качества Phred+33 от 2 до 40, ближе к высоким
+        scores = range(2, 41)
+        self.quals = ''.join(rng.choices([chr(33 + q) for q in scores],
+                                         weights=[q * q for q in scores], k=size))
+        self.rng = rng
+
+    def sequence(self, length: int) -> str:
+        parts = []
+        while length > 0:
+            size = min(length, self.size // 2)
+            start = self.rng.randrange(self.size - size + 1)
+            parts.append(self.bases[start:start + size])
+            length -= size
+        return ''.join(parts)
+
+    def quality(self, length: int) -> str:
+        start = self.rng.randrange(self.size - length + 1)
+        return self.quals[start:start + length]
+
+
+def _length(rng: random.Random, length: Length) -> int:
+    if isinstance(length, tuple):
+        return rng.randint(*length)
+    return length
+
+
+def _max_length(length: Length) -> int:
+    return length[1] if isinstance(length, tuple) else length
+
+
+def _open(path: str, compression: Optional[str]):
+    return _OPENERS[compression](path, 'wt')
+
+
+def write_fasta(path: str, records: int, length: Length = (100, 1000),
+                line_width: Union[int, Sequence[int]] = 60, n_fraction: float = 0.0,
+                lowercase: float = 0.0, compression: Optional[str] = None,
+                seed: int = 42) -> str:
+    """
+    Создает синтетический FASTA файл.
+
+    Args:
+        path: Путь к файлу
+        records: Количество записей
+        length: Длина записи или диапазон (min, max)
+        line_width: Ширина строки или набор ширин, выбираемых для каждой записи
+                    (0 — последовательность одной строкой)
+        n_fraction: Примерная доля N (сериями)
+        lowercase: Доля записей с soft-masked (строчными) участками
+        compression: None, 'gzip' или 'bz2'
+        seed: Зерно генератора
+
+    Returns:
+        path
+    """
+    rng = random.Random(seed)
+    pool = _Pool(rng, records * _max_length(length), n_fraction)
+    widths = (line_width,) if isinstance(line_width, int) else tuple(line_width)
+    with _open(path, compression) as f:
+        for i in range(records):
+            sequence = pool.sequence(_length(rng, length))
+            if lowercase and rng.random() < lowercase:
+                start = rng.randrange(len(sequence))
+                end = min(len(sequence), start + rng.randint(100, 5000))
+                sequence = sequence[:start] + sequence[start:end].lower() + sequence[end:]
+            width = rng.choice(widths)
+            f.write(f">seq{i} synthetic record {i}\n")
+            if width <= 0:
+                f.write(sequence + '\n')
+            else:
+                f.write('\n'.join(sequence[j:j + width]
+                                  for j in range(0, len(sequence), width)) + '\n')
+    return path
+
+
+def write_fastq(path: str, records: int, read_length: Length = 150,
+                compression: Optional[str] = None, seed: int = 42) -> str:
+    """
+    Создает синтетический FASTQ файл (Phred+33).
+
+    Args:
+        path: Путь к файлу
+        records: Количество ридов
+        read_length: Длина рида или диапазон (min, max)
+        compression: None, 'gzip' или 'bz2'
+        seed: Зерно генератора
+
+    Returns:
+        path
+    """
+    rng = random.Random(seed)
+    pool = _Pool(rng, records * _max_length(read_length))
+    with _open(path, compression) as f:
+        for i in range(records):
+            length = _length(rng, read_length)
+            f.write(f"@read{i}/1\n{pool.sequence(length)}\n+\n{pool.quality(length)}\n")
+    return path
+
+
+def write_sam(path: str, records: int, read_length: int = 100, references: int = 24,
+              reference_length: int = 100000000, compression: Optional[str] = None,
+              seed: int = 42) -> str:
+    """
+    Создает синтетический SAM файл с парными выравниваниями.
+
+    Около 3% ридов не выровнены, часть имеет soft clip и делеции; у всех есть
+    теги NM, AS и RG, у части — CB/UB.
+
+    Args:
+        path: Путь к файлу
+        records: Количество выравниваний
+        read_length: Длина рида
+        references: Количество референсов в @SQ
+        reference_length: Длина каждого референса
+        compression: None, 'gzip' или 'bz2'
+        seed: Зерно генератора
+
+    Returns:
+        path
+    """
+    rng = random.Random(seed)
+    pool = _Pool(rng, records * read_length)
+    cigars = (f"{read_length}M", f"5S{read_length - 5}M",
+              f"{read_length // 2}M2D{read_length - read_length // 2}M",
+              f"{read_length - 10}M10S")
+    with _open(path, compression) as f:
+        f.write("@HD\tVN:1.6\tSO:unsorted\n")
+        for ref in range(1, references + 1):
+            f.write(f"@SQ\tSN:chr{ref}\tLN:{reference_length}\n")
+        f.write("@RG\tID:rg1\tSM:sample1\n")
+        for i in range(records):
+            seq = pool.sequence(read_length)
+            qual = pool.quality(read_length)
+            tags = f"NM:i:{rng.randint(0, 5)}\tAS:i:{rng.randint(50, read_length)}\tRG:Z:rg1"
+            if rng.random() < 0.3:
+                tags += f"\tCB:Z:{pool.sequence(16)}-1\tUB:Z:{pool.sequence(10)}"
+            if rng.random() < 0.03:
+                f.write(f"read{i}\t4\t*\t0\t0\t*\t*\t0\t0\t{seq}\t{qual}\t{tags}\n")
+                continue
+            chrom = rng.randint(1, references)
+            pos = rng.randint(1, reference_length - 1000)
+            flag = rng.choice((99, 147, 83, 163))
+            mate = pos + rng.randint(100, 500)
+            tlen = mate - pos + read_length
+            f.write(f"read{i}\t{flag}\tchr{chrom}\t{pos}\t{rng.choice((0, 20, 60, 60, 60))}\t"
+                    f"{rng.choice(cigars)}\t=\t{mate}\t{tlen}\t{seq}\t{qual}\t{tags}\n")
+    return path
+
+
+def write_vcf(path: str, records: int, samples: int = 10, references: int = 24,
+              compression: Optional[str] = None, seed: int = 42) -> str:
+    """
+    Создает синтетический многосэмпловый VCF файл, отсортированный по позиции.
+
+    Args:
+        path: Путь к файлу
+        records: Количество вариантов
+        samples: Количество сэмплов (колонки GT:DP:GQ)
+        references: Количество хромосом
+        compression: None, 'gzip' или 'bz2'
+        seed: Зерно генератора
+
+    Returns:
+        path
+    """
+    rng = random.Random(seed)
+    pool = _Pool(rng, records * 8)
+    genotypes = ('0/0', '0/1', '1/1', './.', '0|1', '1|0')
+    with _open(path, compression) as f:
+        f.write("##fileformat=VCFv4.2\n")
+        for ref in range(1, references + 1):
+            f.write(f"##contig=<ID=chr{ref}>\n")
+        f.write('##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">\n'
+                '##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">\n'
+                '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+                '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+                '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">\n')
+        names = '\t'.join(f"sample{s}" for s in range(1, samples + 1))
+        f.write(f"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{names}\n")
+        for ref in range(1, references + 1):
+            pos = 0
+            # Варианты распределены по хромосомам поровну
+            count = records * ref // references - records * (ref - 1) // references
+            for _ in range(count):
+                pos += rng.randint(1, 2000)
+                ref_allele = pool.sequence(rng.choice((1, 1, 1, 2, 4)))
+                alt = pool.sequence(rng.choice((1, 1, 1, 3)))
+                if rng.random() < 0.1:
+                    alt += ',' + pool.sequence(1)
+                qual = '.' if rng.random() < 0.02 else f"{rng.uniform(1, 1000):.1f}"
+                calls = '\t'.join(f"{rng.choice(genotypes)}:{rng.randint(0, 60)}:{rng.randint(0, 99)}"
+                                  for _ in range(samples))
+                f.write(f"chr{ref}\t{pos}\t.\t{ref_allele}\t{alt}\t{qual}\tPASS\t"
+                        f"DP={rng.randint(10, 600)};AF={rng.random():.3f}\tGT:DP:GQ\t{calls}\n")
+    return path
+
+
+#: Размеры наборов данных: формат -> параметры генератора
+SIZES = {
+    'tiny': {
+        'fasta_small': {'records': 2000, 'length': (50, 500), 'line_width': (60, 70, 80)},
+        'fasta_large': {'records': 2, 'length': 200000, 'line_width': (60, 0), 'n_fraction': 0.02},
+        'fastq': {'records': 5000},
+        'sam': {'records': 5000},
+        'vcf': {'records': 2000, 'samples': 5},
+    },
+    'small': {
+        'fasta_small': {'records': 100000, 'length': (50, 500), 'line_width': (60, 70, 80)},
+        'fasta_large': {'records': 4, 'length': 5000000, 'line_width': (60, 0), 'n_fraction': 0.02},
+        'fastq': {'records': 200000},
+        'sam': {'records': 200000},
+        'vcf': {'records': 50000, 'samples': 10},
+    },
+    'large': {
+        'fasta_small': {'records': 2000000, 'length': (50, 500), 'line_width': (60, 70, 80)},
+        'fasta_large': {'records': 25, 'length': (10000000, 50000000), 'line_width': (60, 0),
+                        'n_fraction': 0.02},
+        'fastq': {'records': 5000000},
+        'sam': {'records': 5000000},
+        'vcf': {'records': 1000000, 'samples': 100},
+    },
+}
+
+_WRITERS = {
+    'fasta_small': write_fasta,
+    'fasta_large': write_fasta,
+    'fastq': write_fastq,
+    'sam': write_sam,
+    'vcf': write_vcf,
+}
+
+
+def dataset(name: str, size: str, directory: str, compression: Optional[str] = None,
+            seed: int = 42) -> str:
+    """
+    Возвращает путь к набору данных, создавая файл при первом обращении.
+
+    Файлы кэшируются в directory по имени, размеру, сжатию и seed.
+
+    Args:
+        name: Ключ из SIZES[size], например 'fastq' или 'fasta_large'
+        size: 'tiny', 'small' или 'large'
+        directory: Каталог для кэша файлов
+        compression: None, 'gzip' или 'bz2'
+        seed: Зерно генератора
+    """
+    extension = 'fasta' if name.startswith('fasta') else name
+    path = os.path.join(directory, f"{name}-{size}-{seed}.{extension}{_SUFFIXES[compression]}")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        partial_path = path + '.part'
+        _WRITERS[name](partial_path, compression=compression, seed=seed, **SIZES[size][name])
+        os.replace(partial_path, path)
+    return path
+
+
+def dataset_records(name: str, size: str) -> int:
+    """Количество записей в наборе данных."""
+    return SIZES[size][name]['records']
+
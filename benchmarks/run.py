@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Запуск бенчмарков и отчёт о регрессиях.
+
+Примеры:
+    python -m benchmarks.run --size small --save results.json
+    python -m benchmarks.run --size small --save-baseline
+    python -m benchmarks.run --size small --compare benchmarks/baseline-small.json
+
+Сравнение завершается с кодом 1, если хотя бы одна метрика ухудшилась
+больше порога. Baseline зависит от машины: сохраняйте его на той же машине,
+на которой запускаете сравнение.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .suites import run_startup, run_throughput
+
+#: Метрики, по которым ищутся регрессии (для всех меньше — лучше)
+METRICS = ('seconds', 'peak_rss_mb')
+
+
+def collect(size: str, directory: str, repeat: int, selected: str = None,
+            startup: bool = True) -> Dict:
+    """Выполняет все наборы и возвращает результаты с описанием окружения."""
+    results = run_throughput(size, directory, repeat, selected)
+    if startup:
+        results.update(run_startup(max(repeat, 5)))
+    return {
+        'meta': {
+            'size': size,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, time_threshold: float = 0.10,
+            rss_threshold: float = 0.10) -> Tuple[List[str], List[str]]:
+    """
+    Сравнивает результаты с baseline.
+
+    Args:
+        baseline: Сохранённые результаты
+        current: Новые результаты
+        time_threshold: Допустимое относительное замедление
+        rss_threshold: Допустимый относительный рост пикового RSS
+
+    Returns:
+        (строки отчёта, имена регрессировавших метрик)
+    """
+    thresholds = {'seconds': time_threshold, 'peak_rss_mb': rss_threshold}
+    lines = [f"{'замер':<44}{'метрика':<13}{'baseline':>11}{'сейчас':>11}{'изм.':>9}"]
+    regressions = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        old = baseline['results'].get(name)
+        new = current['results'].get(name)
+        if old is None or new is None:
+            lines.append(f"{name:<44}{'нет в baseline' if old is None else 'не измерен'}")
+            continue
+        for metric in METRICS:
+            if old.get(metric) is None or new.get(metric) is None:
+                continue
+            change = new[metric] / old[metric] - 1 if old[metric] else 0.0
+            mark = ''
+            if change > thresholds[metric]:
+                mark = '  РЕГРЕССИЯ'
+                regressions.append(f"{name}:{metric}")
+            lines.append(f"{name:<44}{metric:<13}{old[metric]:>11.4f}{new[metric]:>11.4f}"
+                         f"{change:>+9.1%}{mark}")
+    if baseline.get('meta', {}).get('size') != current.get('meta', {}).get('size'):
+        lines.append("Внимание: размеры наборов данных в baseline и сейчас различаются")
+    return lines, regressions
+
+
+def _format(value, spec: str) -> str:
+    return '' if value is None else format(value, spec)
+
+
+def _print_results(results: Dict) -> None:
+    print(f"{'замер':<44}{'время, с':>10}{'rec/s':>14}{'MB/s':>9}{'RSS, МБ':>10}")
+    for name, result in sorted(results['results'].items()):
+        print(f"{name:<44}{result['seconds']:>10.4f}"
+              f"{_format(result.get('records_per_second'), ',.0f'):>14}"
+              f"{_format(result.get('mb_per_second'), '.1f'):>9}"
+              f"{_format(result.get('peak_rss_mb'), '.1f'):>10}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки читателей форматов")
+    parser.add_argument('--size', default='small', choices=('tiny', 'small', 'large'))
+    parser.add_argument('--repeat', type=int, default=3, help="повторов каждого замера")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(),
+                                                           'formats-bench'),
+                        help="каталог кэша сгенерированных файлов")
+    parser.add_argument('--select', help="запускать только замеры, содержащие подстроку")
+    parser.add_argument('--no-startup', action='store_true', help="не замерять импорт")
+    parser.add_argument('--save', help="сохранить результаты в JSON")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="сохранить результаты как benchmarks/baseline-<size>.json")
+    parser.add_argument('--compare', help="JSON baseline для сравнения")
+    parser.add_argument('--time-threshold', type=float, default=0.10)
+    parser.add_argument('--rss-threshold', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    results = collect(args.size, args.data_dir, args.repeat, args.select, not args.no_startup)
+    _print_results(results)
+
+    targets = [args.save] if args.save else []
+    if args.save_baseline:
+        targets.append(str(Path(__file__).parent / f"baseline-{args.size}.json"))
+    for target in targets:
+        with open(target, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Сохранено: {target}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, results, args.time_threshold, args.rss_threshold)
+        print()
+        print('\n'.join(lines))
+        if regressions:
+            print(f"\nРегрессий: {len(regressions)}")
+            return 1
+        print("\nРегрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Наборы замеров: пропускная способность, пиковый RSS и время запуска.
+
+Каждый замер выполняется в отдельном процессе, чтобы пиковый RSS и время
+импорта не зависели от предыдущих замеров. Дочерний процесс печатает
+результат одной строкой JSON.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / 'src'
+
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+
+def _fasta_generator(path):
+    from formats.fasta import FastaProcessor
+    return sum(1 for _ in FastaProcessor(path).sequence_generator())
+
+
+def _fastq_statistics(path):
+    from formats.fastaq import FastqReader
+    return FastqReader(path).calculate_statistics()[0]
+
+
+def _sam_read(path):
+    from formats.sam import Samreader
+    return sum(1 for _ in Samreader(path).read())
+
+
+def _vcf_read(path):
+    from formats.vcf import Vcfreader
+    reader = Vcfreader(path)
+    reader.read()
+    return len(reader.df)
+
+
+def _batches(workers):
+    def run(path):
+        import formats
+        return sum(len(batch) for batch in formats.open(path).iter_batches(workers=workers))
+    return run
+
+
+class Case(NamedTuple):
+    """Замер одного режима чтения на одном наборе данных."""
+    dataset: str
+    mode: str
+    run: Callable[[str], int]
+    compression: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        suffix = f".{self.compression}" if self.compression else ''
+        return f"{self.dataset}{suffix}.{self.mode}"
+
+
+CASES = {case.name: case for case in (
+    Case('fasta_small', 'generator', _fasta_generator),
+    Case('fasta_small', 'batches', _batches(0)),
+    Case('fasta_small', 'batches_parallel', _batches(None)),
+    Case('fasta_large', 'generator', _fasta_generator),
+    Case('fasta_large', 'batches', _batches(0)),
+    Case('fastq', 'statistics', _fastq_statistics),
+    Case('fastq', 'batches', _batches(0)),
+    Case('fastq', 'batches_parallel', _batches(None)),
+    Case('fastq', 'statistics', _fastq_statistics, 'gzip'),
+    Case('fastq', 'batches', _batches(0), 'gzip'),
+    Case('sam', 'read', _sam_read),
+    Case('sam', 'batches', _batches(0)),
+    Case('sam', 'batches_parallel', _batches(None)),
+    Case('sam', 'batches', _batches(0), 'bz2'),
+    Case('vcf', 'read', _vcf_read),
+    Case('vcf', 'batches', _batches(0)),
+    Case('vcf', 'batches_parallel', _batches(None)),
+)}
+
+#: Модули, время импорта которых измеряется
+STARTUP_MODULES = ('formats', 'formats.fasta', 'formats.fastaq', 'formats.sam', 'formats.vcf')
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS текущего процесса и его завершившихся потомков в МБ."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def measure_case(name: str, path: str) -> Dict[str, float]:
+    """Выполняет замер в текущем процессе."""
+    start = time.perf_counter()
+    records = CASES[name].run(path)
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(path)
+    return {
+        'seconds': seconds,
+        'records': records,
+        'records_per_second': records / seconds,
+        'mb_per_second': size / seconds / 1e6,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def measure_import(module: str) -> Dict[str, float]:
+    """Время импорта модуля в текущем (чистом) процессе."""
+    start = time.perf_counter()
+    __import__(module)
+    return {'seconds': time.perf_counter() - start, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def _child(*args: str) -> Dict[str, float]:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.suites'] + list(args),
+                            cwd=str(ROOT), check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _best(runs):
+    """Минимальное время и максимальный пиковый RSS из нескольких повторов."""
+    result = dict(min(runs, key=lambda run: run['seconds']))
+    peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    result['peak_rss_mb'] = max(peaks) if peaks else None
+    return result
+
+
+def run_throughput(size: str, directory: str, repeat: int = 3,
+                   selected: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Замеряет пропускную способность и пиковый RSS всех режимов чтения.
+
+    Args:
+        size: Размер наборов данных ('tiny', 'small', 'large')
+        directory: Каталог кэша сгенерированных файлов
+        repeat: Количество повторов (каждый в новом процессе)
+        selected: Подстрока имени замера для фильтрации
+
+    Returns:
+        Словарь 'throughput/<замер>' -> метрики
+    """
+    from .generators import dataset, dataset_records
+
+    results = {}
+    for name, case in CASES.items():
+        if selected and selected not in name:
+            continue
+        path = dataset(case.dataset, size, directory, case.compression)
+        runs = [_child('case', name, path) for _ in range(repeat)]
+        expected = dataset_records(case.dataset, size)
+        if runs[0]['records'] != expected:
+            raise AssertionError(f"{name}: прочитано {runs[0]['records']} записей из {expected}")
+        results[f"throughput/{name}"] = _best(runs)
+    return results
+
+
+def run_startup(repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """Замеряет время импорта модулей в чистом интерпретаторе."""
+    return {f"startup/{module}": _best([_child('import', module) for _ in range(repeat)])
+            for module in STARTUP_MODULES}
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[0] == 'case':
+        result = measure_case(argv[1], argv[2])
+    elif argv[0] == 'import':
+        result = measure_import(argv[1])
+    else:
+        raise SystemExit(f"Неизвестная команда: {argv[0]}")
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
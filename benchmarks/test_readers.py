@@ -0,0 +1,46 @@
+"""
+Бенчмарки читателей для pytest-benchmark.
+
+Запуск: python -m pytest benchmarks/test_readers.py --benchmark-only
+Размер наборов данных задается переменной окружения BENCH_SIZE (по умолчанию tiny).
+Пиковый RSS процесса пишется в extra_info каждого замера.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from .generators import dataset, dataset_records
+from .suites import CASES, STARTUP_MODULES, _peak_rss_mb
+
+SIZE = os.environ.get('BENCH_SIZE', 'tiny')
+DATA_DIR = os.environ.get('BENCH_DATA_DIR', os.path.join(tempfile.gettempdir(), 'formats-bench'))
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_throughput(benchmark, name):
+    """Пропускная способность режима чтения."""
+    case = CASES[name]
+    path = dataset(case.dataset, SIZE, DATA_DIR, case.compression)
+    benchmark.group = case.dataset
+    benchmark.extra_info['bytes'] = os.path.getsize(path)
+    records = benchmark.pedantic(case.run, args=(path,), rounds=3, iterations=1)
+    benchmark.extra_info['peak_rss_mb'] = _peak_rss_mb()
+    assert records == dataset_records(case.dataset, SIZE)
+
+
+@pytest.mark.parametrize('module', STARTUP_MODULES)
+def test_startup(benchmark, module):
+    """Время импорта модуля в новом интерпретаторе."""
+    import subprocess
+    import sys
+
+    from .suites import ROOT
+
+    command = [sys.executable, '-c', f"import sys; sys.path.insert(0, 'src'); import {module}"]
+    benchmark.group = 'startup'
+    benchmark.pedantic(subprocess.run, args=(command,), kwargs={'cwd': str(ROOT), 'check': True},
+                       rounds=5, iterations=1)
@@ -0,0 +1,8 @@
+"""
+Readers for biological file formats: FASTA, FASTQ, SAM, VCF.
+
+formats.open(path) detects the format and compression of a file and returns
+the matching reader. Reader modules are imported on first use.
+"""
+
+from .registry import open, register_format, registered_formats, sniff_format
@@ -0,0 +1,168 @@
+from functools import partial
+
+import numpy as np
+
+from .batch import RecordBatch
+from .duplicates import mix64
+from .parallel import ordered_map
+from .sam import Samreader, find_tag
+from .streams import DEFAULT_CHUNK_SIZE, iter_line_chunks, open_binary
+
+
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def hash_strings(values):
+    """
+    64-битные хэши строк (FNV-1a по байтам + splitmix64), векторно по столбцам.
+
+    Args:
+        values (list): Строки; хэшируются их байты UTF-8.
+
+    Returns:
+        np.ndarray: uint64 хэши; одинаковые строки дают одинаковые хэши в любом процессе.
+    """
+    if not len(values):
+        return np.zeros(0, dtype=np.uint64)
+    joined = ''.join(values)
+    if not joined.isascii():
+        values = [value.encode('utf-8') for value in values]
+        joined = b''.join(values)
+    else:
+        joined = joined.encode('ascii')
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    width = int(lengths.max())
+    matrix = np.zeros((len(values), width), dtype=np.uint8)
+    matrix[np.arange(width) < lengths[:, None]] = np.frombuffer(joined, dtype=np.uint8)
+    key = np.full(len(values), _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in range(width):
+            # Столбцы дополнения не входят в хэш: он не зависит от соседей по пакету
+            key = np.where(column < lengths,
+                           (key ^ matrix[:, column].astype(np.uint64)) * _FNV_PRIME, key)
+    return mix64(key ^ lengths.astype(np.uint64))
+
+
+def _unique_pairs(cells, umis, counts):
+    """Сворачивает одинаковые пары (клетка, UMI), суммируя counts."""
+    if not len(cells):
+        return cells, umis, counts
+    order = np.lexsort((umis, cells))
+    cells, umis, counts = cells[order], umis[order], counts[order]
+    first = np.ones(len(cells), dtype=bool)
+    first[1:] = (cells[1:] != cells[:-1]) | (umis[1:] != umis[:-1])
+    starts = np.flatnonzero(first)
+    return cells[starts], umis[starts], np.add.reduceat(counts, starts)
+
+
+def barcode_pairs(data, cell_tag='CB', umi_tag='UB', exclude_flags=0x904):
+    """
+    Пары (клетка, UMI) блока строк SAM (выполняется в рабочем процессе).
+
+    Из необязательных полей ищутся только два тега; записи без любого из них
+    или с флагами из exclude_flags пропускаются.
+
+    Returns:
+        tuple: (cells, cell_ids, umi_hashes, counts) — список баркодов блока,
+               номера баркодов в нём, хэши UMI и число ридов для каждой уникальной пары.
+    """
+    cell_index = {}
+    cell_ids, umis = [], []
+    for line in data.decode('utf-8').splitlines():
+        if not line or line[0] == '@':
+            continue
+        fields = line.split('\t', 11)
+        if len(fields) < 12 or int(fields[1]) & exclude_flags:
+            continue
+        padded = '\t' + fields[11]
+        cell = find_tag(padded, cell_tag)
+        umi = find_tag(padded, umi_tag)
+        if cell is None or umi is None:
+            continue
+        cell_ids.append(cell_index.setdefault(cell[1], len(cell_index)))
+        umis.append(umi[1])
+    cells, umi_hashes, counts = _unique_pairs(np.array(cell_ids, dtype=np.int64),
+                                              hash_strings(umis),
+                                              np.ones(len(umis), dtype=np.int64))
+    return list(cell_index), cells, umi_hashes, counts
+
+
+class BarcodeCounter:
+    """
+    Группировка ридов single-cell по клеточному баркоду (CB) и UMI (UB).
+
+    Блоки файла обрабатываются параллельно; из каждой записи извлекаются
+    только два тега, UMI заменяются 64-битными хэшами, и рабочий процесс
+    возвращает уже свёрнутые уникальные пары (клетка, UMI) с числом ридов.
+    Главный процесс хранит баркоды клеток в словаре, а пары — в массивах
+    NumPy, периодически сворачивая повторы, так что память пропорциональна
+    числу уникальных пар (24 байта на пару), а не числу ридов.
+
+    Пример:
+        >>> counter = BarcodeCounter("possorted_genome.sam.gz")
+        >>> cells = counter.count(workers=16)
+        >>> cells['BARCODE'][:3], cells['UMIS'][:3]
+    """
+
+    #: Сворачивать накопленные пары, когда их больше; после свёртки порог не
+    #: меньше удвоенного числа оставшихся пар, чтобы свёртки не шли на каждом блоке
+    COMPACT_PAIRS = 1 << 22
+
+    def __init__(self, filename, cell_tag='CB', umi_tag='UB', exclude_flags=0x904,
+                 batch_bytes=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            filename (str): Путь к SAM-файлу (можно сжатый).
+            cell_tag (str): Тег клеточного баркода.
+            umi_tag (str): Тег UMI.
+            exclude_flags (int): Пропускать записи с этими флагами
+                (по умолчанию невыровненные, вторичные и дополнительные).
+            batch_bytes (int): Размер блока в байтах.
+        """
+        self.filename = filename
+        self.cell_tag = cell_tag
+        self.umi_tag = umi_tag
+        self.exclude_flags = exclude_flags
+        self.batch_bytes = batch_bytes
+
+    def count(self, workers=0):
+        """
+        Считает риды и уникальные UMI для каждой клетки.
+
+        Args:
+            workers (int): Число процессов; 0 — в текущем процессе.
+
+        Returns:
+            RecordBatch: Колонки BARCODE, READS, UMIS, по убыванию READS.
+        """
+        index = {}
+        parts, pending, threshold = [], 0, self.COMPACT_PAIRS
+        parse = partial(barcode_pairs, cell_tag=self.cell_tag, umi_tag=self.umi_tag,
+                        exclude_flags=self.exclude_flags)
+        with open_binary(self.filename) as handle:
+            Samreader(self.filename)._read_batch_header(handle)
+            chunks = (chunk for _, chunk in iter_line_chunks(handle, self.batch_bytes))
+            for cells, cell_ids, umis, counts in ordered_map(parse, chunks, workers):
+                mapping = np.array([index.setdefault(cell, len(index)) for cell in cells],
+                                   dtype=np.int64)
+                parts.append((mapping[cell_ids], umis, counts))
+                pending += len(counts)
+                if pending > threshold:
+                    parts = [self._compact(parts)]
+                    pending = len(parts[0][2])
+                    threshold = max(self.COMPACT_PAIRS, 2 * pending)
+        cell_ids, _, counts = self._compact(parts)
+        names = list(index)
+        reads = np.bincount(cell_ids, weights=counts, minlength=len(names)).astype(np.int64)
+        umis = np.bincount(cell_ids, minlength=len(names)).astype(np.int64)
+        order = np.argsort(-reads, kind='stable')
+        return RecordBatch({'BARCODE': [names[i] for i in order.tolist()],
+                            'READS': reads[order], 'UMIS': umis[order]})
+
+    @staticmethod
+    def _compact(parts):
+        if not parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0, dtype=np.uint64), empty
+        return _unique_pairs(*(np.concatenate(column) for column in zip(*parts)))
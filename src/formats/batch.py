@@ -0,0 +1,98 @@
+"""
+Columnar record batches.
+Common container for records parsed in bulk from any supported format.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+
+
+class RecordBatch:
+    """
+    Batch of records stored column by column.
+
+    Numeric fields are NumPy arrays, text fields are lists of str (or
+    read-only sequences of str, such as batches attached from shared
+    memory). All columns have the same length.
+
+    Example:
+        >>> batch = RecordBatch({'POS': np.array([10, 20]), 'REF': ['A', 'G']})
+        >>> len(batch), batch.fields
+        (2, ['POS', 'REF'])
+        >>> next(batch.records())
+        {'POS': 10, 'REF': 'A'}
+    """
+
+    __slots__ = ('columns', '_length')
+
+    def __init__(self, columns: Dict[str, Sequence]):
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        self.columns = columns
+        self._length = lengths.pop() if lengths else 0
+
+    @property
+    def fields(self) -> List[str]:
+        """Column names in order."""
+        return list(self.columns)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __repr__(self) -> str:
+        return f"RecordBatch(records={len(self)}, fields={self.fields})"
+
+    def select(self, rows: Union[np.ndarray, Sequence[int]]) -> 'RecordBatch':
+        """
+        Return a new batch with the given rows.
+
+        Args:
+            rows: Boolean mask or integer indices
+
+        Returns:
+            RecordBatch with the selected rows of every column
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        selected = {}
+        for name, column in self.columns.items():
+            if isinstance(column, np.ndarray):
+                selected[name] = column[rows]
+            elif hasattr(column, 'take'):
+                # Lazy columns (e.g. sharedmem.TextColumn) select without decoding
+                selected[name] = column.take(rows)
+            else:
+                selected[name] = [column[i] for i in rows]
+        return RecordBatch(selected)
+
+    def records(self) -> Iterator[dict]:
+        """Iterate over rows as dictionaries with Python scalars."""
+        names = self.fields
+        columns = [column.tolist() if isinstance(column, np.ndarray) else column
+                   for column in self.columns.values()]
+        for values in zip(*columns):
+            yield dict(zip(names, values))
+
+    @classmethod
+    def concat(cls, batches: Iterable['RecordBatch']) -> 'RecordBatch':
+        """Concatenate batches with identical fields."""
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls({})
+        merged = {}
+        for name, first in batches[0].columns.items():
+            parts = [batch.columns[name] for batch in batches]
+            if isinstance(first, np.ndarray):
+                merged[name] = np.concatenate(parts)
+            else:
+                merged[name] = [value for part in parts for value in part]
+        return cls(merged)
@@ -0,0 +1,184 @@
+"""
+BGZF (blocked gzip) writing and random access by virtual offset.
+BGZF files are valid gzip files, so every reader in this package can read them.
+"""
+
+from typing import Iterator, Optional
+import struct
+import zlib
+
+
+#: Uncompressed bytes per block (same as htslib, leaves room for incompressible data)
+BLOCK_SIZE = 0xff00
+
+# 28-byte empty block marking the end of a BGZF file
+EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+_HEADER = struct.Struct('<4BI2BH2BHH')
+_FOOTER = struct.Struct('<II')
+
+
+def compress_block(data: bytes, level: int = 6) -> bytes:
+    """
+    Compress at most BLOCK_SIZE bytes into one BGZF block.
+
+    Args:
+        data: Uncompressed bytes
+        level: zlib compression level
+
+    Returns:
+        Complete gzip member with the BGZF 'BC' extra subfield
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    if len(deflated) > 0xffff - 25:
+        # Incompressible data: store it raw
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        deflated = compressor.compress(data) + compressor.flush()
+    block_size = len(deflated) + 25
+    header = _HEADER.pack(0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, ord('B'), ord('C'), 2, block_size)
+    return header + deflated + _FOOTER.pack(zlib.crc32(data) & 0xffffffff, len(data))
+
+
+def make_virtual_offset(block_offset: int, within_block: int) -> int:
+    """Virtual offset: compressed block start << 16 | offset in the uncompressed block."""
+    return (block_offset << 16) | within_block
+
+
+class BgzfWriter:
+    """
+    Binary writer producing BGZF blocks.
+
+    tell() returns the virtual offset of the next byte written, which is what
+    tabix/BAI style indexes store.
+
+    Example:
+        >>> with BgzfWriter("calls.vcf.gz") as out:
+        ...     start = out.tell()
+        ...     out.write(b"chr1\\t100\\t...\\n")
+    """
+
+    def __init__(self, filepath: str, level: int = 6):
+        """
+        Args:
+            filepath: Output path
+            level: zlib compression level
+        """
+        self._file = open(filepath, 'wb')
+        self._level = level
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= BLOCK_SIZE:
+            self._flush_block(bytes(self._buffer[:BLOCK_SIZE]))
+            del self._buffer[:BLOCK_SIZE]
+
+    def tell(self) -> int:
+        """Virtual offset of the next byte."""
+        return make_virtual_offset(self._offset, len(self._buffer))
+
+    def flush(self) -> None:
+        """Write the buffered data as a (short) block."""
+        if self._buffer:
+            self._flush_block(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _flush_block(self, data: bytes) -> None:
+        block = compress_block(data, self._level)
+        self._file.write(block)
+        self._offset += len(block)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.write(EOF_BLOCK)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BgzfReader:
+    """
+    Random-access reader for BGZF files.
+
+    Example:
+        >>> with BgzfReader("calls.vcf.gz") as f:
+        ...     f.seek(virtual_offset)
+        ...     line = f.readline()
+    """
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, 'rb')
+        self._block = b''
+        self._block_offset = 0
+        self._next_offset = 0
+        self._position = 0
+
+    def _read_block(self) -> bool:
+        """Load the block at _next_offset; False at end of file."""
+        self._file.seek(self._next_offset)
+        header = self._file.read(18)
+        if len(header) < 18:
+            self._block = b''
+            return False
+        fields = _HEADER.unpack(header)
+        if fields[0] != 0x1f or fields[1] != 0x8b or not fields[3] & 4 or fields[8:10] != (66, 67):
+            raise ValueError(f"Not a BGZF block at offset {self._next_offset}")
+        block_size = fields[11] + 1
+        rest = self._file.read(block_size - 18)
+        self._block = zlib.decompress(rest[:-8], -15)
+        self._block_offset = self._next_offset
+        self._next_offset += block_size
+        self._position = 0
+        return True
+
+    def seek(self, virtual_offset: int) -> None:
+        """Move to a virtual offset."""
+        self._next_offset = virtual_offset >> 16
+        self._read_block()
+        self._position = virtual_offset & 0xffff
+
+    def tell(self) -> int:
+        """Virtual offset of the next unread byte."""
+        if self._position == len(self._block):
+            return make_virtual_offset(self._next_offset, 0)
+        return make_virtual_offset(self._block_offset, self._position)
+
+    def readline(self) -> bytes:
+        """Read one line (with its newline); b'' at end of file."""
+        parts = []
+        while True:
+            if self._position >= len(self._block) and not self._read_block():
+                break
+            end = self._block.find(b'\n', self._position)
+            if end >= 0:
+                parts.append(self._block[self._position:end + 1])
+                self._position = end + 1
+                break
+            parts.append(self._block[self._position:])
+            self._position = len(self._block)
+        return b''.join(parts)
+
+    def iter_lines(self, end_offset: Optional[int] = None) -> Iterator[bytes]:
+        """Yield lines from the current position up to a virtual end offset."""
+        while end_offset is None or self.tell() < end_offset:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,345 @@
+from functools import lru_cache
+import re
+
+import numpy as np
+
+from .sam import SamHeader
+from .streams import open_text
+
+
+# Коды операций CIGAR в порядке спецификации BAM
+CIGAR_OPS = 'MIDNSHP=X'
+_CIGAR_RE = re.compile(r'(\d+)([MIDNSHP=X])')
+_REF_CONSUMING = np.array([op in 'MDN=X' for op in CIGAR_OPS])
+_ALIGNED = np.array([op in 'M=X' for op in CIGAR_OPS])
+_DELETION = CIGAR_OPS.index('D')
+_OP_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _op in enumerate(CIGAR_OPS):
+    _OP_CODES[ord(_op)] = _code
+
+# Как в mosdepth: unmapped | secondary | qcfail | duplicate
+DEFAULT_EXCLUDE_FLAGS = 0x704
+
+
+@lru_cache(maxsize=65536)
+def parse_cigar(cigar):
+    """
+    Разбирает CIGAR-строку в массивы операций и длин.
+
+    Результат кэшируется: одинаковые CIGAR (например, '100M') разбираются один раз.
+    Возвращаемые массивы общие для всех вызовов и не должны изменяться.
+
+    Args:
+        cigar (str): CIGAR-строка, например '10S80M2D10M'.
+
+    Returns:
+        tuple: (ops, lengths) — np.uint8 коды операций (индекс в 'MIDNSHP=X')
+               и np.uint32 длины.
+    """
+    if cigar == '*':
+        return np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint32)
+    pairs = _CIGAR_RE.findall(cigar)
+    if sum(len(n) + 1 for n, _ in pairs) != len(cigar):
+        raise ValueError(f"Некорректная CIGAR-строка: {cigar}")
+    ops = np.array([CIGAR_OPS.index(op) for _, op in pairs], dtype=np.uint8)
+    lengths = np.array([int(n) for n, _ in pairs], dtype=np.uint32)
+    return ops, lengths
+
+
+@lru_cache(maxsize=65536)
+def reference_length(cigar):
+    """Длина выравнивания на референсе (операции M, D, N, =, X); 0 для '*'."""
+    ops, lengths = parse_cigar(cigar)
+    return int(lengths[_REF_CONSUMING[ops]].sum())
+
+
+@lru_cache(maxsize=65536)
+def reference_blocks(cigar, count_deletions=False):
+    """
+    Возвращает покрываемые чтением блоки на референсе относительно POS.
+
+    Args:
+        cigar (str): CIGAR-строка.
+        count_deletions (bool): Учитывать ли делеции (D) как покрытие.
+
+    Returns:
+        tuple: (starts, ends) — np.int64 смещения начала и конца (полуинтервалы)
+               от 0-based позиции выравнивания.
+    """
+    ops, lengths = parse_cigar(cigar)
+    lengths = lengths.astype(np.int64)
+    consumed = np.where(_REF_CONSUMING[ops], lengths, 0)
+    offsets = np.cumsum(consumed) - consumed
+    counted = _ALIGNED[ops]
+    if count_deletions:
+        counted = counted | (ops == _DELETION)
+    return offsets[counted], offsets[counted] + lengths[counted]
+
+
+def cigar_blocks(cigars, count_deletions=False):
+    """
+    Блоки на референсе сразу для массива CIGAR-строк (без цикла по строкам).
+
+    Все CIGAR склеиваются в одну строку и разбираются одним регулярным
+    выражением; смещения блоков считаются cumsum внутри каждой строки.
+
+    Args:
+        cigars (list): CIGAR-строки (без '*').
+        count_deletions (bool): Учитывать ли делеции (D) как покрытие.
+
+    Returns:
+        tuple: (starts, ends, bounds) — смещения блоков от POS (np.int64);
+               блоки i-й строки — [bounds[i]:bounds[i + 1]].
+    """
+    joined = ''.join(cigars)
+    pairs = _CIGAR_RE.findall(joined)
+    if sum(len(n) + 1 for n, _ in pairs) != len(joined):
+        for cigar in cigars:
+            parse_cigar(cigar)
+    raw = np.frombuffer(joined.encode('ascii'), dtype=np.uint8)
+    sizes = np.fromiter(map(len, cigars), dtype=np.int64, count=len(cigars))
+    # Номер строки для каждой операции: буквы в склейке принадлежат своим CIGAR
+    is_op = raw >= ord('=')
+    op_cigars = np.repeat(np.arange(len(cigars)), sizes)[is_op]
+    ops = _OP_CODES[raw[is_op]]
+    lengths = np.array([n for n, _ in pairs], dtype=np.int64)
+
+    consumed = np.where(_REF_CONSUMING[ops], lengths, 0)
+    offsets = np.cumsum(consumed) - consumed
+    op_counts = np.bincount(op_cigars, minlength=len(cigars))
+    first_ops = np.cumsum(op_counts) - op_counts
+    offsets -= np.repeat(offsets[first_ops[op_counts > 0]], op_counts[op_counts > 0])
+    counted = _ALIGNED[ops]
+    if count_deletions:
+        counted = counted | (ops == _DELETION)
+    bounds = np.zeros(len(cigars) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(op_cigars[counted], minlength=len(cigars)), out=bounds[1:])
+    return offsets[counted], offsets[counted] + lengths[counted], bounds
+
+
+class CoverageEngine:
+    """
+    Класс для расчёта покрытия (глубины) по выравниваниям SAM-файла.
+
+    Блоки выравниваний берутся из CIGAR и накапливаются в разностном массиве int32
+    для каждой хромосомы (np.add.at по началам и концам), после чего глубина
+    получается одним cumsum. Длины хромосом берутся из строк @SQ заголовка.
+
+    Атрибуты:
+        filename (str): Путь к SAM-файлу.
+        min_mapq (int): Минимальное качество картирования MAPQ.
+        exclude_flags (int): Выравнивания с любым из этих битов FLAG пропускаются.
+        include_flags (int): Учитываются только выравнивания со всеми этими битами FLAG.
+        count_deletions (bool): Считать ли делеции покрытыми позициями.
+        header (SamHeader): Разобранный заголовок файла.
+        lengths (dict): Длины хромосом из @SQ {RNAME: длина}.
+
+    Методы:
+        compute(): Проходит по файлу и накапливает покрытие.
+        depth(chrom): Возвращает массив глубины по позициям хромосомы.
+        binned(chrom, window): Средняя глубина в окнах фиксированного размера.
+        write_bedgraph(output): Записывает покрытие в формате bedgraph.
+        write_binned(output, window): Записывает окна как mosdepth regions.bed.
+    """
+
+    def __init__(self, filename, min_mapq=0, exclude_flags=DEFAULT_EXCLUDE_FLAGS,
+                 include_flags=0, count_deletions=False, batch_size=100000):
+        """
+        Инициализирует движок покрытия.
+
+        Args:
+            filename (str): Путь к SAM-файлу.
+            min_mapq (int): Минимальный MAPQ.
+            exclude_flags (int): Маска исключаемых флагов (по умолчанию 0x704).
+            include_flags (int): Маска обязательных флагов.
+            count_deletions (bool): Учитывать делеции в покрытии.
+            batch_size (int): Число выравниваний, накапливаемых перед векторным сложением.
+        """
+        self.filename = filename
+        self.min_mapq = min_mapq
+        self.exclude_flags = exclude_flags | 0x4
+        self.include_flags = include_flags
+        self.count_deletions = count_deletions
+        self.batch_size = batch_size
+        self.header = SamHeader()
+        self._lengths = None
+        self._diffs = {}
+        self._extents = {}
+
+    @property
+    def lengths(self):
+        if self._lengths is None:
+            header = self.header
+            self._lengths = {name: length for name, length
+                             in zip(header.reference_names, header.reference_lengths)
+                             if length is not None}
+        return self._lengths
+
+    def _diff_array(self, chrom, needed):
+        """Возвращает разностный массив хромосомы, расширяя его при необходимости."""
+        diff = self._diffs.get(chrom)
+        if diff is None:
+            size = max(self.lengths.get(chrom, 0), needed) + 1
+            diff = self._diffs[chrom] = np.zeros(size, dtype=np.int32)
+        elif len(diff) <= needed:
+            grown = np.zeros(max(needed + 1, 2 * len(diff)), dtype=np.int32)
+            grown[:len(diff)] = diff
+            diff = self._diffs[chrom] = grown
+        return diff
+
+    def _flush(self, pending):
+        """Добавляет накопленные выравнивания в разностные массивы."""
+        for chrom, (positions, cigars) in pending.items():
+            positions = np.array(positions, dtype=np.int64)
+            # Каждый различный CIGAR разбирается один раз, блоки всех
+            # выравниваний собираются индексами без цикла по группам
+            unique, cigar_ids = np.unique(np.array(cigars), return_inverse=True)
+            block_starts, block_ends, bounds = cigar_blocks(unique.tolist(), self.count_deletions)
+            counts = np.diff(bounds)[cigar_ids]
+            if not counts.sum():
+                continue
+            first = np.cumsum(counts) - counts
+            blocks = (np.repeat(bounds[cigar_ids] - first, counts)
+                      + np.arange(int(counts.sum())))
+            read_positions = np.repeat(positions, counts)
+            starts = read_positions + block_starts[blocks]
+            ends = read_positions + block_ends[blocks]
+            extent = int(ends.max())
+            self._extents[chrom] = max(self._extents.get(chrom, 0), extent)
+            diff = self._diff_array(chrom, extent)
+            np.add.at(diff, starts, 1)
+            np.add.at(diff, ends, -1)
+        pending.clear()
+
+    def compute(self):
+        """
+        Считывает SAM-файл и накапливает покрытие.
+
+        Returns:
+            CoverageEngine: self, для цепочки вызовов.
+        """
+        self.header = SamHeader()
+        self._lengths = None
+        self._diffs = {}
+        self._extents = {}
+        pending = {}
+        count = 0
+        with open_text(self.filename) as f:
+            for line in f:
+                if line.startswith('@'):
+                    self.header.add_line(line)
+                    self._lengths = None
+                    continue
+                fields = line.split('\t', 6)
+                if len(fields) < 7:
+                    continue
+                flag = int(fields[1])
+                if flag & self.exclude_flags or (flag & self.include_flags) != self.include_flags:
+                    continue
+                if int(fields[4]) < self.min_mapq or fields[5] == '*' or fields[2] == '*':
+                    continue
+                entry = pending.get(fields[2])
+                if entry is None:
+                    entry = pending[fields[2]] = ([], [])
+                entry[0].append(int(fields[3]) - 1)
+                entry[1].append(fields[5])
+                count += 1
+                if count % self.batch_size == 0:
+                    self._flush(pending)
+        self._flush(pending)
+        return self
+
+    def chromosomes(self):
+        """Список хромосом: сначала в порядке @SQ, затем встреченные без @SQ."""
+        lengths = self.lengths
+        names = list(lengths)
+        names.extend(chrom for chrom in self._diffs if chrom not in lengths)
+        return names
+
+    def depth(self, chrom):
+        """
+        Возвращает глубину покрытия по позициям хромосомы.
+
+        Массив считается cumsum при каждом вызове и не кэшируется: в памяти
+        остаются только разностные массивы.
+
+        Args:
+            chrom (str): Имя хромосомы.
+
+        Returns:
+            numpy.ndarray: int32-массив глубины (индекс — 0-based позиция).
+        """
+        length = self.lengths.get(chrom)
+        diff = self._diffs.get(chrom)
+        if diff is None:
+            return np.zeros(length or 0, dtype=np.int32)
+        # Без @SQ массив рос удвоением: обрезаем по концу последнего блока
+        end = length or self._extents[chrom]
+        return np.cumsum(diff[:end], dtype=np.int32)
+
+    def binned(self, chrom, window):
+        """
+        Средняя глубина в последовательных окнах.
+
+        Args:
+            chrom (str): Имя хромосомы.
+            window (int): Размер окна.
+
+        Returns:
+            tuple: (starts, ends, means) — массивы numpy.
+        """
+        depth = self.depth(chrom)
+        starts = np.arange(0, len(depth), window, dtype=np.int64)
+        ends = np.minimum(starts + window, len(depth))
+        if len(depth) == 0:
+            return starts, ends, np.zeros(0)
+        sums = np.add.reduceat(depth.astype(np.int64), starts)
+        return starts, ends, sums / (ends - starts)
+
+    def write_bedgraph(self, output, skip_zero=False):
+        """
+        Записывает покрытие в формате bedgraph (участки постоянной глубины).
+
+        Args:
+            output (str): Путь к выходному файлу.
+            skip_zero (bool): Не записывать участки с нулевым покрытием.
+
+        Returns:
+            int: Количество записанных строк.
+        """
+        written = 0
+        with open(output, 'w') as out:
+            for chrom in self.chromosomes():
+                depth = self.depth(chrom)
+                if len(depth) == 0:
+                    continue
+                change = np.flatnonzero(np.diff(depth)) + 1
+                starts = np.concatenate(([0], change))
+                ends = np.concatenate((change, [len(depth)]))
+                values = depth[starts]
+                for start, end, value in zip(starts, ends, values):
+                    if skip_zero and value == 0:
+                        continue
+                    out.write(f"{chrom}\t{start}\t{end}\t{value}\n")
+                    written += 1
+        return written
+
+    def write_binned(self, output, window):
+        """
+        Записывает среднюю глубину по окнам (как regions.bed в mosdepth).
+
+        Args:
+            output (str): Путь к выходному файлу.
+            window (int): Размер окна.
+
+        Returns:
+            int: Количество записанных окон.
+        """
+        written = 0
+        with open(output, 'w') as out:
+            for chrom in self.chromosomes():
+                starts, ends, means = self.binned(chrom, window)
+                for start, end, mean in zip(starts, ends, means):
+                    out.write(f"{chrom}\t{start}\t{end}\t{mean:.2f}\n")
+                written += len(starts)
+        return written
@@ -0,0 +1,570 @@
+from functools import lru_cache, partial
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+
+import numpy as np
+
+from .parallel import ordered_map
+from .sam import Samreader, local_reference_names, parse_sam_chunk
+from .fastaq import parse_fastq_chunk
+from .streams import (DEFAULT_CHUNK_SIZE, fastq_boundary, iter_line_chunks, iter_record_chunks,
+                      open_binary)
+
+
+DUPLICATE_FLAG = 0x400
+
+# Не участвуют в поиске дубликатов: unmapped | secondary | supplementary
+_SKIP_FLAGS = 0x4 | 0x100 | 0x800
+
+# Как в Picard: в оценку рида входят только базы с качеством >= 15
+MIN_BASE_QUALITY = 15
+
+#: Записи таблицы ключей: ключ, оценка качества, детерминированный разрыв ничьих, номер записи
+KEY_DTYPE = np.dtype([('key', '<u8'), ('score', '<u4'), ('tie', '<u4'), ('index', '<u8')])
+
+_MIX1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX2 = np.uint64(0x94d049bb133111eb)
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def mix64(values):
+    """
+    Перемешивающая функция splitmix64 для массива uint64.
+
+    Args:
+        values (np.ndarray): Массив, приводимый к uint64.
+
+    Returns:
+        np.ndarray: Хэши uint64.
+    """
+    x = np.asarray(values).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * _MIX1
+        x = (x ^ (x >> np.uint64(27))) * _MIX2
+    return x ^ (x >> np.uint64(31))
+
+
+def combine_keys(*columns):
+    """
+    Сворачивает несколько целочисленных колонок в один 64-битный ключ.
+
+    Отрицательные значения допустимы (берётся их представление int64).
+    Вероятность коллизии для n разных кортежей — около n² / 2^65.
+    """
+    key = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        key = mix64(key ^ np.asarray(column).astype(np.int64).astype(np.uint64))
+    return key
+
+
+def quality_scores(qualities):
+    """Сумма качеств баз >= MIN_BASE_QUALITY для каждой строки QUAL (Phred+33)."""
+    lengths = np.array([0 if q == '*' else len(q) for q in qualities], dtype=np.int64)
+    scores = np.zeros(len(lengths), dtype=np.uint32)
+    if not lengths.sum():
+        return scores
+    values = np.frombuffer(''.join(q for q in qualities if q != '*').encode('ascii'),
+                           dtype=np.uint8).astype(np.uint32) - 33
+    values[values < MIN_BASE_QUALITY] = 0
+    nonempty = lengths > 0
+    starts = np.cumsum(lengths[nonempty]) - lengths[nonempty]
+    scores[nonempty] = np.add.reduceat(values, starts)
+    return scores
+
+
+@lru_cache(maxsize=65536)
+def cigar_clips(cigar):
+    """
+    Клипирование и длина выравнивания на референсе для CIGAR.
+
+    Returns:
+        tuple: (клип в начале, клип в конце, длина на референсе); клипы S и H.
+    """
+    from .coverage import parse_cigar, _REF_CONSUMING
+
+    ops, lengths = parse_cigar(cigar)
+    clip = (ops == 4) | (ops == 5)
+    lead = trail = 0
+    for op_clip, length in zip(clip, lengths.tolist()):
+        if not op_clip:
+            break
+        lead += length
+    for op_clip, length in zip(clip[::-1], lengths[::-1].tolist()):
+        if not op_clip:
+            break
+        trail += length
+    return lead, trail, int(lengths[_REF_CONSUMING[ops]].sum())
+
+
+def _five_prime(pos, reverse, clips):
+    """Неклипированный 5'-конец: для обратной цепи — правый край выравнивания плюс клип в конце."""
+    return np.where(reverse, pos + clips[:, 2] - 1 + clips[:, 1], pos - clips[:, 0])
+
+
+def sam_duplicate_keys(data, reference_names=()):
+    """
+    Ключи дубликатов для блока строк SAM (выполняется в рабочем процессе).
+
+    Ключ — хэш двух концов фрагмента (RID, неклипированная 5'-позиция, цепь),
+    упорядоченных одинаково для обоих ридов пары, поэтому оба рида получают
+    один ключ. 5'-конец мата берётся из тега MC (samtools fixmate -m, Picard);
+    без него используется PNEXT, и ключи ридов пары совпадают, только если
+    мат не клипирован. Для непарных ридов и ридов с невыровненным матом
+    второй конец равен (-1, -1, -1).
+
+    Args:
+        data (bytes): Блок целых строк SAM.
+        reference_names (tuple): Имена референсов из @SQ.
+
+    Returns:
+        tuple: (число разобранных записей, массив KEY_DTYPE с локальными номерами
+               записей, участвующих в поиске).
+    """
+    batch = parse_sam_chunk(data, reference_names, tags=(('MC', 'Z'),))
+    flags = batch['FLAG']
+    eligible = np.flatnonzero((flags & _SKIP_FLAGS) == 0)
+    table = np.zeros(len(eligible), dtype=KEY_DTYPE)
+    if not len(eligible):
+        return len(batch), table
+
+    rows = eligible.tolist()
+    flags = flags[eligible]
+    clips = np.array([cigar_clips(batch['CIGAR'][i]) for i in rows],
+                     dtype=np.int64).reshape(-1, 3)
+    reverse = (flags & 0x10) != 0
+    rid = batch['RID'][eligible]
+    mate_rid = batch['MRID'][eligible]
+    known = len(reference_names)
+    local = local_reference_names(batch, known)
+    if local:
+        # id контигов без @SQ локальны для блока; ключом служит CRC32 имени
+        stable = known + np.array([zlib.crc32(name.encode()) for name in local], dtype=np.int64)
+        rid, mate_rid = (np.where(ids >= known, stable[np.maximum(ids - known, 0)], ids)
+                         for ids in (rid, mate_rid))
+    five_prime = _five_prime(batch['POS'][eligible], reverse, clips)
+
+    paired = ((flags & 0x1) != 0) & ((flags & 0x8) == 0)
+    mate_cigars = [batch['MC'][i] for i in rows]
+    has_mate_cigar = np.array([cigar is not None for cigar in mate_cigars], dtype=bool)
+    mate_clips = np.array([cigar_clips(cigar) if cigar is not None else (0, 0, 1)
+                           for cigar in mate_cigars], dtype=np.int64).reshape(-1, 3)
+    mate_reverse = (flags & 0x20) != 0
+    mate_pos = batch['PNEXT'][eligible]
+    # Без MC клипирование мата неизвестно, и остаётся клипированная PNEXT
+    own = five_prime
+    mate = np.where(has_mate_cigar, _five_prime(mate_pos, mate_reverse, mate_clips), mate_pos)
+    mate_rid = np.where(paired, mate_rid, -1)
+    mate = np.where(paired, mate, -1)
+    mate_reverse = np.where(paired, mate_reverse, -1)
+    reverse = reverse.astype(np.int64)
+
+    # Концы пары упорядочиваются одинаково в обоих ридах
+    swap = paired & ((mate_rid < rid)
+                     | ((mate_rid == rid) & ((mate < own)
+                                             | ((mate == own) & (mate_reverse < reverse)))))
+    first = [np.where(swap, b, a) for a, b in ((rid, mate_rid), (own, mate),
+                                               (reverse, mate_reverse))]
+    second = [np.where(swap, a, b) for a, b in ((rid, mate_rid), (own, mate),
+                                                (reverse, mate_reverse))]
+    table['key'] = combine_keys(*first, *second)
+    table['score'] = quality_scores([batch['QUAL'][i] for i in rows])
+    # По QNAME риды одной пары объединяются в KeyTable.duplicate_indices(pairs=True)
+    table['tie'] = [zlib.crc32(batch['QNAME'][i].encode()) for i in rows]
+    table['index'] = eligible
+    return len(batch), table
+
+
+def fastq_duplicate_keys(data, prefix_length=50):
+    """
+    Ключи дубликатов для блока FASTQ записей: FNV-1a хэш первых prefix_length баз.
+
+    Returns:
+        tuple: (число записей, массив KEY_DTYPE).
+    """
+    batch = parse_fastq_chunk(data)
+    count = len(batch)
+    table = np.zeros(count, dtype=KEY_DTYPE)
+    if not count:
+        return count, table
+    prefixes = ''.join(seq[:prefix_length].ljust(prefix_length, '\0')
+                       for seq in batch['SEQUENCE']).encode('ascii')
+    matrix = np.frombuffer(prefixes, dtype=np.uint8).reshape(count, prefix_length)
+    key = np.full(count, _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in range(prefix_length):
+            key = (key ^ matrix[:, column].astype(np.uint64)) * _FNV_PRIME
+    table['key'] = mix64(key)
+    table['score'] = quality_scores(batch['QUALITY'])
+    table['index'] = np.arange(count)
+    return count, table
+
+
+class KeyTable:
+    """
+    Таблица ключей дубликатов с ограничением памяти.
+
+    Пока таблица меньше memory_budget, она хранится в памяти; затем записи
+    раскладываются по 64 файлам-разделам по старшим 6 битам ключа. Одинаковые
+    ключи всегда попадают в один раздел, поэтому разделы обрабатываются
+    независимо. Раздел больше memory_budget при обработке делится дальше по
+    следующим 6 битам, так что в памяти одновременно не больше memory_budget
+    ключей при любом размере входа.
+
+    Внутри группы одинаковых ключей оригиналом считается запись с наибольшей
+    оценкой (при равенстве — с меньшим tie, затем меньшим номером), остальные —
+    дубликаты.
+
+    Таблица годится и для других записей: dtype должен содержать поле 'key'
+    (uint64, хорошо перемешанный хэш), по которому записи делятся на разделы.
+    """
+
+    PARTITION_BITS = 6
+
+    def __init__(self, memory_budget=256 << 20, tmp_dir=None, dtype=KEY_DTYPE):
+        self.memory_budget = memory_budget
+        self.tmp_dir = tmp_dir
+        self.dtype = np.dtype(dtype)
+        self._parts = []
+        self._size = 0
+        self._directory = None
+        self.records = 0
+
+    @property
+    def spilled(self):
+        return self._directory is not None
+
+    def add(self, table):
+        """Добавляет записи типа dtype."""
+        self.records += len(table)
+        if not self.spilled:
+            self._parts.append(table)
+            self._size += table.nbytes
+            if self._size > self.memory_budget:
+                self._directory = tempfile.mkdtemp(prefix='formats-dup-', dir=self.tmp_dir)
+                for part in self._parts:
+                    self._spill(part, self._directory, 0)
+                self._parts = []
+            return
+        self._spill(table, self._directory, 0)
+
+    def _spill(self, table, directory, depth):
+        """Дописывает записи в разделы directory по битам ключа уровня depth."""
+        count = 1 << self.PARTITION_BITS
+        shift = max(0, 64 - self.PARTITION_BITS * (depth + 1))
+        partition = (table['key'] >> np.uint64(shift)) & np.uint64(count - 1)
+        order = np.argsort(partition, kind='stable')
+        bounds = np.searchsorted(partition[order], np.arange(count + 1))
+        for p in range(count):
+            if bounds[p] < bounds[p + 1]:
+                with open(os.path.join(directory, f"part{p:02d}"), 'ab') as f:
+                    table[order[bounds[p]:bounds[p + 1]]].tofile(f)
+
+    def partitions(self):
+        """
+        Разделы таблицы по одному; все записи с одинаковым ключом — в одном разделе.
+
+        Прочитанные файлы разделов удаляются, поэтому обойти разделы можно один раз.
+        """
+        if not self.spilled:
+            yield np.concatenate(self._parts) if self._parts else np.zeros(0, self.dtype)
+            return
+        pending = [(self._directory, 0)]
+        while pending:
+            directory, depth = pending.pop()
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if not os.path.isfile(path):
+                    continue
+                size = os.path.getsize(path)
+                if size <= self.memory_budget or 64 - self.PARTITION_BITS * (depth + 1) <= 0:
+                    yield np.fromfile(path, dtype=self.dtype)
+                    os.unlink(path)
+                    continue
+                # Раздел не помещается в память: делим его дальше
+                subdirectory = path + '.d'
+                os.mkdir(subdirectory)
+                step = max(1, self.memory_budget // self.dtype.itemsize)
+                for start in range(0, size // self.dtype.itemsize, step):
+                    piece = np.fromfile(path, dtype=self.dtype, count=step,
+                                        offset=start * self.dtype.itemsize)
+                    self._spill(piece, subdirectory, depth + 1)
+                os.unlink(path)
+                pending.append((subdirectory, depth + 1))
+
+    @staticmethod
+    def duplicate_indices(table, pairs=False):
+        """
+        Номера записей-дубликатов в одной таблице (разделе).
+
+        Args:
+            table (np.ndarray): Записи KEY_DTYPE.
+            pairs (bool): Записи с одинаковыми key и tie — риды одной пары: их
+                оценки складываются, и пара остаётся или помечается целиком.
+        """
+        if not pairs:
+            order = np.lexsort((table['index'], table['tie'],
+                                -table['score'].astype(np.int64), table['key']))
+            keys = table['key'][order]
+            duplicate = np.zeros(len(keys), dtype=bool)
+            duplicate[1:] = keys[1:] == keys[:-1]
+            return table['index'][order][duplicate]
+
+        table = table[np.lexsort((table['index'], table['tie'], table['key']))]
+        new_unit = np.ones(len(table), dtype=bool)
+        new_unit[1:] = (table['key'][1:] != table['key'][:-1]) | \
+            (table['tie'][1:] != table['tie'][:-1])
+        starts = np.flatnonzero(new_unit)
+        units = np.cumsum(new_unit) - 1
+        if not len(starts):
+            return table['index']
+        scores = np.add.reduceat(table['score'].astype(np.int64), starts)
+        keys = table['key'][starts]
+        order = np.lexsort((table['index'][starts], table['tie'][starts], -scores, keys))
+        duplicate = np.zeros(len(starts), dtype=bool)
+        duplicate[order[1:][keys[order][1:] == keys[order][:-1]]] = True
+        return table['index'][duplicate[units]]
+
+    def duplicates(self, total, pairs=False):
+        """
+        Битовая маска дубликатов.
+
+        Args:
+            total (int): Общее число записей в файле.
+            pairs (bool): Оценивать и помечать пары целиком (см. duplicate_indices).
+
+        Returns:
+            np.ndarray: uint8 маска (бит i % 8 байта i // 8), total / 8 байт.
+        """
+        bitmap = np.zeros((total + 7) // 8, dtype=np.uint8)
+        for table in self.partitions():
+            indices = self.duplicate_indices(table, pairs)
+            np.bitwise_or.at(bitmap, indices >> np.uint64(3),
+                             (np.uint8(1) << (indices & np.uint64(7)).astype(np.uint8)))
+        return bitmap
+
+    def close(self):
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+        self._parts = []
+
+
+def _bits(bitmap, start, count):
+    """Флаги дубликатов записей [start, start + count) списком bool."""
+    first = start >> 3
+    bits = np.unpackbits(bitmap[first:(start + count + 7) // 8 + 1], bitorder='little')
+    return bits[start - first * 8:start - first * 8 + count].astype(bool).tolist()
+
+
+def _open_output(path):
+    """Запись в BGZF для '.gz', иначе обычный файл."""
+    if path.endswith('.gz'):
+        from .bgzf import BgzfWriter
+        return BgzfWriter(path)
+    return open(path, 'wb')
+
+
+class DuplicateMarker:
+    """
+    Поиск дубликатов (PCR/оптических) в SAM-файле и установка флага 0x400.
+
+    Первый проход считает для каждого первичного выровненного рида 64-битный
+    ключ из обоих концов фрагмента (референс, неклипированная 5'-позиция,
+    цепь; для мата — из тега MC) и оценку качества; блоки файла
+    обрабатываются параллельно. Ключи хранятся в KeyTable (массивы NumPy,
+    при превышении memory_budget — разделы на диске), группируются
+    сортировкой, и в каждой группе все пары, кроме лучшей, помечаются
+    дубликатами. Второй проход переписывает файл, устанавливая 0x400
+    дубликатам и снимая его у остальных. В памяти остаётся только битовая
+    маска: 1 бит на запись.
+
+    Как в Picard, пара оценивается суммой качеств обоих ридов (риды
+    объединяются по QNAME) и остаётся или помечается целиком. Непарные риды
+    и риды с невыровненным матом сравниваются только между собой.
+    Файл не обязан быть отсортирован.
+
+    Атрибуты:
+        filename (str): Путь к SAM-файлу.
+        records (int): Число записей после find().
+        duplicate_count (int): Число найденных дубликатов.
+
+    Пример:
+        >>> marker = DuplicateMarker("aln.sam.gz", memory_budget=1 << 30)
+        >>> marker.write("aln.markdup.sam.gz")
+    """
+
+    def __init__(self, filename, memory_budget=256 << 20, workers=0, tmp_dir=None,
+                 batch_bytes=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            filename (str): Путь к SAM-файлу (можно сжатый).
+            memory_budget (int): Предел памяти под таблицу ключей в байтах (24 байта на рид).
+            workers (int): Процессы для первого прохода; 0 — в текущем процессе.
+            tmp_dir (str): Каталог для разделов таблицы ключей.
+            batch_bytes (int): Размер блока чтения в байтах.
+        """
+        self.filename = filename
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self.tmp_dir = tmp_dir
+        self.batch_bytes = batch_bytes
+        self.records = 0
+        self.duplicate_count = 0
+        self._bitmap = None
+
+    def find(self):
+        """
+        Первый проход: находит дубликаты.
+
+        Returns:
+            np.ndarray: Битовая маска дубликатов (см. KeyTable.duplicates).
+        """
+        reader = Samreader(self.filename)
+        table = KeyTable(self.memory_budget, self.tmp_dir)
+        try:
+            with open_binary(self.filename) as handle:
+                reader._read_batch_header(handle)
+                parse = partial(sam_duplicate_keys,
+                                reference_names=tuple(reader.sam_header.reference_names))
+                chunks = (chunk for _, chunk in iter_line_chunks(handle, self.batch_bytes))
+                offset = 0
+                for count, keys in ordered_map(parse, chunks, self.workers):
+                    keys['index'] += np.uint64(offset)
+                    table.add(keys)
+                    offset += count
+            self.records = offset
+            self._bitmap = table.duplicates(offset, pairs=True)
+        finally:
+            table.close()
+        self.duplicate_count = int(np.unpackbits(self._bitmap).sum())
+        return self._bitmap
+
+    def write(self, output, remove=False):
+        """
+        Второй проход: записывает файл с флагом 0x400 у дубликатов.
+
+        Args:
+            output (str): Путь к результату ('.gz' — BGZF).
+            remove (bool): Не записывать дубликаты вовсе.
+
+        Returns:
+            int: Число дубликатов.
+        """
+        if self._bitmap is None:
+            self.find()
+        bitmap = self._bitmap
+        with open_binary(self.filename) as handle, _open_output(output) as out:
+            header = []
+            while True:
+                offset = handle.tell()
+                line = handle.readline()
+                if not line.startswith(b'@'):
+                    handle.seek(offset)
+                    break
+                header.append(line)
+            header.append(b'@PG\tID:formats.duplicates\tPN:formats\n')
+            out.write(b''.join(header))
+
+            index = 0
+            for _, chunk in iter_line_chunks(handle, self.batch_bytes):
+                newline = chunk.endswith(b'\n')
+                lines = chunk.split(b'\n')
+                if newline:
+                    lines.pop()
+                # Записи — как в parse_sam_chunk: непустые, не заголовок, не меньше 11 полей
+                records = [bool(line) and line[0] != 64 and line.count(b'\t') >= 10
+                           for line in lines]
+                count = sum(records)
+                flags = iter(_bits(bitmap, index, count))
+                index += count
+                kept = []
+                for line, is_record in zip(lines, records):
+                    if is_record:
+                        duplicate = next(flags)
+                        if duplicate and remove:
+                            continue
+                        line = self._set_flag(line, duplicate)
+                    kept.append(line)
+                if kept:
+                    out.write(b'\n'.join(kept) + (b'\n' if newline else b''))
+        return self.duplicate_count
+
+    @staticmethod
+    def _set_flag(line, duplicate):
+        qname, flag, rest = line.split(b'\t', 2)
+        value = int(flag)
+        new = value | DUPLICATE_FLAG if duplicate else value & ~DUPLICATE_FLAG
+        if new == value:
+            return line
+        return b'\t'.join((qname, str(new).encode(), rest))
+
+
+class FastqDeduplicator:
+    """
+    Удаление дубликатов из невыровненных FASTQ по префиксу последовательности.
+
+    Ключ — 64-битный хэш первых prefix_length баз; из ридов с одинаковым
+    ключом остаётся рид с наибольшей суммой качеств (при равенстве — первый
+    в файле). Память ограничена так же, как в DuplicateMarker.
+
+    Пример:
+        >>> dedup = FastqDeduplicator("reads.fastq.gz", prefix_length=50)
+        >>> dedup.write("reads.dedup.fastq.gz")
+    """
+
+    def __init__(self, filename, prefix_length=50, memory_budget=256 << 20, workers=0,
+                 tmp_dir=None, batch_bytes=DEFAULT_CHUNK_SIZE):
+        self.filename = filename
+        self.prefix_length = prefix_length
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self.tmp_dir = tmp_dir
+        self.batch_bytes = batch_bytes
+        self.records = 0
+        self.duplicate_count = 0
+        self._bitmap = None
+
+    def find(self):
+        """Первый проход: находит дубликаты и возвращает битовую маску."""
+        table = KeyTable(self.memory_budget, self.tmp_dir)
+        try:
+            with open_binary(self.filename) as handle:
+                parse = partial(fastq_duplicate_keys, prefix_length=self.prefix_length)
+                chunks = (chunk for _, chunk in
+                          iter_record_chunks(handle, self.batch_bytes, fastq_boundary))
+                offset = 0
+                for count, keys in ordered_map(parse, chunks, self.workers):
+                    keys['index'] += np.uint64(offset)
+                    table.add(keys)
+                    offset += count
+            self.records = offset
+            self._bitmap = table.duplicates(offset)
+        finally:
+            table.close()
+        self.duplicate_count = int(np.unpackbits(self._bitmap).sum())
+        return self._bitmap
+
+    def write(self, output):
+        """
+        Второй проход: записывает FASTQ без дубликатов ('.gz' — со сжатием gzip).
+
+        Returns:
+            int: Число удалённых ридов.
+        """
+        if self._bitmap is None:
+            self.find()
+        opener = gzip.open if output.endswith('.gz') else open
+        with open_binary(self.filename) as handle, opener(output, 'wb') as out:
+            index = 0
+            for _, chunk in iter_record_chunks(handle, self.batch_bytes, fastq_boundary):
+                lines = chunk.splitlines(keepends=True)
+                count = len(lines) // 4
+                flags = _bits(self._bitmap, index, count)
+                index += count
+                out.write(b''.join(b''.join(lines[4 * i:4 * i + 4])
+                                   for i in range(count) if not flags[i]))
+        return self.duplicate_count
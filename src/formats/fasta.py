@@ -3,9 +3,11 @@ FASTA format processor.
 Integrated with common bioinformatics toolkit.
 """
 
-from typing import Iterator, Tuple, Dict, Union, List
+from typing import Iterator, Tuple, Dict, Union, List, Optional
 import os
-import gzip
+
+from .protocol import BatchReader
+from .streams import fasta_boundary, open_text, sniff_compression
 
 
 class BaseBioProcessor:
@@ -13,22 +15,15 @@ class BaseBioProcessor:
 
     def __init__(self, filepath: str):
         self.filepath = filepath
-        self.compressed = self._is_compressed(filepath)
 
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File {filepath} not found")
 
-    @staticmethod
-    def _is_compressed(filepath: str) -> bool:
-        """Check if file is gzip compressed."""
-        return filepath.lower().endswith(('.gz', '.gzip'))
+        self.compressed = sniff_compression(filepath) is not None
 
     def _open_file(self, mode: str = 'r'):
-        """Open file with appropriate mode based on compression."""
-        if self.compressed:
-            return gzip.open(self.filepath, mode + 't', encoding='utf-8')
-        else:
-            return open(self.filepath, mode, encoding='utf-8')
+        """Open file for text reading, detecting compression from magic bytes."""
+        return open_text(self.filepath)
 
     def get_statistics(self) -> dict:
         """Return format-specific statistics."""
@@ -39,7 +34,31 @@ class BaseBioProcessor:
         return True
 
 
-class FastaProcessor(BaseBioProcessor):
+def parse_fasta_chunk(data: bytes):
+    """
+    Parse a chunk of whole FASTA records into a RecordBatch.
+
+    Args:
+        data: Bytes starting at a '>' header and ending at a record boundary
+
+    Returns:
+        RecordBatch with 'NAME' (header without '>') and 'SEQUENCE' columns
+    """
+    from .batch import RecordBatch
+
+    names = []
+    sequences = []
+    text = data.decode('utf-8')
+    start = text.find('>')
+    if start >= 0:
+        for record in text[start + 1:].split('\n>'):
+            header, _, body = record.partition('\n')
+            names.append(header.strip())
+            sequences.append(''.join(body.split()))
+    return RecordBatch({'NAME': names, 'SEQUENCE': sequences})
+
+
+class FastaProcessor(BaseBioProcessor, BatchReader):
     """
     FASTA format processor for sequence analysis.
 
@@ -55,6 +74,16 @@ class FastaProcessor(BaseBioProcessor):
         >>> print(f"Found {count} sequences")
     """
 
+    format_name = 'fasta'
+    batch_fields = ('NAME', 'SEQUENCE')
+    chunk_boundary = staticmethod(fasta_boundary)
+
+    def _batch_path(self) -> str:
+        return self.filepath
+
+    def _chunk_parser(self):
+        return parse_fasta_chunk
+
     def sequence_generator(self) -> Iterator[Tuple[str, str]]:
         """
         Generator yielding sequences from FASTA file.
@@ -69,22 +98,28 @@ class FastaProcessor(BaseBioProcessor):
         """
         current_header = None
         current_sequence = []
+        count = 0
 
-        with self._open_file() as file:
-            for line in file:
-                line = line.strip()
+        try:
+            with self._open_file() as file:
+                for line in file:
+                    line = line.strip()
 
-                if line.startswith('>'):
-                    if current_header is not None:
-                        yield current_header, ''.join(current_sequence)
+                    if line.startswith('>'):
+                        if current_header is not None:
+                            count += 1
+                            yield current_header, ''.join(current_sequence)
 
-                    current_header = line[1:].strip()
-                    current_sequence = []
-                elif line:
-                    current_sequence.append(line)
+                        current_header = line[1:].strip()
+                        current_sequence = []
+                    elif line:
+                        current_sequence.append(line)
 
-            if current_header is not None:
-                yield current_header, ''.join(current_sequence)
+                if current_header is not None:
+                    count += 1
+                    yield current_header, ''.join(current_sequence)
+        finally:
+            self.stats.add('records_parsed', count)
 
     def get_statistics(self) -> Dict[str, Union[int, float]]:
         """
@@ -198,12 +233,74 @@ class FastaProcessor(BaseBioProcessor):
             >>> print(f"Found {len(filtered)} sequences longer than 100bp")
         """
         filtered = []
+        dropped = 0
         for header, sequence in self.sequence_generator():
             seq_len = len(sequence)
             if seq_len >= min_length and (max_length is None or seq_len <= max_length):
                 filtered.append((header, sequence))
+            else:
+                dropped += 1
+        self.stats.add('records_filtered', dropped)
         return filtered
 
+    def extract_regions(self, regions) -> List[Tuple[str, str]]:
+        """
+        Extract subsequences for many regions in one pass over the file.
+
+        Regions are indexed once (IntervalIndex); each sequence is matched
+        against all of them with a single query, so the file is read once
+        regardless of the number of regions. Sequences are matched by the
+        first word of their header.
+
+        Args:
+            regions: BED file path, IntervalIndex, or list of (chrom, start, end)
+                tuples in BED coordinates (0-based, half-open)
+
+        Returns:
+            List of (name, subsequence) in region order; name is the BED name
+            or 'chrom:start-end' (1-based, inclusive). Parts outside the
+            sequence are clipped; regions on missing sequences give ''.
+
+        Example:
+            >>> processor = FastaProcessor("genome.fa")
+            >>> processor.extract_regions([('chr1', 0, 10), ('chr2', 100, 150)])
+            [('chr1:1-10', 'ACGTACGTAC'), ('chr2:101-150', '...')]
+        """
+        from .intervals import as_interval_index
+
+        regions = as_interval_index(regions)
+        starts = regions.starts.tolist()
+        ends = regions.ends.tolist()
+        subsequences = [''] * len(regions)
+        for header, sequence in self.sequence_generator():
+            name = header.split(None, 1)[0] if header else header
+            _, region_ids = regions.overlaps([name], [0], [len(sequence)])
+            for i in region_ids.tolist():
+                subsequences[i] = sequence[starts[i]:ends[i]]
+        names = regions.names or [''] * len(regions)
+        return [(names[i] or f"{chrom}:{start + 1}-{end}", subsequences[i])
+                for i, (chrom, start, end) in enumerate(zip(regions.chroms, starts, ends))]
+
+    def sequence_db(self, output: Optional[str] = None):
+        """
+        Load the file into a deduplicated SequenceDB.
+
+        Args:
+            output: If given, save the database to this path and return it
+                memory-mapped, so worker processes can share it
+
+        Returns:
+            SequenceDB with O(1) lookup by header or by sequence
+
+        Example:
+            >>> db = FastaProcessor("amplicons.fasta").sequence_db("amplicons.sdb")
+            >>> db.headers_for("ACGTTGCA")
+            ['amp_17', 'amp_902']
+        """
+        from .seqdb import SequenceDB
+
+        return SequenceDB.from_fasta(self.filepath, output)
+
 
 # Utility functions for quick operations
 def count_sequences_fasta(filepath: str) -> int:
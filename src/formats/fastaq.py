@@ -1,34 +1,63 @@
 # -*- coding: utf-8 -*-
-import subprocess
-import sys
+from collections import defaultdict
 
-print("УСТАНАВЛИВАЕМ MATPLOTLIB...")
-subprocess.check_call([sys.executable, "-m", "pip", "install", "matplotlib"])
+from .protocol import BatchReader
+from .streams import fastq_boundary, open_text
 
-print("ЗАПУСКАЕМ ОПТИМИЗИРОВАННЫЙ FASTQ АНАЛИЗАТОР...")
-import matplotlib.pyplot as plt
-from collections import defaultdict
 
-class FastqReader:
+def _pyplot():
+    """Ленивый импорт matplotlib: загружается только при построении графиков"""
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def parse_fastq_chunk(data):
+    """Разбирает блок целых FASTQ записей в RecordBatch (NAME, SEQUENCE, QUALITY)"""
+    from .batch import RecordBatch
+
+    lines = data.decode('utf-8').splitlines()
+    usable = len(lines) - len(lines) % 4
+    return RecordBatch({
+        'NAME': [name[1:] for name in lines[0:usable:4]],
+        'SEQUENCE': lines[1:usable:4],
+        'QUALITY': lines[3:usable:4],
+    })
+
+
+class FastqReader(BatchReader):
     """
     Класс для чтения и анализа FASTQ файлов с оптимизацией памяти
     Использует генераторы для работы с большими файлами
+    Сжатие (gzip, bz2, xz) определяется по содержимому файла
     """
+
+    format_name = 'fastq'
+    batch_fields = ('NAME', 'SEQUENCE', 'QUALITY')
+    chunk_boundary = staticmethod(fastq_boundary)
     
     def __init__(self, filename):
         self.filename = filename
         self._sequence_count = None
         self._total_length = None
+        self._tail = None
     
     def _read_fastq_chunks(self):
         """ГЕНЕРАТОР: читает FASTQ файл по одному риду за раз"""
-        with open(self.filename, 'r', encoding='utf-8') as file:
-            while True:
-                # Читаем 4 строки одного рида
-                lines = [file.readline().strip() for _ in range(4)]
-                if not lines[0]:  # Конец файла
-                    break
-                yield lines
+        count = 0
+        try:
+            with open_text(self.filename) as file:
+                while True:
+                    # Читаем 4 строки одного рида
+                    lines = [file.readline().strip() for _ in range(4)]
+                    if not lines[0]:  # Конец файла
+                        break
+                    count += 1
+                    yield lines
+        finally:
+            self.stats.add('records_parsed', count)
+    
+    def _chunk_parser(self):
+        return parse_fastq_chunk
     
     def calculate_statistics(self):
         """Рассчитывает статистику используя генератор (память O(1))"""
@@ -44,6 +73,35 @@ class FastqReader:
         self._total_length = total_length
         return count, total_length
     
+    def update_statistics(self):
+        """
+        Инкрементально обновляет статистику растущего FASTQ файла.
+
+        Запоминает смещение после последней целой записи и накопленные
+        значения; при следующем вызове разбирает только дописанные с тех пор
+        записи. Неполная последняя запись игнорируется до её завершения.
+        Если файл усечён или заменён, статистика считается заново.
+        """
+        from .tail import TailCursor
+
+        if self._tail is None or self._sequence_count is None:
+            self._tail = TailCursor(self.filename, fastq_boundary, stats=self.stats)
+            self._tail.rewind()
+            self._sequence_count = 0
+            self._total_length = 0
+        elif self._tail.rewind():
+            self._sequence_count = 0
+            self._total_length = 0
+        count = 0
+        for chunk in self._tail.poll():
+            lines = chunk.split(b'\n')
+            sequences = lines[1::4]
+            count += len(sequences)
+            self._total_length += sum(map(len, sequences)) - sum(s.endswith(b'\r') for s in sequences)
+        self._sequence_count += count
+        self.stats.add('records_parsed', count)
+        return self._sequence_count, self._total_length
+    
     def get_sequence_count(self):
         """Возвращает количество последовательностей в файле"""
         if self._sequence_count is None:
@@ -58,8 +116,22 @@ class FastqReader:
             return 0
         return self._total_length / self._sequence_count
     
+    def remove_duplicates(self, output, prefix_length=50, memory_budget=256 << 20, workers=0):
+        """Записывает риды без дубликатов по префиксу последовательности, возвращает их число"""
+        from .duplicates import FastqDeduplicator
+        return FastqDeduplicator(self.filename, prefix_length, memory_budget, workers).write(output)
+    
+    def trim(self, output, adapters=(), workers=0, **options):
+        """Обрезает и фильтрует риды по качеству и адаптерам (см. FastqTrimmer), возвращает TrimReport"""
+        from .trimming import FastqTrimmer
+        report = FastqTrimmer(adapters, **options).run(self.filename, output, workers)
+        self.stats.add('records_parsed', report.reads_in)
+        self.stats.add('records_filtered', report.reads_in - report.reads_out)
+        return report
+    
     def plot_per_base_quality(self, output="quality.png"):
         """Строит график качества по позициям (Per Base Sequence Quality)"""
+        plt = _pyplot()
         quality_sums = defaultdict(int)
         quality_counts = defaultdict(int)
         max_position = 0
@@ -76,20 +148,22 @@ class FastqReader:
         positions = range(1, max_position + 2)
         avg_qualities = [quality_sums[i] / quality_counts[i] for i in range(max_position + 1)]
         
-        # Создаем график
-        plt.figure(figsize=(10, 6))
-        plt.plot(positions, avg_qualities, linewidth=2)
-        plt.title('Качество последовательностей по позициям')
-        plt.xlabel('Позиция в риде (bp)')
-        plt.ylabel('Phred Quality Score')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(output, dpi=150)
-        plt.close()
+        with self.stats.stage('plot'):
+            # Создаем график
+            plt.figure(figsize=(10, 6))
+            plt.plot(positions, avg_qualities, linewidth=2)
+            plt.title('Качество последовательностей по позициям')
+            plt.xlabel('Позиция в риде (bp)')
+            plt.ylabel('Phred Quality Score')
+            plt.grid(True, alpha=0.3)
+            plt.tight_layout()
+            plt.savefig(output, dpi=150)
+            plt.close()
         print(f"Сохранен: {output}")
     
     def plot_per_base_content(self, output="content.png"):
         """Строит график содержания нуклеотидов по позициям (Per Base Sequence Content)"""
+        plt = _pyplot()
         base_counts = {'A': defaultdict(int), 'C': defaultdict(int), 
                       'G': defaultdict(int), 'T': defaultdict(int)}
         total_counts = defaultdict(int)
@@ -105,42 +179,63 @@ class FastqReader:
                     max_position = max(max_position, i)
         
         positions = range(1, max_position + 2)
-        plt.figure(figsize=(10, 6))
+        with self.stats.stage('plot'):
+            plt.figure(figsize=(10, 6))
         
-        # Строим линии для каждого нуклеотида
-        for base, counts in base_counts.items():
-            percentages = [counts[i] / total_counts[i] * 100 if total_counts[i] > 0 else 0 
-                          for i in range(max_position + 1)]
-            plt.plot(positions, percentages, label=base, linewidth=2)
+            # Строим линии для каждого нуклеотида
+            for base, counts in base_counts.items():
+                percentages = [counts[i] / total_counts[i] * 100 if total_counts[i] > 0 else 0 
+                              for i in range(max_position + 1)]
+                plt.plot(positions, percentages, label=base, linewidth=2)
         
-        plt.title('Содержание нуклеотидов по позициям')
-        plt.xlabel('Позиция в риде (bp)')
-        plt.ylabel('Процент (%)')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(output, dpi=150)
-        plt.close()
+            plt.title('Содержание нуклеотидов по позициям')
+            plt.xlabel('Позиция в риде (bp)')
+            plt.ylabel('Процент (%)')
+            plt.legend()
+            plt.grid(True, alpha=0.3)
+            plt.tight_layout()
+            plt.savefig(output, dpi=150)
+            plt.close()
         print(f"Сохранен: {output}")
     
     def plot_sequence_length_distribution(self, output="length.png"):
         """Строит гистограмму распределения длин последовательностей"""
-        lengths = []
+        plt = _pyplot()
+        # Гистограмма длин вместо списка длин всех ридов
+        lengths = defaultdict(int)
         
         for chunk in self._read_fastq_chunks():
             sequence_line = chunk[1]  # Вторая строка - последовательность
-            lengths.append(len(sequence_line))
+            lengths[len(sequence_line)] += 1
         
-        plt.figure(figsize=(10, 6))
-        plt.hist(lengths, bins=20, edgecolor='black', alpha=0.7)
-        plt.title('Распределение длин последовательностей')
-        plt.xlabel('Длина последовательности (bp)')
-        plt.ylabel('Частота')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(output, dpi=150)
-        plt.close()
+        with self.stats.stage('plot'):
+            plt.figure(figsize=(10, 6))
+            plt.hist(list(lengths), weights=list(lengths.values()), bins=20,
+                     edgecolor='black', alpha=0.7)
+            plt.title('Распределение длин последовательностей')
+            plt.xlabel('Длина последовательности (bp)')
+            plt.ylabel('Частота')
+            plt.grid(True, alpha=0.3)
+            plt.tight_layout()
+            plt.savefig(output, dpi=150)
+            plt.close()
+        print(f"Сохранен: {output}")
+    
+    def qc_report(self, output="qc.html", workers=0):
+        """
+        Строит отчет QC со всеми панелями в одной фигуре (или HTML-странице).
+
+        Данные сводятся в компактные гистограммы (qc.QCAggregates) за один
+        векторный проход по блокам файла, отрисовка идет по ним через Agg без pyplot.
+        Возвращает агрегаты, их можно сохранить для пакетной отрисовки (qc.render_reports).
+        """
+        from .qc import QCAggregates, render_report
+        aggregates = QCAggregates.from_file(self.filename, workers)
+        self.stats.add('records_parsed', aggregates.reads)
+        with self.stats.stage('plot'):
+            render_report(aggregates, output, title=self.filename)
         print(f"Сохранен: {output}")
+        return aggregates
     
     def generate_all_plots(self):
         """Генерирует все три графика качества"""
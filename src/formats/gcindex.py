@@ -0,0 +1,296 @@
+"""
+Prefix-sum GC/N-content index for FASTA files.
+Built once, stored as a memory-mapped sidecar next to the FASTA.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import struct
+
+import numpy as np
+
+from .fasta import FastaProcessor
+from .streams import open_binary
+
+
+GCI_MAGIC = b'GCIX'
+GCI_VERSION = 1
+GCI_SUFFIX = '.gci'
+
+# Column order of the cumulative count matrix
+COLUMNS = ('gc', 'n', 'masked')
+
+_GC = np.zeros(256, dtype=bool)
+_ACGT = np.zeros(256, dtype=bool)
+for _base in 'ACGT':
+    _ACGT[ord(_base)] = _ACGT[ord(_base.lower())] = True
+    if _base in 'GC':
+        _GC[ord(_base)] = _GC[ord(_base.lower())] = True
+
+
+def _block_counts(raw: bytes, resolution: int) -> np.ndarray:
+    """Per-block (gc, n, masked) counts for a chunk of sequence bytes."""
+    codes = np.frombuffer(raw, dtype=np.uint8)
+    flags = np.stack((_GC[codes], ~_ACGT[codes], (codes >= ord('a')) & (codes <= ord('z'))),
+                     axis=1)
+    pad = (-len(codes)) % resolution
+    if pad:
+        flags = np.concatenate((flags, np.zeros((pad, 3), dtype=bool)))
+    return flags.reshape(-1, resolution, 3).sum(axis=1, dtype=np.uint32)
+
+
+class GCIndex:
+    """
+    Cumulative G/C, N and soft-masked counts per sequence of a FASTA file.
+
+    Counts are stored every `resolution` bases, so any window whose bounds
+    are multiples of the resolution (or the sequence end) is answered with
+    two array lookups. The sidecar file (<fasta>.gci) is memory-mapped.
+
+    Example:
+        >>> index = GCIndex.open("hg38.fa")
+        >>> index.gc_fraction("chr1", 1000000, 2000000)
+        0.4538
+        >>> index.write_bedgraph("chr_gc_1kb.bedgraph", window=1000)
+    """
+
+    def __init__(self, index_path: str):
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"File {index_path} not found")
+        self.index_path = index_path
+        with open(index_path, 'rb') as f:
+            magic, version, header_size = struct.unpack('<4sII', f.read(12))
+            if magic != GCI_MAGIC or version != GCI_VERSION:
+                raise ValueError(f"{index_path} is not a GC index file")
+            self.header = json.loads(f.read(header_size).decode('utf-8'))
+        self.resolution = self.header['resolution']
+        rows = sum(seq['blocks'] + 1 for seq in self.header['sequences'])
+        offset = self._data_offset(header_size)
+        if rows:
+            self._counts = np.memmap(index_path, dtype='<u4', mode='r',
+                                     offset=offset, shape=(rows, len(COLUMNS)))
+        else:
+            self._counts = np.zeros((0, len(COLUMNS)), dtype='<u4')
+        self._sequences = {}
+        row = 0
+        for seq in self.header['sequences']:
+            self._sequences[seq['name']] = dict(seq, row=row)
+            row += seq['blocks'] + 1
+
+    @staticmethod
+    def _data_offset(header_size: int) -> int:
+        """Count matrix starts at the next 8-byte boundary after the header."""
+        return (12 + header_size + 7) // 8 * 8
+
+    @staticmethod
+    def sidecar_path(fasta_path: str) -> str:
+        """Default index location for a FASTA file."""
+        return fasta_path + GCI_SUFFIX
+
+    @classmethod
+    def build(cls, fasta_path: str, resolution: int = 100,
+              index_path: Optional[str] = None) -> 'GCIndex':
+        """
+        Scan a FASTA file once and write its GC index.
+
+        Args:
+            fasta_path: Path to FASTA file (optionally gzipped)
+            resolution: Block size in bases; window bounds must be multiples of it
+            index_path: Output path, defaults to <fasta_path>.gci
+
+        Returns:
+            Loaded GCIndex
+        """
+        if resolution < 1:
+            raise ValueError("resolution must be positive")
+        processor = FastaProcessor(fasta_path)
+        index_path = index_path or cls.sidecar_path(fasta_path)
+        sequences = []
+        matrices = []
+        for name, length, blocks in cls._scan(processor, resolution):
+            cumulative = np.zeros((len(blocks) + 1, len(COLUMNS)), dtype='<u4')
+            np.cumsum(blocks, axis=0, out=cumulative[1:])
+            sequences.append({'name': name, 'length': length, 'blocks': len(blocks)})
+            matrices.append(cumulative)
+
+        stat = os.stat(fasta_path)
+        header = json.dumps({
+            'resolution': resolution,
+            'columns': list(COLUMNS),
+            'fasta_size': stat.st_size,
+            'fasta_mtime': stat.st_mtime,
+            'sequences': sequences,
+        }).encode('utf-8')
+        with open(index_path, 'wb') as out:
+            out.write(struct.pack('<4sII', GCI_MAGIC, GCI_VERSION, len(header)))
+            out.write(header)
+            out.write(b'\0' * (cls._data_offset(len(header)) - 12 - len(header)))
+            for matrix in matrices:
+                out.write(matrix.tobytes())
+        return cls(index_path)
+
+    @staticmethod
+    def _scan(processor: FastaProcessor,
+              resolution: int) -> Iterator[Tuple[str, int, np.ndarray]]:
+        """Yield (name, length, per-block counts) for each FASTA record."""
+        chunk_size = resolution * max(1, (1 << 22) // resolution)
+        handle = open_binary(processor.filepath)
+        name = None
+        length = 0
+        buffer = bytearray()
+        blocks = []
+        with handle:
+            for line in handle:
+                line = line.strip()
+                if line.startswith(b'>'):
+                    if name is not None:
+                        blocks.append(_block_counts(bytes(buffer), resolution))
+                        yield name, length, np.concatenate(blocks)
+                    name = line[1:].split()[0].decode('utf-8') if line[1:].strip() else ''
+                    length = 0
+                    buffer = bytearray()
+                    blocks = [np.zeros((0, len(COLUMNS)), dtype=np.uint32)]
+                elif line and name is not None:
+                    buffer += line
+                    length += len(line)
+                    if len(buffer) >= chunk_size:
+                        blocks.append(_block_counts(bytes(buffer[:chunk_size]), resolution))
+                        del buffer[:chunk_size]
+            if name is not None:
+                blocks.append(_block_counts(bytes(buffer), resolution))
+                yield name, length, np.concatenate(blocks)
+
+    @classmethod
+    def open(cls, fasta_path: str, resolution: int = 100) -> 'GCIndex':
+        """
+        Load the sidecar index, rebuilding it if missing or stale.
+
+        Args:
+            fasta_path: Path to FASTA file
+            resolution: Resolution to use when (re)building
+
+        Returns:
+            GCIndex for the FASTA file
+        """
+        index_path = cls.sidecar_path(fasta_path)
+        if os.path.exists(index_path):
+            index = cls(index_path)
+            stat = os.stat(fasta_path)
+            if (index.header['fasta_size'] == stat.st_size
+                    and index.header['fasta_mtime'] == stat.st_mtime
+                    and index.resolution == resolution):
+                return index
+        return cls.build(fasta_path, resolution)
+
+    def names(self) -> List[str]:
+        """Sequence names in FASTA order."""
+        return list(self._sequences)
+
+    def sequence_length(self, chrom: str) -> int:
+        """Length of a sequence in bases."""
+        return self._sequences[chrom]['length']
+
+    def _cumulative(self, chrom: str) -> np.ndarray:
+        """Cumulative count matrix of one sequence (a view into the memory map)."""
+        if chrom not in self._sequences:
+            raise KeyError(f"Sequence {chrom} not in index")
+        seq = self._sequences[chrom]
+        return self._counts[seq['row']:seq['row'] + seq['blocks'] + 1]
+
+    def _block_index(self, chrom: str, positions: np.ndarray) -> np.ndarray:
+        """Convert base positions to block indices, checking alignment."""
+        length = self.sequence_length(chrom)
+        positions = np.clip(np.asarray(positions, dtype=np.int64), 0, length)
+        aligned = (positions % self.resolution == 0) | (positions == length)
+        if not np.all(aligned):
+            raise ValueError(
+                f"Positions must be multiples of the index resolution ({self.resolution})"
+            )
+        return (positions + self.resolution - 1) // self.resolution
+
+    def counts(self, chrom: str, start: int = 0, end: Optional[int] = None) -> Dict[str, int]:
+        """
+        G/C, N and soft-masked counts in [start, end).
+
+        Args:
+            chrom: Sequence name
+            start: Start position (0-based, multiple of resolution)
+            end: End position (exclusive, multiple of resolution or sequence end)
+
+        Returns:
+            Dictionary with 'length', 'gc', 'n' and 'masked'
+        """
+        end = self.sequence_length(chrom) if end is None else min(end, self.sequence_length(chrom))
+        first, last = self._block_index(chrom, np.array([start, end]))
+        cumulative = self._cumulative(chrom)
+        diff = cumulative[last].astype(np.int64) - cumulative[first]
+        result = {'length': max(0, end - start)}
+        result.update({column: int(value) for column, value in zip(COLUMNS, diff)})
+        return result
+
+    def gc_fraction(self, chrom: str, start: int = 0, end: Optional[int] = None) -> float:
+        """GC fraction over non-N bases in [start, end); 0.0 for all-N windows."""
+        counts = self.counts(chrom, start, end)
+        called = counts['length'] - counts['n']
+        return counts['gc'] / called if called else 0.0
+
+    def windows(self, chrom: str, window: int,
+                step: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Vectorised statistics for sliding windows along one sequence.
+
+        Args:
+            chrom: Sequence name
+            window: Window size (multiple of resolution)
+            step: Step between window starts, defaults to window
+
+        Returns:
+            Dictionary of arrays: 'start', 'end', 'gc', 'n', 'masked',
+            'gc_fraction' and 'n_fraction'
+        """
+        step = step or window
+        length = self.sequence_length(chrom)
+        starts = np.arange(0, max(length, 1), step, dtype=np.int64)
+        ends = np.minimum(starts + window, length)
+        cumulative = self._cumulative(chrom).astype(np.int64)
+        diff = cumulative[self._block_index(chrom, ends)] - cumulative[self._block_index(chrom, starts)]
+        sizes = ends - starts
+        called = sizes - diff[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gc_fraction = np.where(called > 0, diff[:, 0] / np.maximum(called, 1), 0.0)
+            n_fraction = np.where(sizes > 0, diff[:, 1] / np.maximum(sizes, 1), 0.0)
+        return {
+            'start': starts,
+            'end': ends,
+            'gc': diff[:, 0],
+            'n': diff[:, 1],
+            'masked': diff[:, 2],
+            'gc_fraction': gc_fraction,
+            'n_fraction': n_fraction,
+        }
+
+    def write_bedgraph(self, output: str, window: int, metric: str = 'gc_fraction',
+                       step: Optional[int] = None) -> int:
+        """
+        Write a bedgraph of a window metric across all sequences.
+
+        Args:
+            output: Output bedgraph path
+            window: Window size (multiple of resolution)
+            metric: One of 'gc_fraction', 'n_fraction', 'gc', 'n', 'masked'
+            step: Step between window starts, defaults to window
+
+        Returns:
+            Number of windows written
+        """
+        written = 0
+        with open(output, 'w', encoding='utf-8') as out:
+            for chrom in self._sequences:
+                stats = self.windows(chrom, window, step)
+                values = stats[metric]
+                value_format = '%.6f' if values.dtype.kind == 'f' else '%d'
+                for start, end, value in zip(stats['start'], stats['end'], values):
+                    out.write(f"{chrom}\t{start}\t{end}\t{value_format % value}\n")
+                written += len(values)
+        return written
@@ -0,0 +1,199 @@
+"""
+Batch interval overlap queries.
+Intervals are sorted once per sequence; all queries are then answered in a
+single vectorised sweep with np.searchsorted instead of one scan per query.
+Coordinates are 0-based and half-open, as in BED.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .streams import open_text
+
+
+def read_bed(filepath: str):
+    """
+    Read a BED file (gzip/bz2/xz detected automatically).
+
+    'track', 'browser' and '#' lines are skipped; only the first four
+    columns are used.
+
+    Args:
+        filepath: Path to the BED file
+
+    Returns:
+        RecordBatch with 'CHROM', 'START', 'END' (int64) and 'NAME' columns;
+        NAME is '' when the file has fewer than four columns
+
+    Example:
+        >>> bed = read_bed("exons.bed")
+        >>> bed['START'][:3]
+        array([11868, 12612, 13220])
+    """
+    from .batch import RecordBatch
+
+    chroms, starts, ends, names = [], [], [], []
+    with open_text(filepath) as f:
+        for line in f:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            chroms.append(fields[0])
+            starts.append(int(fields[1]))
+            ends.append(int(fields[2]))
+            names.append(fields[3] if len(fields) > 3 else '')
+    return RecordBatch({'CHROM': chroms,
+                        'START': np.array(starts, dtype=np.int64),
+                        'END': np.array(ends, dtype=np.int64),
+                        'NAME': names})
+
+
+class _Sequence:
+    """Intervals of one sequence sorted by start, with running maximum of ends."""
+
+    __slots__ = ('starts', 'ends', 'max_ends', 'ids')
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, ids: np.ndarray):
+        order = np.argsort(starts, kind='stable')
+        self.starts = starts[order]
+        # Zero-length intervals cover their start position
+        self.ends = np.maximum(ends[order], self.starts + 1)
+        self.ids = ids[order]
+        self.max_ends = np.maximum.accumulate(self.ends) if len(order) else self.ends
+
+
+class IntervalIndex:
+    """
+    Static index of intervals answering many overlap queries at once.
+
+    For each sequence, intervals are sorted by start and the running maximum
+    of their ends is kept. The intervals that may overlap a query [s, e) then
+    form one contiguous range: from the first interval whose running maximum
+    end exceeds s to the last interval starting before e. Both bounds for all
+    queries come from two np.searchsorted calls; the candidate ranges are
+    expanded and filtered vectorised. Queries cost O(log n + candidates).
+
+    Example:
+        >>> exons = IntervalIndex.from_bed("exons.bed")
+        >>> query_ids, exon_ids = exons.overlaps(['chr1', 'chr1'], [100, 5000], [200, 5100])
+    """
+
+    def __init__(self, chroms: Sequence[str], starts: Sequence[int], ends: Sequence[int]):
+        """
+        Args:
+            chroms: Sequence name of each interval
+            starts: 0-based starts
+            ends: 0-based exclusive ends
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if len(chroms) != len(starts) or len(starts) != len(ends):
+            raise ValueError("chroms, starts and ends must have the same length")
+        self.chroms = list(chroms)
+        self.starts = starts
+        self.ends = ends
+        self.names = None  # type: Optional[List[str]]
+        self._sequences = {}  # type: Dict[str, _Sequence]
+        for name, ids in _group(self.chroms).items():
+            self._sequences[name] = _Sequence(starts[ids], ends[ids], ids)
+
+    @classmethod
+    def from_bed(cls, filepath: str) -> 'IntervalIndex':
+        """Build an index from a BED file; interval ids are line numbers among records."""
+        bed = read_bed(filepath)
+        index = cls(bed['CHROM'], bed['START'], bed['END'])
+        index.names = bed['NAME']
+        return index
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.chroms, self.starts.tolist(), self.ends.tolist()))
+
+    def sequence_names(self) -> List[str]:
+        """Sequence names in order of first appearance."""
+        return list(self._sequences)
+
+    def overlaps(self, chroms: Sequence[str], starts: Sequence[int],
+                 ends: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        All (query, interval) pairs that overlap.
+
+        Zero-length queries or intervals (start == end) are treated as
+        covering the single position start, like VCF insertions in tabix.
+
+        Args:
+            chroms: Sequence name of each query
+            starts: 0-based query starts
+            ends: 0-based exclusive query ends
+
+        Returns:
+            Tuple (query_ids, interval_ids) of int64 arrays, ordered by query
+            and then by interval start
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.maximum(np.asarray(ends, dtype=np.int64), starts + 1)
+        query_parts, target_parts = [], []
+        for name, queries in _group(chroms).items():
+            sequence = self._sequences.get(name)
+            if sequence is None:
+                continue
+            query_ids, target_ids = _sweep(sequence, starts[queries], ends[queries])
+            query_parts.append(queries[query_ids])
+            target_parts.append(target_ids)
+        if not query_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        query_ids = np.concatenate(query_parts)
+        target_ids = np.concatenate(target_parts)
+        order = np.argsort(query_ids, kind='stable')
+        return query_ids[order], target_ids[order]
+
+    def count_overlaps(self, chroms: Sequence[str], starts: Sequence[int],
+                       ends: Sequence[int]) -> np.ndarray:
+        """Number of intervals overlapping each query."""
+        query_ids, _ = self.overlaps(chroms, starts, ends)
+        return np.bincount(query_ids, minlength=len(starts))
+
+
+def _group(names: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Row indices of each distinct name, in order of first appearance."""
+    groups = {}  # type: Dict[str, List[int]]
+    for i, name in enumerate(names):
+        groups.setdefault(name, []).append(i)
+    return {name: np.array(rows, dtype=np.int64) for name, rows in groups.items()}
+
+
+def _sweep(sequence: _Sequence, starts: np.ndarray,
+           ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Overlapping (local query index, interval id) pairs on one sequence."""
+    low = np.searchsorted(sequence.max_ends, starts, side='right')
+    high = np.searchsorted(sequence.starts, ends, side='left')
+    counts = np.maximum(high - low, 0)
+    total = int(counts.sum())
+    query_ids = np.repeat(np.arange(len(starts)), counts)
+    candidates = np.repeat(low, counts) + \
+        np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    hit = sequence.ends[candidates] > starts[query_ids]
+    return query_ids[hit], sequence.ids[candidates[hit]]
+
+
+RegionsLike = Union[str, IntervalIndex, Iterable[Tuple[str, int, int]]]
+
+
+def as_interval_index(regions: RegionsLike) -> IntervalIndex:
+    """
+    Normalise a regions argument to an IntervalIndex.
+
+    Args:
+        regions: BED file path, IntervalIndex, or iterable of
+            (chrom, start, end) tuples in BED coordinates (0-based, half-open)
+    """
+    if isinstance(regions, IntervalIndex):
+        return regions
+    if isinstance(regions, str):
+        return IntervalIndex.from_bed(regions)
+    regions = list(regions)
+    return IntervalIndex([r[0] for r in regions], [r[1] for r in regions],
+                         [r[2] for r in regions])
@@ -0,0 +1,112 @@
+"""
+Ordered parallel execution for chunked parsing.
+A reader thread feeds work items through a bounded queue into a process pool;
+results come back in input order.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Full, Queue
+from typing import Callable, Iterable, Iterator, Optional
+import os
+import threading
+
+
+_END = object()
+
+
+class _Failure:
+    """Exception raised by the reader thread, re-raised in the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(queue: Queue, item, stop: threading.Event) -> bool:
+    """Put with periodic checks of the stop flag; False if stopped."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def ordered_map(func: Callable, items: Iterable, workers: Optional[int] = None,
+                max_pending: Optional[int] = None,
+                discard: Optional[Callable] = None) -> Iterator:
+    """
+    Apply func to items in worker processes, yielding results in input order.
+
+    Items are produced by a background thread (e.g. reading file chunks)
+    into a queue of at most max_pending entries, and at most max_pending
+    tasks are in flight, so memory stays bounded when the consumer is slow.
+
+    Args:
+        func: Picklable top-level function (or functools.partial of one)
+        items: Iterable of picklable work items
+        workers: Number of worker processes; 0 runs everything in-process
+        max_pending: Bound on queued items and in-flight tasks (default 2 * workers)
+        discard: Called with results that were computed but never yielded
+                 (consumer stopped early), e.g. to free resources they hold
+
+    Yields:
+        func(item) for each item, in the order of items
+
+    Example:
+        >>> for batch in ordered_map(parse_sam_chunk, chunks, workers=8):
+        ...     total += len(batch)
+    """
+    if workers == 0:
+        for item in items:
+            yield func(item)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    queue = Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                if not _put(queue, item, stop):
+                    return
+        except BaseException as error:
+            _put(queue, _Failure(error), stop)
+            return
+        _put(queue, _END, stop)
+
+    reader = threading.Thread(target=produce, name='ordered-map-reader', daemon=True)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        reader.start()
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < max_pending:
+                    item = queue.get()
+                    if item is _END:
+                        exhausted = True
+                    elif isinstance(item, _Failure):
+                        raise item.error
+                    else:
+                        pending.append(pool.submit(func, item))
+                if not pending:
+                    break
+                yield pending.popleft().result()
+        finally:
+            stop.set()
+            for future in pending:
+                if not future.cancel() and discard is not None:
+                    try:
+                        discard(future.result())
+                    except Exception:
+                        pass
+            try:
+                while True:
+                    queue.get_nowait()
+            except Empty:
+                pass
+            reader.join()
@@ -0,0 +1,175 @@
+"""
+Common batch record protocol for all format readers.
+"""
+
+from functools import partial
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple
+import time
+
+from .stats import NULL_STATS, timed_call
+from .streams import DEFAULT_CHUNK_SIZE, iter_record_chunks, line_boundary, open_binary
+
+
+def _timed_chunks(chunks: Iterable[Tuple[int, bytes]], stats) -> Iterator[bytes]:
+    """Yield chunk bytes, recording read time and decompressed size."""
+    iterator = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        try:
+            _, chunk = next(iterator)
+        except StopIteration:
+            return
+        stats.add_time('read', time.perf_counter() - start)
+        stats.add('bytes_decompressed', len(chunk))
+        yield chunk
+
+
+class BatchReader:
+    """
+    Mixin giving a reader the shared chunked/parallel batch pipeline.
+
+    A reader provides the path of its file, how to consume the header, where
+    a chunk may be cut and a picklable function that parses one chunk into a
+    RecordBatch. The mixin then handles decompression, chunking and
+    (optionally) parallel parsing in worker processes.
+
+    Example:
+        >>> reader = formats.open("calls.vcf.gz")
+        >>> for batch in reader.iter_batches(workers=4):
+        ...     print(batch.fields, len(batch))
+        >>> async for batch in reader.aiter_batches():
+        ...     await store(batch)
+    """
+
+    #: Format name used by the registry
+    format_name = None
+
+    #: Names of the columns in produced batches
+    batch_fields = ()
+
+    #: Function(bytes) -> cut position for record-aligned chunks
+    chunk_boundary = staticmethod(line_boundary)
+
+    #: Instrumentation; assign a ReaderStats instance to enable it
+    stats = NULL_STATS
+
+    def _batch_path(self) -> str:
+        """Path of the file to read."""
+        return self.filename
+
+    def _read_batch_header(self, handle) -> None:
+        """Consume header lines, leaving handle at the first record."""
+
+    def _chunk_parser(self) -> Callable:
+        """Picklable function(bytes) -> RecordBatch."""
+        raise NotImplementedError
+
+    def iter_batches(self, batch_bytes: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = 0,
+                     max_pending: Optional[int] = None, shared_memory: bool = False) -> Iterator:
+        """
+        Iterate over the file as columnar RecordBatch objects.
+
+        Args:
+            batch_bytes: Approximate (decompressed) size of each batch in bytes
+            workers: Worker processes for parsing; 0 parses in-process,
+                     None uses all CPUs
+            max_pending: Bound on chunks queued or in flight
+            shared_memory: Return parsed batches from workers through shared
+                memory instead of pickling them (see formats.sharedmem);
+                numeric and text columns are then read-only views
+
+        Yields:
+            RecordBatch with the fields listed in batch_fields
+        """
+        if shared_memory and workers != 0:
+            from .sharedmem import shared_map as ordered_map
+        else:
+            from .parallel import ordered_map
+
+        stats = self.stats
+        with open_binary(self._batch_path(), stats) as handle:
+            self._read_batch_header(handle)
+            parse = self._chunk_parser()
+            chunks = iter_record_chunks(handle, batch_bytes, self.chunk_boundary)
+            if not stats.enabled:
+                chunks = (chunk for _, chunk in chunks)
+                for batch in ordered_map(parse, chunks, workers, max_pending):
+                    yield batch
+                return
+
+            timed_parse = partial(timed_call, parse)
+            for seconds, batch in ordered_map(timed_parse, _timed_chunks(chunks, stats),
+                                              workers, max_pending):
+                stats.add_time('parse', seconds)
+                stats.add('records_parsed', len(batch))
+                stats.add('batches')
+                yield batch
+
+    async def aiter_batches(self, batch_bytes: int = DEFAULT_CHUNK_SIZE, prefetch: int = 2,
+                            executor=None) -> AsyncIterator:
+        """
+        Asynchronously iterate over the file as RecordBatch objects.
+
+        File reads, decompression and parsing run in an executor (the loop's
+        default thread pool unless one is given), one batch at a time per
+        reader, so no thread is held between batches. Up to `prefetch`
+        batches are read ahead while the consumer awaits.
+
+        Args:
+            batch_bytes: Approximate size of each batch in bytes
+            prefetch: Maximum number of batches read ahead
+            executor: concurrent.futures executor for blocking work
+
+        Yields:
+            RecordBatch objects in file order
+
+        Example:
+            >>> async def ingest(path):
+            ...     async for batch in formats.open(path).aiter_batches():
+            ...         await db.insert(batch)
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        batches = self.iter_batches(batch_bytes, workers=0)
+        queue = asyncio.Queue(maxsize=max(1, prefetch))
+        end = object()
+        reading = None
+
+        async def produce():
+            nonlocal reading
+            try:
+                while True:
+                    reading = loop.run_in_executor(executor, next, batches, end)
+                    # Cancelling the producer must not detach the running next() call
+                    batch = await asyncio.shield(reading)
+                    await queue.put(batch)
+                    if batch is end:
+                        return
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                await queue.put(error)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+            # A read still running in the executor must finish before the generator is closed
+            if reading is not None:
+                try:
+                    await reading
+                except Exception:
+                    pass
+            await loop.run_in_executor(executor, batches.close)
@@ -0,0 +1,373 @@
+from functools import partial
+import base64
+import html
+import io
+
+import numpy as np
+
+from .parallel import ordered_map
+from .streams import DEFAULT_CHUNK_SIZE, fastq_boundary, iter_record_chunks, open_binary
+
+
+#: Максимальное Phred-качество (символ '~' при смещении 33)
+MAX_QUALITY = 93
+
+# Коды оснований для таблицы состава: A, C, G, T, прочие (N)
+BASES = 'ACGTN'
+_BASE_INDEX = np.full(256, 4, dtype=np.uint8)
+for _i, _base in enumerate('ACGT'):
+    _BASE_INDEX[ord(_base)] = _i
+    _BASE_INDEX[ord(_base.lower())] = _i
+
+# Не больше стольких столбцов по оси позиций: длинные риды группируются в окна
+MAX_POSITION_BINS = 100
+
+# Столько оснований блока обрабатывается за один шаг from_chunk
+_SLICE_BASES = 1 << 18
+
+#: Позиции до EXACT_POSITIONS хранятся в гистограммах по одной, дальше каждая
+#: октава [2^j, 2^(j+1)) делится на BINS_PER_OCTAVE окон (степени двойки)
+EXACT_POSITIONS = 256
+BINS_PER_OCTAVE = 64
+_EXACT_BITS = EXACT_POSITIONS.bit_length() - 1
+_OCTAVE_BITS = BINS_PER_OCTAVE.bit_length() - 1
+
+
+def position_rows(positions):
+    """Номера строк гистограмм для позиций (с 0): точно до EXACT_POSITIONS, дальше по окнам."""
+    positions = np.asarray(positions, dtype=np.int64)
+    if not positions.size or positions.max() < EXACT_POSITIONS:
+        return positions
+    octave = np.frexp(np.maximum(positions, 1).astype(np.float64))[1] - 1
+    shift = np.maximum(octave - _OCTAVE_BITS, 0)
+    binned = EXACT_POSITIONS + (octave - _EXACT_BITS) * BINS_PER_OCTAVE + \
+        (positions >> shift) - BINS_PER_OCTAVE
+    return np.where(positions < EXACT_POSITIONS, positions, binned)
+
+
+def row_starts(rows):
+    """Первая позиция (с 0) каждой из rows строк гистограмм; обратное к position_rows."""
+    index = np.arange(rows, dtype=np.int64)
+    binned = np.maximum(index - EXACT_POSITIONS, 0)
+    octave = _EXACT_BITS + binned // BINS_PER_OCTAVE
+    starts = (BINS_PER_OCTAVE + binned % BINS_PER_OCTAVE) << (octave - _OCTAVE_BITS)
+    return np.where(index < EXACT_POSITIONS, index, starts)
+
+
+def _grow(array, size):
+    """Массив не меньше size строк; при нехватке ёмкость растёт не меньше чем вдвое."""
+    if len(array) >= size:
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class QCAggregates:
+    """
+    Компактные агрегаты контроля качества FASTQ, из которых строится отчёт.
+
+    Вместо списков значений по ридам хранятся только гистограммы, размер
+    которых не зависит от числа ридов:
+
+    - quality: матрица (строка позиций × качество 0..93) числа оснований;
+    - bases: матрица (строка позиций × A, C, G, T, N) числа оснований;
+    - lengths: гистограмма длин ридов (индекс — длина);
+    - gc: гистограмма GC-состава ридов по процентам 0..100.
+
+    Строки позиций (position_rows) точны до EXACT_POSITIONS, дальше позиции
+    группируются в окна, ширина которых растёт вдвое с каждой октавой, так
+    что и для ридов в десятки тысяч оснований матрицы — сотни строк.
+    Границы окон не зависят от данных, поэтому агрегаты складываются.
+
+    Агрегаты блоков считаются векторно и складываются (merge), поэтому
+    файл обрабатывается параллельно по блокам, а агрегаты разных образцов
+    можно сохранить (save) и отрисовать позже без повторного чтения FASTQ.
+
+    Пример:
+        >>> qc = QCAggregates.from_file("reads.fastq.gz", workers=8)
+        >>> qc.save("reads.qc.npz")
+        >>> render_report(qc, "reads.qc.html", title="reads")
+    """
+
+    def __init__(self, quality=None, bases=None, lengths=None, gc=None):
+        # Буферы растут в merge с запасом; видимы только первые _rows/_size строк
+        self._quality = np.zeros((0, MAX_QUALITY + 1), dtype=np.int64) if quality is None \
+            else quality
+        self._bases = np.zeros((0, len(BASES)), dtype=np.int64) if bases is None else bases
+        self._lengths = np.zeros(0, dtype=np.int64) if lengths is None else lengths
+        self._rows = len(self._quality)
+        self._size = len(self._lengths)
+        self.gc = np.zeros(101, dtype=np.int64) if gc is None else gc
+
+    @property
+    def quality(self):
+        return self._quality[:self._rows]
+
+    @property
+    def bases(self):
+        return self._bases[:self._rows]
+
+    @property
+    def lengths(self):
+        return self._lengths[:self._size]
+
+    @property
+    def reads(self):
+        return int(self.lengths.sum())
+
+    @property
+    def total_bases(self):
+        return int((self.lengths * np.arange(len(self.lengths))).sum())
+
+    @classmethod
+    def from_chunk(cls, data, phred_offset=33):
+        """
+        Агрегаты блока целых FASTQ записей.
+
+        Args:
+            data (bytes): Блок FASTQ.
+            phred_offset (int): Смещение кодировки качества.
+        """
+        lines = data.split(b'\n')
+        if lines and not lines[-1]:
+            lines.pop()
+        lines = [line.rstrip(b'\r') for line in lines[:len(lines) - len(lines) % 4]]
+        sequences, qualities = lines[1::4], lines[3::4]
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        if not len(lengths):
+            return cls()
+        total = int(lengths.sum())
+        quality_values = np.frombuffer(b''.join(qualities), dtype=np.uint8)
+        if len(quality_values) != total:
+            raise ValueError("Длина строки качества не совпадает с длиной последовательности")
+        codes = _BASE_INDEX[np.frombuffer(b''.join(sequences), dtype=np.uint8)]
+        width = int(position_rows(lengths.max() - 1)) + 1 if total else 0
+        quality = np.zeros((width, MAX_QUALITY + 1), dtype=np.int64)
+        bases = np.zeros((width, len(BASES)), dtype=np.int64)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        # Риды обрабатываются группами около _SLICE_BASES оснований, чтобы
+        # временные массивы по основаниям не росли с блоком
+        bounds = np.searchsorted(ends, np.arange(_SLICE_BASES, total, _SLICE_BASES))
+        for first, last in zip(np.r_[0, bounds + 1], np.r_[bounds + 1, len(lengths)]):
+            if first >= last:
+                continue
+            low, high = int(starts[first]), int(ends[last - 1])
+            group = lengths[first:last]
+            rows = position_rows(np.arange(high - low) -
+                                 np.repeat(starts[first:last] - low, group))
+            values = np.clip(quality_values[low:high].astype(np.int64) - phred_offset,
+                             0, MAX_QUALITY)
+            quality += np.bincount(rows * (MAX_QUALITY + 1) + values,
+                                   minlength=quality.size).reshape(quality.shape)
+            bases += np.bincount(rows * len(BASES) + codes[low:high],
+                                 minlength=bases.size).reshape(bases.shape)
+        nonempty = lengths > 0
+        gc_counts = np.zeros(len(lengths), dtype=np.int64)
+        if total:
+            gc_counts[nonempty] = np.add.reduceat((codes == 1) | (codes == 2),
+                                                  starts[nonempty], dtype=np.int64)
+        gc_percent = np.rint(100 * gc_counts / np.maximum(lengths, 1)).astype(np.int64)
+        return cls(quality, bases, np.bincount(lengths).astype(np.int64),
+                   np.bincount(gc_percent, minlength=101).astype(np.int64))
+
+    @classmethod
+    def from_file(cls, filename, workers=0, batch_bytes=DEFAULT_CHUNK_SIZE, phred_offset=33):
+        """
+        Агрегаты всего FASTQ файла; блоки обрабатываются в пуле процессов.
+
+        Args:
+            filename (str): Путь к FASTQ (можно сжатый).
+            workers (int): Число процессов; 0 — в текущем процессе.
+            batch_bytes (int): Размер блока в байтах.
+            phred_offset (int): Смещение кодировки качества.
+        """
+        total = cls()
+        with open_binary(filename) as handle:
+            chunks = (chunk for _, chunk in iter_record_chunks(handle, batch_bytes, fastq_boundary))
+            for part in ordered_map(partial(_chunk_aggregates, phred_offset), chunks, workers):
+                total.merge(part)
+        return total
+
+    def merge(self, other):
+        """Прибавляет агрегаты other (на месте) и возвращает self."""
+        rows, size = len(other.quality), len(other.lengths)
+        self._quality = _grow(self._quality, rows)
+        self._bases = _grow(self._bases, rows)
+        self._lengths = _grow(self._lengths, size)
+        self._quality[:rows] += other.quality
+        self._bases[:rows] += other.bases
+        self._lengths[:size] += other.lengths
+        self._rows = max(self._rows, rows)
+        self._size = max(self._size, size)
+        self.gc = self.gc + other.gc
+        return self
+
+    def save(self, path):
+        """Сохраняет агрегаты в сжатый .npz (килобайты независимо от размера FASTQ)."""
+        np.savez_compressed(path, quality=self.quality, bases=self.bases,
+                            lengths=self.lengths, gc=self.gc)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['quality'], data['bases'], data['lengths'], data['gc'])
+
+    def quality_quantiles(self, quantiles=(0.1, 0.25, 0.5, 0.75, 0.9), bins=None):
+        """
+        Квантили качества по строкам позиций (или окнам) из гистограммы.
+
+        Args:
+            quantiles (tuple): Доли от 0 до 1.
+            bins (np.ndarray): Границы окон (см. position_bins); None — по строкам.
+
+        Returns:
+            np.ndarray: Матрица (квантиль × строка/окно).
+        """
+        quality = self.quality if bins is None else np.add.reduceat(self.quality, bins[:-1])
+        cumulative = np.cumsum(quality, axis=1)
+        totals = cumulative[:, -1:]
+        return np.stack([(cumulative >= np.maximum(q * totals, 1)).argmax(axis=1)
+                         for q in quantiles])
+
+    def mean_quality(self, bins=None):
+        quality = self.quality if bins is None else np.add.reduceat(self.quality, bins[:-1])
+        totals = quality.sum(axis=1)
+        return (quality @ np.arange(MAX_QUALITY + 1)) / np.maximum(totals, 1)
+
+    def position_starts(self):
+        """Первая позиция (с 0) каждой строки гистограмм quality и bases."""
+        return row_starts(self._rows)
+
+    def position_bins(self, limit=MAX_POSITION_BINS):
+        """Границы окон (номера строк): не больше limit окон примерно одинаковой ширины."""
+        starts = row_starts(self._rows + 1)
+        step = max(1, -(-int(starts[-1]) // limit))
+        windows = starts[:-1] // step
+        edges = np.flatnonzero(np.r_[True, windows[1:] != windows[:-1]]) if self._rows \
+            else np.zeros(0, dtype=np.int64)
+        return np.append(edges, self._rows)
+
+    def summary(self):
+        """Сводные показатели для таблицы отчёта."""
+        reads = self.reads
+        bases = self.total_bases
+        q30 = self.quality[:, 30:].sum()
+        gc = self.bases[:, 1:3].sum()
+        return {
+            'Риды': reads,
+            'Основания': bases,
+            'Средняя длина': round(bases / reads, 2) if reads else 0,
+            'GC, %': round(100 * float(gc) / max(bases, 1), 2),
+            '>= Q30, %': round(100 * float(q30) / max(bases, 1), 2),
+            'N, %': round(100 * float(self.bases[:, 4].sum()) / max(bases, 1), 3),
+        }
+
+
+def _chunk_aggregates(phred_offset, data):
+    return QCAggregates.from_chunk(data, phred_offset)
+
+
+def build_figure(aggregates, title=''):
+    """
+    Строит фигуру из четырёх панелей без pyplot, на холсте Agg.
+
+    Панели: качество по позициям (медиана, межквартильный и 10–90% диапазоны,
+    среднее), состав оснований по позициям, распределение длин, GC-состав.
+    Всё строится по агрегатам, число точек ограничено MAX_POSITION_BINS окнами
+    позиций и числом различных длин.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 8))
+    FigureCanvasAgg(figure)
+    axes = figure.subplots(2, 2)
+    if title:
+        figure.suptitle(title)
+
+    bins = aggregates.position_bins()
+    x = aggregates.position_starts()[bins[:-1]] + 1
+    if len(x):
+        low, q1, median, q3, high = aggregates.quality_quantiles(bins=bins)
+        panel = axes[0, 0]
+        panel.axhspan(0, 20, color='#f3c6c6', zorder=0)
+        panel.axhspan(20, 28, color='#f3e6c6', zorder=0)
+        panel.axhspan(28, MAX_QUALITY, color='#cdeccd', zorder=0)
+        panel.fill_between(x, low, high, step='post', color='#9db4d6', label='10–90%')
+        panel.fill_between(x, q1, q3, step='post', color='#4c72b0', label='25–75%')
+        panel.step(x, median, where='post', color='black', label='медиана')
+        panel.plot(x, aggregates.mean_quality(bins), color='#c44e52', label='среднее')
+        panel.set_ylim(0, max(41, int(high.max()) + 1))
+        panel.legend(loc='lower left', fontsize='small')
+
+        composition = np.add.reduceat(aggregates.bases, bins[:-1])
+        percent = 100 * composition / np.maximum(composition.sum(axis=1, keepdims=True), 1)
+        for i, base in enumerate(BASES):
+            axes[0, 1].plot(x, percent[:, i], label=base)
+        axes[0, 1].legend(fontsize='small')
+    axes[0, 0].set(title='Качество по позициям', xlabel='Позиция (bp)', ylabel='Phred')
+    axes[0, 1].set(title='Состав оснований', xlabel='Позиция (bp)', ylabel='%')
+
+    lengths = np.flatnonzero(aggregates.lengths)
+    axes[1, 0].bar(lengths, aggregates.lengths[lengths], width=1.0)
+    axes[1, 0].set(title='Распределение длин', xlabel='Длина (bp)', ylabel='Риды')
+    axes[1, 1].bar(np.arange(101), aggregates.gc, width=1.0, color='#55a868')
+    axes[1, 1].set(title='GC-состав ридов', xlabel='GC, %', ylabel='Риды')
+    for panel in axes.flat:
+        panel.grid(True, alpha=0.3)
+    figure.tight_layout()
+    return figure
+
+
+def render_report(aggregates, output, title='', dpi=100):
+    """
+    Сохраняет отчёт: '.html' — страница со сводной таблицей и встроенным PNG,
+    иначе — одно изображение со всеми панелями (формат по расширению).
+
+    Returns:
+        str: output.
+    """
+    figure = build_figure(aggregates, title)
+    if not output.endswith('.html'):
+        figure.savefig(output, dpi=dpi)
+        return output
+    image = io.BytesIO()
+    figure.savefig(image, format='png', dpi=dpi)
+    rows = ''.join(f'<tr><th>{html.escape(name)}</th><td>{value}</td></tr>'
+                   for name, value in aggregates.summary().items())
+    page = (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f'<title>{html.escape(title or "FASTQ QC")}</title></head><body>\n'
+        f'<h1>{html.escape(title or "FASTQ QC")}</h1>\n<table>{rows}</table>\n'
+        f'<img alt="QC" src="data:image/png;base64,{base64.b64encode(image.getvalue()).decode()}">\n'
+        '</body></html>\n')
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return output
+
+
+def _render_job(job):
+    source, output = job[:2]
+    title = job[2] if len(job) > 2 else source
+    if source.endswith('.npz'):
+        aggregates = QCAggregates.load(source)
+    else:
+        aggregates = QCAggregates.from_file(source)
+    return render_report(aggregates, output, title)
+
+
+def render_reports(jobs, workers=None):
+    """
+    Пакетная генерация отчётов по многим образцам в пуле процессов.
+
+    Args:
+        jobs (list): Кортежи (источник, выход[, заголовок]); источник — FASTQ
+            или сохранённые агрегаты '.npz'.
+        workers (int): Число процессов; None — все ядра, 0 — в текущем процессе.
+
+    Returns:
+        list: Пути к отчётам в порядке jobs.
+    """
+    return list(ordered_map(_render_job, [tuple(job) for job in jobs], workers))
@@ -0,0 +1,119 @@
+"""
+Format registry with content sniffing.
+formats.open(path) picks the right reader from magic bytes and file content.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+import importlib
+
+from .streams import read_head
+
+
+# name -> (module path, class name, sniffer); readers are imported on first use
+_REGISTRY = {}  # type: Dict[str, Tuple[str, str, Callable[[bytes], bool]]]
+
+
+def register_format(name: str, module: str, class_name: str,
+                    sniffer: Callable[[bytes], bool]) -> None:
+    """
+    Register a reader class for a format.
+
+    Args:
+        name: Format name, e.g. 'fasta'
+        module: Module containing the reader, absolute or relative to this
+                package (imported lazily)
+        class_name: Reader class; its constructor takes the file path
+        sniffer: Function(first decompressed bytes) -> True if the content matches
+    """
+    _REGISTRY[name] = (module, class_name, sniffer)
+
+
+def registered_formats() -> List[str]:
+    """Names of registered formats in sniffing order."""
+    return list(_REGISTRY)
+
+
+def _first_lines(head: bytes, count: int) -> List[bytes]:
+    lines = [line.rstrip(b'\r') for line in head.split(b'\n') if line.strip()]
+    return lines[:count]
+
+
+def _is_vcf(head: bytes) -> bool:
+    return head.startswith(b'##fileformat=VCF')
+
+
+def _is_sam(head: bytes) -> bool:
+    lines = _first_lines(head, 1)
+    if not lines:
+        return False
+    line = lines[0]
+    if line[:1] == b'@':
+        return line[1:3] in (b'HD', b'SQ', b'RG', b'PG', b'CO') and line[3:4] == b'\t'
+    fields = line.split(b'\t')
+    return len(fields) >= 11 and fields[1].isdigit() and fields[3].isdigit()
+
+
+def _is_fastq(head: bytes) -> bool:
+    lines = head.split(b'\n')
+    return len(lines) >= 3 and lines[0][:1] == b'@' and lines[2][:1] == b'+'
+
+
+def _is_fasta(head: bytes) -> bool:
+    lines = _first_lines(head, 1)
+    return bool(lines) and lines[0][:1] in (b'>', b';')
+
+
+register_format('vcf', '.vcf', 'Vcfreader', _is_vcf)
+register_format('sam', '.sam', 'Samreader', _is_sam)
+register_format('fastq', '.fastaq', 'FastqReader', _is_fastq)
+register_format('fasta', '.fasta', 'FastaProcessor', _is_fasta)
+
+
+def sniff_format(filepath: str) -> str:
+    """
+    Detect the format of a (possibly compressed) file from its content.
+
+    Args:
+        filepath: Path to file
+
+    Returns:
+        Registered format name
+
+    Raises:
+        ValueError: If no registered format matches
+
+    Example:
+        >>> sniff_format("sample.sam.gz")
+        'sam'
+    """
+    head = read_head(filepath)
+    if head.startswith(b'BAM\x01'):
+        raise ValueError(f"{filepath}: BAM is not supported, convert it to SAM first")
+    for name, (_, _, sniffer) in _REGISTRY.items():
+        if sniffer(head):
+            return name
+    raise ValueError(f"{filepath}: unknown file format")
+
+
+def open(filepath: str, format: Optional[str] = None):
+    """
+    Open a file with the reader for its format.
+
+    Args:
+        filepath: Path to FASTA, FASTQ, SAM or VCF file (plain, gzip, bgzf, bz2 or xz)
+        format: Format name to skip sniffing
+
+    Returns:
+        Reader instance implementing the BatchReader protocol
+
+    Example:
+        >>> reader = formats.open("reads.fq.gz")
+        >>> sum(len(batch) for batch in reader.iter_batches())
+        100
+    """
+    name = format or sniff_format(filepath)
+    if name not in _REGISTRY:
+        raise ValueError(f"Unknown format: {name}")
+    module, class_name, _ = _REGISTRY[name]
+    reader_class = getattr(importlib.import_module(module, __package__), class_name)
+    return reader_class(filepath)
@@ -1,4 +1,270 @@
-class Samreader:
+from functools import partial
+from itertools import chain
+import sys
+
+from .protocol import BatchReader
+from .streams import DEFAULT_CHUNK_SIZE, open_text
+
+
+# Колонки, которые возвращает parse_sam_chunk (совпадают с ключами словарей read())
+SAM_BATCH_FIELDS = ('QNAME', 'FLAG', 'RNAME', 'RID', 'POS', 'MAPQ', 'CIGAR', 'RNEXT', 'MRID',
+                    'PNEXT', 'TLEN', 'SEQ', 'QUAL', 'TAGS')
+
+# Типы стандартных тегов из спецификации SAMtags: их можно запрашивать без ':тип'
+STANDARD_TAG_TYPES = {
+    'AM': 'i', 'AS': 'i', 'BC': 'Z', 'BQ': 'Z', 'CB': 'Z', 'CC': 'Z', 'CM': 'i', 'CO': 'Z',
+    'CP': 'i', 'CR': 'Z', 'CS': 'Z', 'CY': 'Z', 'E2': 'Z', 'FI': 'i', 'FS': 'Z', 'GN': 'Z',
+    'GX': 'Z', 'H0': 'i', 'H1': 'i', 'H2': 'i', 'HI': 'i', 'IH': 'i', 'LB': 'Z', 'MC': 'Z',
+    'MD': 'Z', 'MI': 'Z', 'MQ': 'i', 'NH': 'i', 'NM': 'i', 'OA': 'Z', 'OC': 'Z', 'OP': 'i',
+    'OQ': 'Z', 'OX': 'Z', 'PG': 'Z', 'PQ': 'i', 'PT': 'Z', 'PU': 'Z', 'Q2': 'Z', 'QT': 'Z',
+    'QX': 'Z', 'R2': 'Z', 'RG': 'Z', 'RX': 'Z', 'SA': 'Z', 'SM': 'i', 'TC': 'i', 'TS': 'A',
+    'U2': 'Z', 'UB': 'Z', 'UQ': 'i', 'UR': 'Z', 'UY': 'Z',
+}
+
+# Значение целочисленного тега, отсутствующего в записи
+MISSING_INT = -(2 ** 63)
+
+# Подтипы массивов B -> dtype numpy
+_B_DTYPES = {'c': 'i1', 'C': 'u1', 's': 'i2', 'S': 'u2', 'i': 'i4', 'I': 'u4', 'f': 'f4'}
+
+
+def parse_tag_specs(tags):
+    """
+    Разбирает запрос тегов вида 'NM', 'XA:Z' в кортеж пар (тег, тип).
+
+    Тип — i, f, Z, A, H или B; для стандартных тегов его можно не указывать.
+    """
+    specs = []
+    for spec in tags:
+        name, _, kind = spec.partition(':')
+        kind = kind or STANDARD_TAG_TYPES.get(name)
+        if len(name) != 2 or kind not in ('i', 'f', 'Z', 'A', 'H', 'B'):
+            raise ValueError(f"Нужно указать тип тега: {spec!r} (например 'XS:i')")
+        specs.append((name, kind))
+    return tuple(specs)
+
+
+def find_tag(padded, name):
+    """(тип, значение) тега в строке '\\t' + TAGS или None."""
+    start = padded.find('\t' + name + ':')
+    if start < 0:
+        return None
+    end = padded.find('\t', start + 1)
+    return padded[start + 4], padded[start + 6:end if end >= 0 else len(padded)]
+
+
+def _tag_mismatch(name, kind, found):
+    return ValueError(f"Тег {name} имеет тип {found}, запрошен {kind}")
+
+
+def decode_tag_value(name, kind, raw):
+    """Значение одного тега из сырой строки TAGS (для read())."""
+    found = find_tag('\t' + raw, name)
+    if found is None:
+        return {'i': MISSING_INT, 'f': float('nan')}.get(kind)
+    if found[0] != kind:
+        raise _tag_mismatch(name, kind, found[0])
+    value = found[1]
+    if kind == 'i':
+        return int(value)
+    if kind == 'f':
+        return float(value)
+    if kind == 'B':
+        return _decode_array(value)
+    return value
+
+
+def _decode_array(value):
+    """Массив numpy из значения тега типа B ('f,1.5,2')."""
+    import numpy as np
+
+    subtype, _, items = value.partition(',')
+    return np.array(items.split(',') if items else [], dtype=_B_DTYPES[subtype])
+
+
+def decode_tags(raw_tags, specs):
+    """
+    Декодирует запрошенные теги в типизированные колонки.
+
+    Ищется только подстрока каждого запрошенного тега, остальные теги не
+    разбираются.
+
+    Args:
+        raw_tags (list): Сырые строки необязательных полей (колонка TAGS).
+        specs (tuple): Пары (тег, тип) из parse_tag_specs.
+
+    Returns:
+        dict: Колонки по именам тегов: i — int64 (MISSING_INT, если тега нет),
+              f — float64 (NaN), Z/A/H — списки str (None), B — списки массивов (None).
+    """
+    import numpy as np
+
+    padded = ['\t' + raw for raw in raw_tags]
+    columns = {}
+    for name, kind in specs:
+        found = [find_tag(text, name) for text in padded]
+        for item in found:
+            if item is not None and item[0] != kind:
+                raise _tag_mismatch(name, kind, item[0])
+        if kind == 'i':
+            columns[name] = np.array([MISSING_INT if item is None else int(item[1])
+                                      for item in found], dtype=np.int64)
+        elif kind == 'f':
+            columns[name] = np.array([np.nan if item is None else float(item[1])
+                                      for item in found], dtype=np.float64)
+        elif kind == 'B':
+            columns[name] = [None if item is None else _decode_array(item[1]) for item in found]
+        else:
+            columns[name] = [None if item is None else item[1] for item in found]
+    return columns
+
+
+class SamHeader:
+    """
+    Разобранный заголовок SAM-файла с таблицей референсных последовательностей.
+
+    Атрибуты:
+        lines (dict): Исходные строки заголовка, сгруппированные по двухбуквенному коду.
+        records (dict): Строки заголовка, разобранные в словари {тег: значение},
+                        сгруппированные по двухбуквенному коду.
+        reference_names (list): Имена референсов (SN из @SQ) в порядке id.
+        reference_lengths (list): Длины референсов (LN из @SQ); None для имён,
+                                  встреченных в выравниваниях без строки @SQ.
+
+    Методы:
+        add_line(line): Добавляет строку заголовка и обновляет таблицу @SQ.
+        ref_id(name): Возвращает целочисленный id референса, добавляя новое имя при необходимости.
+        ref_name(ref_id): Возвращает имя референса по id.
+        ref_length(name): Возвращает длину референса по имени или id.
+    """
+    def __init__(self):
+        self.lines = {}
+        self.records = {}
+        self.reference_names = []
+        self.reference_lengths = []
+        self._ids = {}
+
+    def add_line(self, line):
+        line = line.rstrip('\r\n')
+        obj = line[1:3]
+        self.lines.setdefault(obj, []).append(line)
+        fields = {}
+        for field in line.split('\t')[1:]:
+            if ':' in field:
+                tag, value = field.split(':', 1)
+                fields[tag] = value
+        self.records.setdefault(obj, []).append(fields)
+        if obj == 'SQ' and 'SN' in fields:
+            rid = self.ref_id(fields['SN'])
+            if 'LN' in fields:
+                self.reference_lengths[rid] = int(fields['LN'])
+
+    def ref_id(self, name):
+        rid = self._ids.get(name)
+        if rid is None:
+            if name == '*':
+                return -1
+            name = sys.intern(name)
+            rid = self._ids[name] = len(self.reference_names)
+            self.reference_names.append(name)
+            self.reference_lengths.append(None)
+        return rid
+
+    def ref_name(self, ref_id):
+        return '*' if ref_id < 0 else self.reference_names[ref_id]
+
+    def ref_length(self, name):
+        rid = name if isinstance(name, int) else self._ids[name]
+        return self.reference_lengths[rid]
+
+    def __len__(self):
+        return len(self.reference_names)
+
+
+def parse_sam_chunk(data, reference_names=(), tags=()):
+    """
+    Разбирает блок строк выравниваний SAM в колоночный батч.
+
+    Функция не зависит от состояния читателя, поэтому может выполняться в
+    отдельном процессе. Строки заголовка и строки короче 11 полей пропускаются.
+
+    Args:
+        data (bytes): Блок целых строк SAM.
+        reference_names (tuple): Имена референсов из @SQ в порядке id. Остальные
+                                 имена получают следующие id в порядке первого
+                                 появления в блоке (RNAME, затем RNEXT каждой
+                                 строки, как SamHeader.ref_id в read()); такие id
+                                 локальны для блока (см. local_reference_names).
+        tags (tuple): Пары (тег, тип) из parse_tag_specs — теги, декодируемые в колонки.
+
+    Returns:
+        RecordBatch: Колонки SAM_BATCH_FIELDS и запрошенных тегов; FLAG, POS, MAPQ, RID,
+                     MRID, PNEXT, TLEN — массивы numpy; TAGS — необязательные поля как есть.
+    """
+    import numpy as np
+    from .batch import RecordBatch
+
+    rows = [line.split('\t', 11) for line in data.decode('utf-8').splitlines()
+            if line and line[0] != '@']
+    if any(len(fields) < 11 for fields in rows):
+        rows = [fields for fields in rows if len(fields) >= 11]
+    columns = list(zip(*rows)) if rows else [()] * 11
+    raw_tags = [fields[11] if len(fields) > 11 else '' for fields in rows]
+    ids = {'*': -1, '=': -2}
+    ids.update((name, rid) for rid, name in enumerate(reference_names))
+    for name in chain.from_iterable(zip(columns[2], columns[6])):
+        if name not in ids:
+            ids[name] = len(ids) - 2
+    rid = np.array([ids[name] for name in columns[2]], dtype=np.int32)
+    mrid = np.array([ids[name] for name in columns[6]], dtype=np.int32)
+    same = mrid == -2
+    mrid[same] = rid[same]
+    batch = {
+        'QNAME': list(columns[0]),
+        'FLAG': np.array(list(map(int, columns[1])), dtype=np.int32),
+        'RNAME': list(columns[2]),
+        'RID': rid,
+        'POS': np.array(list(map(int, columns[3])), dtype=np.int64),
+        'MAPQ': np.array(list(map(int, columns[4])), dtype=np.int16),
+        'CIGAR': list(columns[5]),
+        'RNEXT': list(columns[6]),
+        'MRID': mrid,
+        'PNEXT': np.array(list(map(int, columns[7])), dtype=np.int64),
+        'TLEN': np.array(list(map(int, columns[8])), dtype=np.int64),
+        'SEQ': list(columns[9]),
+        'QUAL': list(columns[10]),
+        'TAGS': raw_tags,
+    }
+    batch.update(decode_tags(raw_tags, tags))
+    return RecordBatch(batch)
+
+
+def local_reference_names(batch, known):
+    """
+    Имена референсов, которым parse_sam_chunk выдал локальные id (>= known), в порядке id.
+
+    Args:
+        batch (RecordBatch): Батч parse_sam_chunk.
+        known (int): Длина reference_names, с которой разбирался блок.
+
+    Returns:
+        list: Имя с id known + i на позиции i.
+    """
+    import numpy as np
+
+    names = [None] * (max(int(batch['RID'].max(initial=-1)),
+                          int(batch['MRID'].max(initial=-1))) + 1 - known)
+    # MRID из '=' совпадает с RID той же строки, поэтому RNAME просматривается первым
+    for ids, column in ((batch['RID'], batch['RNAME']), (batch['MRID'], batch['RNEXT'])):
+        rows = np.flatnonzero(ids >= known)
+        values, first = np.unique(ids[rows], return_index=True)
+        for value, row in zip(values.tolist(), rows[first].tolist()):
+            if names[value - known] is None:
+                names[value - known] = column[row]
+    return names
+
+
+class Samreader(BatchReader):
     """
     Класс для чтения и анализа SAM-файлов (формат выравнивания последовательностей).
 
@@ -6,26 +272,79 @@ class Samreader:
         filename (str): Путь к SAM-файлу.
         header (dict): Заголовок SAM-файла в виде словаря, где ключ — двухбуквенный идентификатор,
                        значение — список строк заголовка.
+        sam_header (SamHeader): Разобранный заголовок с таблицей id референсов.
+        tags (tuple): Пары (тег, тип) тегов, декодируемых в отдельные поля/колонки.
         levels (list): Список выравниваний, каждое представлено словарём с ключами:
             'QNAME' (str): Имя прочтения.
             'FLAG' (int): Флаг выравнивания.
             'RNAME' (str): Имя ссылочного последовательности (хромосомы).
+            'RID' (int): id RNAME в таблице sam_header (-1 для '*').
+            'RNEXT' (str): Референс мата как в файле ('=', '*' или имя).
+            'MRID' (int): id RNEXT (референс мата) в таблице sam_header (-1 для '*').
             'POS' (int): Позиция выравнивания.
+            'PNEXT' (int): Позиция мата (0, если неизвестна).
+            'TLEN' (int): Длина фрагмента (шаблона) со знаком.
             'MAPQ' (int): Качество сопоставления.
             'CIGAR' (str): CIGAR-строка (описание выравнивания).
             'SEQ' (str): Последовательность нуклеотидов.
             'QUAL' (str): Качество прочтения.
+            'TAGS' (str): Необязательные поля без разбора (через табуляцию).
+            а также по ключу на каждый запрошенный тег (см. tags).
+        stats (ReaderStats): Инструментирование (по умолчанию выключено): счётчики
+            records_parsed/records_filtered и время стадий.
 
     Методы:
-        __init__(filename):
+        __init__(filename, tags=()):
             Инициализирует объект с именем файла и пустыми структурами для заголовка и выравниваний.
+            tags — теги для декодирования, например ('NM', 'CB', 'UB', 'XA:Z'): только они
+            разбираются с учётом типа (i — int64, f — float64, Z/A/H — str, B — массив numpy)
+            и становятся полями словарей read() и колонками батчей; остальные теги
+            остаются в сыром поле TAGS. Для нестандартных тегов тип указывается после ':'.
 
         read():
             Читает SAM-файл построчно.
             - Заголовки начинаются с '@' и группируются по двухсимвольному коду после '@'.
             - Выравнивания парсятся в словари и добавляются в атрибут levels.
+            - Имена RNAME/RNEXT интернируются в целочисленные id через sam_header.
             Возвращает генератор словарей для каждого выравнивания.
 
+        read_new():
+            Инкрементальный режим для растущего файла (пишущегося выравнивателем).
+            Запоминает смещение после последней целой строки и при каждом вызове
+            разбирает только дописанные с тех пор строки: возвращает генератор
+            новых выравниваний, которые также добавляются в levels. Неполная
+            последняя строка остаётся до следующего вызова. Если файл усечён
+            или заменён, levels и заголовок сбрасываются и чтение идёт с начала.
+
+        read_batches(workers=None, batch_bytes=4194304, max_pending=None):
+            Параллельно читает выравнивания колоночными батчами (RecordBatch).
+            Отдельный поток режет файл на блоки по границам строк, пул процессов
+            их разбирает, батчи возвращаются в исходном порядке. Очередь ограничена
+            max_pending блоками. Выравнивания не сохраняются в levels. Контиги без
+            @SQ добавляются в sam_header в порядке файла, и RID/MRID совпадают с read().
+
+        sort(output, memory_budget=1073741824, index=False):
+            Сортирует файл по координате (порядок @SQ, затем POS) во внешней памяти:
+            отсортированные блоки сбрасываются во временные файлы и сливаются кучей.
+            Выход с расширением .gz пишется в BGZF, index=True добавляет индекс .tbi.
+
+        mark_duplicates(output, memory_budget=268435456, workers=0, remove=False):
+            Находит дубликаты по хэшу (RNAME, неклипированная 5'-позиция, цепь, позиция мата)
+            и записывает файл с флагом 0x400 (см. duplicates.DuplicateMarker).
+            Возвращает число дубликатов.
+
+        alignments_in_regions(regions, workers=0):
+            Потоково находит выравнивания, пересекающиеся с множеством регионов
+            (BED-файл или список (chrom, start, end) в координатах BED). Регионы
+            сортируются один раз (intervals.IntervalIndex), каждый батч файла
+            сопоставляется со всеми регионами векторно. Выравнивание занимает
+            [POS - 1, POS - 1 + длина по CIGAR). Возвращает генератор пар
+            (номер региона, словарь выравнивания) в порядке файла.
+
+        count_barcodes(cell_tag='CB', umi_tag='UB', workers=0, exclude_flags=0x904):
+            Группирует риды по клеточному баркоду и считает для каждой клетки число
+            ридов и уникальных UMI (см. barcodes.BarcodeCounter). Возвращает RecordBatch.
+
         getheader():
             Возвращает словарь заголовка SAM-файла.
 
@@ -38,50 +357,187 @@ class Samreader:
             Подсчитывает количество выравниваний для каждой последовательности RNAME.
             Возвращает словарь {название_хромосомы: количество_выравниваний}.
     """
-    def __init__(self, filename):
+    format_name = 'sam'
+
+    def __init__(self, filename, tags=()):
         self.filename = filename
-        self.header = {}
+        self.tags = parse_tag_specs(tags)
+        self.sam_header = SamHeader()
+        self.header = self.sam_header.lines
         self.levels = []
+        self._tail = None
 
     def read(self):
-        with open(self.filename, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith('@'):
-                    obj = line[1:3]
-                    if obj not in self.header:
-                        self.header[obj] = []
-                    self.header[obj].append(line)
-                else:
-                    fields = line.split('\t')
-                    if len(fields) < 11:
-                        continue
-                    level = {
-                        'QNAME': fields[0],
-                        'FLAG': int(fields[1]),
-                        'RNAME': fields[2],
-                        'POS': int(fields[3]),
-                        'MAPQ': int(fields[4]),
-                        'CIGAR': fields[5],
-                        'SEQ': fields[9],
-                        'QUAL': fields[10]
-                    }
-                    self.levels.append(level)
-                    yield level
+        parsed = len(self.levels)
+        try:
+            with open_text(self.filename) as f:
+                for line in f:
+                    level = self._parse_line(line)
+                    if level is not None:
+                        yield level
+        finally:
+            self.stats.add('records_parsed', len(self.levels) - parsed)
+
+    def read_new(self):
+        from .tail import TailCursor
+
+        if self._tail is None:
+            self._tail = TailCursor(self.filename, stats=self.stats)
+        if self._tail.rewind():
+            self.sam_header = SamHeader()
+            self.header = self.sam_header.lines
+            self.levels = []
+        parsed = len(self.levels)
+        try:
+            for chunk in self._tail.poll():
+                for line in chunk.decode('utf-8').splitlines():
+                    level = self._parse_line(line)
+                    if level is not None:
+                        yield level
+        finally:
+            self.stats.add('records_parsed', len(self.levels) - parsed)
+
+    def _parse_line(self, line):
+        header = self.sam_header
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith('@'):
+            header.add_line(line)
+            return None
+        fields = line.split('\t', 11)
+        if len(fields) < 11:
+            return None
+        rid = header.ref_id(fields[2])
+        if fields[6] == '=':
+            mrid = rid
+        else:
+            mrid = header.ref_id(fields[6])
+        level = {
+            'QNAME': fields[0],
+            'FLAG': int(fields[1]),
+            'RNAME': header.reference_names[rid] if rid >= 0 else '*',
+            'RID': rid,
+            'MRID': mrid,
+            'POS': int(fields[3]),
+            'PNEXT': int(fields[7]),
+            'MAPQ': int(fields[4]),
+            'CIGAR': fields[5],
+            'RNEXT': fields[6],
+            'TLEN': int(fields[8]),
+            'SEQ': fields[9],
+            'QUAL': fields[10],
+            'TAGS': fields[11] if len(fields) > 11 else ''
+        }
+        for name, kind in self.tags:
+            level[name] = decode_tag_value(name, kind, level['TAGS'])
+        self.levels.append(level)
+        return level
+
+    def _read_batch_header(self, handle):
+        """
+        Читает строки заголовка и оставляет handle на первой строке выравнивания.
+
+        Уже загруженный заголовок (повторный проход, предыдущий read()) не
+        дополняется: строки пропускаются, id референсов остаются прежними.
+        """
+        loaded = bool(self.sam_header.lines)
+        while True:
+            offset = handle.tell()
+            line = handle.readline()
+            if not line.startswith(b'@'):
+                handle.seek(offset)
+                return
+            if not loaded:
+                self.sam_header.add_line(line.decode('utf-8'))
+
+    @property
+    def batch_fields(self):
+        return SAM_BATCH_FIELDS + tuple(name for name, _ in self.tags)
+
+    def _chunk_parser(self):
+        return partial(parse_sam_chunk, reference_names=tuple(self.sam_header.reference_names),
+                       tags=self.tags)
+
+    def iter_batches(self, batch_bytes=DEFAULT_CHUNK_SIZE, workers=0, max_pending=None,
+                     shared_memory=False):
+        import numpy as np
+
+        known = None
+        for batch in super().iter_batches(batch_bytes, workers, max_pending, shared_memory):
+            if known is None:
+                # Заголовок уже прочитан, а имена из выравниваний ещё не добавлены
+                known = len(self.sam_header.reference_names)
+            names = local_reference_names(batch, known)
+            if names:
+                # Локальные id блока -> id sam_header в порядке файла, как в read()
+                mapping = np.array([self.sam_header.ref_id(name) for name in names],
+                                   dtype=np.int32)
+                for field in ('RID', 'MRID'):
+                    ids = batch[field]
+                    batch.columns[field] = np.where(
+                        ids >= known, mapping[np.maximum(ids - known, 0)], ids).astype(np.int32)
+            yield batch
+
+    def read_batches(self, workers=None, batch_bytes=4 * 1024 * 1024, max_pending=None):
+        return self.iter_batches(batch_bytes, workers, max_pending)
+
+    def sort(self, output, memory_budget=1 << 30, index=False, tmp_dir=None):
+        from .sorting import sort_file
+        return sort_file(self.filename, output, memory_budget, index=index, tmp_dir=tmp_dir)
+
+    def mark_duplicates(self, output, memory_budget=256 << 20, workers=0, remove=False):
+        from .duplicates import DuplicateMarker
+        marker = DuplicateMarker(self.filename, memory_budget, workers)
+        return marker.write(output, remove=remove)
+
+    def alignments_in_regions(self, regions, workers=0, batch_bytes=4 * 1024 * 1024):
+        import numpy as np
+        from .coverage import reference_length
+        from .intervals import as_interval_index
+
+        regions = as_interval_index(regions)
+        for batch in self.iter_batches(batch_bytes, workers):
+            # По RNAME, а не RID: у контигов без @SQ в батче может не быть id
+            named = np.array([name != '*' for name in batch['RNAME']], dtype=bool)
+            mapped = np.flatnonzero(named & ((batch['FLAG'] & 0x4) == 0))
+            starts = batch['POS'][mapped] - 1
+            ends = starts + np.array([reference_length(batch['CIGAR'][i]) for i in mapped.tolist()],
+                                     dtype=np.int64)
+            rows, region_ids = regions.overlaps([batch['RNAME'][i] for i in mapped.tolist()],
+                                                starts, ends)
+            hits = batch.select(mapped[rows])
+            for region_id, level in zip(region_ids.tolist(), hits.records()):
+                yield region_id, level
+
+    def count_barcodes(self, cell_tag='CB', umi_tag='UB', workers=0, exclude_flags=0x904):
+        from .barcodes import BarcodeCounter
+        counter = BarcodeCounter(self.filename, cell_tag, umi_tag, exclude_flags)
+        return counter.count(workers)
 
     def getheader(self):
         return self.header
 
     def filterlevels(self, flagmask):
-        return (lvl for lvl in self.levels if (lvl['FLAG'] & flagmask) == flagmask)
+        dropped = 0
+        try:
+            for lvl in self.levels:
+                if (lvl['FLAG'] & flagmask) == flagmask:
+                    yield lvl
+                else:
+                    dropped += 1
+        finally:
+            self.stats.add('records_filtered', dropped)
 
     def countlevelsperchrom(self):
-        counts = {}
+        names = self.sam_header.reference_names
+        # Последний элемент собирает RID == -1 (RNAME '*')
+        per_id = [0] * (len(names) + 1)
         for lvl in self.levels:
-            chrom = lvl['RNAME']
-            counts[chrom] = counts.get(chrom, 0) + 1
+            per_id[lvl['RID']] += 1
+        counts = {name: count for name, count in zip(names, per_id) if count}
+        if per_id[-1]:
+            counts['*'] = per_id[-1]
         return counts
     
 
@@ -0,0 +1,545 @@
+"""
+Deduplicated sequence database for FASTA files.
+Identical sequences and headers are stored once in contiguous byte arenas
+and found through open-addressing hash tables; the whole database can be
+written to a single file and memory-mapped by any number of processes.
+"""
+
+from itertools import islice
+from operator import eq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from .fasta import FastaProcessor
+
+
+SDB_MAGIC = b'SQDB'
+SDB_VERSION = 1
+
+# Arrays stored in the file, in order
+ARRAYS = (
+    'sequence_arena', 'sequence_offsets', 'sequence_hashes', 'sequence_table',
+    'header_arena', 'header_offsets', 'header_hashes', 'header_table',
+    'record_headers', 'record_sequences', 'header_sequences',
+    'sequence_record_offsets', 'sequence_records',
+)
+
+_EMPTY = 0
+
+
+def _hash(data: bytes) -> int:
+    """64-bit hash of a byte string, identical in every process."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def _table_size(count: int) -> int:
+    """Power of two with a load factor of at most 1/2."""
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    return size
+
+
+class _StringTable:
+    """
+    Interned byte strings: one arena, an offset table and a hash index.
+
+    String i occupies arena[offsets[i]:offsets[i + 1]]. The hash index is
+    an open-addressing table with linear probing whose slots hold id + 1
+    (0 marks an empty slot); full hashes are kept per string so probing
+    compares bytes only on a 64-bit hash match.
+    """
+
+    __slots__ = ('arena', 'offsets', 'hashes', 'table')
+
+    def __init__(self, arena: np.ndarray, offsets: np.ndarray,
+                 hashes: np.ndarray, table: np.ndarray):
+        self.arena = arena
+        self.offsets = offsets
+        self.hashes = hashes
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.arena[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes()
+
+    def find(self, data: bytes) -> Optional[int]:
+        """Id of a string, or None if it is not stored."""
+        key = _hash(data)
+        mask = len(self.table) - 1
+        slot = key & mask
+        while True:
+            entry = int(self.table[slot])
+            if entry == _EMPTY:
+                return None
+            index = entry - 1
+            if int(self.hashes[index]) == key and self[index] == data:
+                return index
+            slot = (slot + 1) & mask
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Array of at least size items; capacity at least doubles when it grows."""
+    if len(array) >= size:
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _insert(table: np.ndarray, hashes: np.ndarray, ids: np.ndarray) -> None:
+    """
+    Insert ids into an open-addressing table, all keys probing at once.
+
+    Each round places at most one key per free slot; every other key moves
+    on to its next slot, so the result is a valid linear-probing table.
+    """
+    mask = len(table) - 1
+    slots = (hashes & np.uint64(mask)).astype(np.int64)
+    pending = np.arange(len(ids))
+    while len(pending):
+        free = pending[table[slots[pending]] == _EMPTY]
+        _, first = np.unique(slots[free], return_index=True)
+        winners = free[first]
+        table[slots[winners]] = ids[winners] + 1
+        placed = np.zeros(len(ids), dtype=bool)
+        placed[winners] = True
+        pending = pending[~placed[pending]]
+        slots[pending] = (slots[pending] + 1) & mask
+
+
+def _lookup(table: np.ndarray, stored: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    """Ids of the first stored strings with the given hashes (-1 if absent)."""
+    mask = len(table) - 1
+    slots = (hashes & np.uint64(mask)).astype(np.int64)
+    found = np.full(len(hashes), -1, dtype=np.int64)
+    pending = np.arange(len(hashes))
+    while len(pending):
+        entries = table[slots[pending]].astype(np.int64)
+        occupied = entries != _EMPTY
+        hit = np.zeros(len(pending), dtype=bool)
+        hit[occupied] = stored[entries[occupied] - 1] == hashes[pending[occupied]]
+        found[pending[hit]] = entries[hit] - 1
+        pending = pending[occupied & ~hit]
+        slots[pending] = (slots[pending] + 1) & mask
+    return found
+
+
+class _Interner:
+    """
+    Builder of a _StringTable that gives equal strings the same id.
+
+    Strings are collected in batches. Each batch is hashed, deduplicated with
+    np.unique and looked up in the hash table with vectorised probing; only
+    new strings are appended to the arena and inserted into the table, which
+    doubles when its load factor would exceed 1/2. Matches are confirmed by
+    comparing bytes; a batch with a 64-bit hash collision is resolved string
+    by string.
+    """
+
+    #: Flush the pending batch after this many strings or bytes
+    BATCH_STRINGS = 1 << 16
+    BATCH_BYTES = 1 << 20
+
+    def __init__(self):
+        self._arena = np.zeros(0, dtype=np.uint8)
+        self._offsets = np.zeros(1, dtype='<u8')
+        self._hashes = np.zeros(0, dtype='<u8')
+        self._table = np.zeros(_table_size(0), dtype='<u4')
+        self._count = 0
+        self._pending = []  # type: List[bytes]
+        self._pending_bytes = 0
+        self._ids = []  # type: List[np.ndarray]
+
+    def extend(self, strings: List[bytes]) -> None:
+        """Queue strings; their ids are in the array returned by finish()."""
+        self._pending.extend(strings)
+        self._pending_bytes += sum(map(len, strings))
+        if len(self._pending) >= self.BATCH_STRINGS or self._pending_bytes >= self.BATCH_BYTES:
+            self._flush()
+
+    def _view(self) -> _StringTable:
+        count = self._count
+        return _StringTable(self._arena[:int(self._offsets[count])],
+                            self._offsets[:count + 1], self._hashes[:count], self._table)
+
+    def _append(self, data: np.ndarray, lengths: np.ndarray, keep: np.ndarray,
+                hashes: np.ndarray) -> np.ndarray:
+        """
+        Store the kept strings of data (consecutive strings of the given
+        lengths) with their hashes, and return their ids.
+        """
+        added_lengths = lengths[keep]
+        count, added = self._count, len(added_lengths)
+        if 2 * (count + added) > len(self._table):
+            self._table = np.zeros(_table_size(count + added), dtype='<u4')
+            _insert(self._table, self._hashes[:count], np.arange(count))
+        ids = np.arange(count, count + added)
+        _insert(self._table, hashes, ids)
+        self._hashes = _grow(self._hashes, count + added)
+        self._hashes[count:count + added] = hashes
+        end = int(self._offsets[count])
+        size = int(added_lengths.sum())
+        self._arena = _grow(self._arena, end + size)
+        self._arena[end:end + size] = data if keep.all() else data[np.repeat(keep, lengths)]
+        self._offsets = _grow(self._offsets, count + added + 1)
+        self._offsets[count + 1:count + added + 1] = end + np.cumsum(added_lengths)
+        self._count += added
+        return ids
+
+    def _flush(self) -> None:
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        if not batch:
+            return
+        hashes = np.fromiter(map(_hash, batch), dtype='<u8', count=len(batch))
+        lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+        data = np.frombuffer(b''.join(batch), dtype=np.uint8)
+        _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        existing = _lookup(self._table, self._hashes[:self._count], hashes[first])
+
+        # Every string must equal its batch representative, and a representative
+        # found in the table must equal the stored string
+        representative = first[inverse]
+        duplicates = np.flatnonzero(representative != np.arange(len(batch))).tolist()
+        equal = all(map(eq, [batch[i] for i in duplicates],
+                        [batch[i] for i in representative[duplicates].tolist()]))
+        found = np.flatnonzero(existing >= 0)
+        bounds = zip(self._offsets[existing[found]].tolist(),
+                     self._offsets[existing[found] + 1].tolist())
+        arena = self._arena
+        equal = equal and all(arena[a:b].tobytes() == batch[i] for (a, b), i in
+                              zip(bounds, first[found].tolist()))
+        if not equal:
+            self._ids.append(self._add_each(batch, hashes))
+            return
+
+        new = np.flatnonzero(existing < 0)
+        # New strings get ids in order of first appearance in the batch
+        new = new[np.argsort(first[new], kind='stable')]
+        keep = np.zeros(len(batch), dtype=bool)
+        keep[first[new]] = True
+        existing[new] = self._append(data, lengths, keep, hashes[first[new]])
+        self._ids.append(existing[inverse])
+
+    def _add_each(self, batch: List[bytes], hashes: np.ndarray) -> np.ndarray:
+        """Slow path for a batch with hash collisions: byte comparison per string."""
+        ids = np.zeros(len(batch), dtype=np.int64)
+        for i, data in enumerate(batch):
+            index = self._view().find(data)
+            if index is None:
+                index = int(self._append(np.frombuffer(data, dtype=np.uint8),
+                                         np.array([len(data)]), np.ones(1, dtype=bool),
+                                         hashes[i:i + 1])[0])
+            ids[i] = index
+        return ids
+
+    def finish(self) -> Tuple[_StringTable, np.ndarray]:
+        """
+        Returns:
+            The string table and the id of every added string, in order
+        """
+        self._flush()
+        ids = np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=np.int64)
+        view = self._view()
+        return (_StringTable(view.arena.copy(), view.offsets.copy(), view.hashes.copy(),
+                             self._table), ids.astype('<u4'))
+
+
+class SequenceDB:
+    """
+    In-memory FASTA database with deduplicated headers and sequences.
+
+    Every distinct sequence (and every distinct header) is stored once;
+    records keep their file order as pairs of (header id, sequence id).
+    Lookups by header or by sequence text are O(1) hash-table probes.
+    A database saved with save() is opened with open() as read-only views
+    into a memory map, so worker processes share the pages instead of
+    copying them; pickling an opened database only sends its path.
+
+    If a header occurs more than once, lookup by header returns the
+    sequence of its first record.
+
+    Example:
+        >>> db = SequenceDB.from_fasta("uniref90.fasta")
+        >>> db.sequence_count, len(db)
+        (61200000, 144000000)
+        >>> db.save("uniref90.sdb")
+        >>> db = SequenceDB.open("uniref90.sdb")
+        >>> db["UniRef90_P69905"]
+        'MVLSPADKTNVKAAWGKVGAHAGEYGAEALERMFLSFPTTKTYFPHF...'
+        >>> db.headers_for(db["UniRef90_P69905"])
+        ['UniRef90_P69905', ...]
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], path: Optional[str] = None):
+        """
+        Args:
+            arrays: Dictionary with every array named in ARRAYS
+            path: File the arrays are mapped from, if any
+        """
+        self.path = path
+        self._arrays = arrays
+        self._sequences = _StringTable(*(arrays[name] for name in ARRAYS[0:4]))
+        self._headers = _StringTable(*(arrays[name] for name in ARRAYS[4:8]))
+        self._record_headers = arrays['record_headers']
+        self._record_sequences = arrays['record_sequences']
+        self._header_sequences = arrays['header_sequences']
+        self._sequence_record_offsets = arrays['sequence_record_offsets']
+        self._sequence_records = arrays['sequence_records']
+        self._mmap = None
+
+    @classmethod
+    def build(cls, records: Iterable[Tuple[str, str]]) -> 'SequenceDB':
+        """
+        Build a database from (header, sequence) pairs.
+
+        Args:
+            records: Iterable such as FastaProcessor.sequence_generator()
+
+        Returns:
+            In-memory SequenceDB
+        """
+        sequences = _Interner()
+        headers = _Interner()
+        records = iter(records)
+        while True:
+            batch = list(islice(records, 4096))
+            if not batch:
+                break
+            headers.extend([header.encode('utf-8') for header, _ in batch])
+            sequences.extend([sequence.encode('utf-8') for _, sequence in batch])
+        sequence_table, record_sequences = sequences.finish()
+        header_table, record_headers = headers.finish()
+
+        # Header ids are assigned in order of first appearance
+        _, first_records = np.unique(record_headers, return_index=True)
+        header_sequences = record_sequences[first_records]
+        # Records grouped by sequence id, file order within a group
+        sequence_records = np.argsort(record_sequences, kind='stable').astype('<u4')
+        counts = np.bincount(record_sequences, minlength=len(sequence_table))
+        sequence_record_offsets = np.concatenate(([0], np.cumsum(counts))).astype('<u8')
+
+        arrays = {
+            'sequence_arena': sequence_table.arena,
+            'sequence_offsets': sequence_table.offsets,
+            'sequence_hashes': sequence_table.hashes,
+            'sequence_table': sequence_table.table,
+            'header_arena': header_table.arena,
+            'header_offsets': header_table.offsets,
+            'header_hashes': header_table.hashes,
+            'header_table': header_table.table,
+            'record_headers': record_headers,
+            'record_sequences': record_sequences,
+            'header_sequences': header_sequences,
+            'sequence_record_offsets': sequence_record_offsets,
+            'sequence_records': sequence_records,
+        }
+        return cls(arrays)
+
+    @classmethod
+    def from_fasta(cls, fasta_path: str, output: Optional[str] = None) -> 'SequenceDB':
+        """
+        Build a database from a FASTA file (optionally gzipped).
+
+        Args:
+            fasta_path: Path to FASTA file
+            output: If given, save the database there and return it memory-mapped
+
+        Returns:
+            SequenceDB
+        """
+        db = cls.build(FastaProcessor(fasta_path).sequence_generator())
+        if output is None:
+            return db
+        db.save(output)
+        return cls.open(output)
+
+    @staticmethod
+    def _data_offset(header_size: int) -> int:
+        """Arrays start at the next 8-byte boundary after the header."""
+        return (12 + header_size + 7) // 8 * 8
+
+    def save(self, path: str) -> str:
+        """
+        Write the database to a memory-mappable file.
+
+        The file holds a small JSON header followed by the raw little-endian
+        arrays, each aligned to 8 bytes.
+
+        Args:
+            path: Output path (conventionally with the .sdb suffix)
+
+        Returns:
+            The path written
+        """
+        layout = {}
+        position = 0
+        for name in ARRAYS:
+            array = self._arrays[name]
+            layout[name] = [array.dtype.str, position, len(array)]
+            position += (array.nbytes + 7) // 8 * 8
+        header = json.dumps({
+            'records': len(self),
+            'arrays': layout,
+        }).encode('utf-8')
+        data_offset = self._data_offset(len(header))
+        with open(path, 'wb') as out:
+            out.write(struct.pack('<4sII', SDB_MAGIC, SDB_VERSION, len(header)))
+            out.write(header)
+            out.write(b'\0' * (data_offset - 12 - len(header)))
+            for name in ARRAYS:
+                raw = np.ascontiguousarray(self._arrays[name]).tobytes()
+                out.write(raw)
+                out.write(b'\0' * ((-len(raw)) % 8))
+        return path
+
+    @classmethod
+    def open(cls, path: str) -> 'SequenceDB':
+        """
+        Memory-map a database written by save().
+
+        Args:
+            path: Database file
+
+        Returns:
+            SequenceDB whose arrays are read-only views of the mapped file
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File {path} not found")
+        with open(path, 'rb') as f:
+            magic, version, header_size = struct.unpack('<4sII', f.read(12))
+            if magic != SDB_MAGIC or version != SDB_VERSION:
+                raise ValueError(f"{path} is not a sequence database file")
+            header = json.loads(f.read(header_size).decode('utf-8'))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data_offset = cls._data_offset(header_size)
+        arrays = {name: np.frombuffer(mapped, dtype=dtype, count=count,
+                                      offset=data_offset + offset)
+                  for name, (dtype, offset, count) in header['arrays'].items()}
+        db = cls(arrays, path)
+        db._mmap = mapped
+        return db
+
+    def __reduce__(self):
+        if self.path is not None:
+            # Workers map the same file instead of receiving a copy
+            return SequenceDB.open, (self.path,)
+        return SequenceDB, (self._arrays,)
+
+    def __len__(self) -> int:
+        """Number of records (including duplicates)."""
+        return len(self._record_sequences)
+
+    @property
+    def sequence_count(self) -> int:
+        """Number of distinct sequences."""
+        return len(self._sequences)
+
+    @property
+    def header_count(self) -> int:
+        """Number of distinct headers."""
+        return len(self._headers)
+
+    def get_statistics(self) -> Dict[str, int]:
+        """
+        Size of the database before and after deduplication.
+
+        Returns:
+            Dictionary with 'records', 'unique_sequences', 'unique_headers',
+            'sequence_bytes' (total of all records) and 'arena_bytes' (stored)
+        """
+        lengths = np.diff(self._sequences.offsets.astype(np.int64))
+        return {
+            'records': len(self),
+            'unique_sequences': self.sequence_count,
+            'unique_headers': self.header_count,
+            'sequence_bytes': int(lengths[self._record_sequences].sum()),
+            'arena_bytes': len(self._sequences.arena),
+        }
+
+    def sequence(self, sequence_id: int) -> str:
+        """Sequence text by id."""
+        return self._sequences[sequence_id].decode('utf-8')
+
+    def header(self, header_id: int) -> str:
+        """Header text by id."""
+        return self._headers[header_id].decode('utf-8')
+
+    def sequence_id(self, header: str) -> Optional[int]:
+        """Id of the sequence stored under a header, or None."""
+        header_id = self._headers.find(header.encode('utf-8'))
+        if header_id is None:
+            return None
+        return int(self._header_sequences[header_id])
+
+    def find_sequence(self, sequence: str) -> Optional[int]:
+        """Id of a sequence, or None if no record has it."""
+        return self._sequences.find(sequence.encode('utf-8'))
+
+    def get(self, header: str, default: Optional[str] = None) -> Optional[str]:
+        """Sequence stored under a header, or default."""
+        sequence_id = self.sequence_id(header)
+        return default if sequence_id is None else self.sequence(sequence_id)
+
+    def __getitem__(self, header: str) -> str:
+        sequence_id = self.sequence_id(header)
+        if sequence_id is None:
+            raise KeyError(header)
+        return self.sequence(sequence_id)
+
+    def __contains__(self, header: str) -> bool:
+        return self._headers.find(header.encode('utf-8')) is not None
+
+    def headers_for(self, sequence: str) -> List[str]:
+        """
+        Headers of all records with exactly this sequence, in file order.
+
+        Args:
+            sequence: Sequence text
+
+        Returns:
+            List of headers; empty if the sequence is not stored
+        """
+        sequence_id = self.find_sequence(sequence)
+        if sequence_id is None:
+            return []
+        first = int(self._sequence_record_offsets[sequence_id])
+        last = int(self._sequence_record_offsets[sequence_id + 1])
+        records = self._sequence_records[first:last]
+        return [self.header(int(i)) for i in self._record_headers[records]]
+
+    def records(self) -> Iterator[Tuple[str, str]]:
+        """Yield (header, sequence) for every record in file order."""
+        for header_id, sequence_id in zip(self._record_headers.tolist(),
+                                          self._record_sequences.tolist()):
+            yield self.header(header_id), self.sequence(sequence_id)
+
+    def close(self) -> None:
+        """Release the memory map of an opened database."""
+        if self._mmap is not None:
+            self._arrays = {}
+            self._sequences = self._headers = None
+            self._record_headers = self._record_sequences = None
+            self._header_sequences = None
+            self._sequence_record_offsets = self._sequence_records = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views still reference the mapping; it is released with them
+                pass
+            self._mmap = None
+
+    def __enter__(self) -> 'SequenceDB':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
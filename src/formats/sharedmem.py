@@ -0,0 +1,443 @@
+"""
+Shared-memory transport for record batches between processes.
+A RecordBatch is written once into a multiprocessing.shared_memory segment;
+only a small descriptor is pickled, and the receiving process maps the
+segment and reads numeric and text columns in place.
+"""
+
+from collections import deque
+from collections.abc import Sequence
+from functools import partial
+from itertools import repeat
+from multiprocessing import resource_tracker, shared_memory
+from operator import is_
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+import pickle
+import weakref
+
+import numpy as np
+
+from .batch import RecordBatch
+from .parallel import ordered_map
+
+
+# Column encodings in a segment
+ARRAY = 'array'
+TEXT = 'text'
+OBJECT = 'object'
+
+_ALIGN = 8
+
+
+def _aligned(size: int) -> int:
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class _Segment(shared_memory.SharedMemory):
+    """
+    Attached segment that may be dropped while arrays still view it.
+
+    NumPy views hold an export of the mapping, so closing fails with
+    BufferError until they are gone; the mapping is then released together
+    with the last view instead of when this handle is collected.
+    """
+
+    def __del__(self):
+        try:
+            self.close()
+        except (OSError, BufferError):
+            pass
+
+
+def _unlink(segment: shared_memory.SharedMemory) -> None:
+    """Finalizer of an owning batch: remove the segment name."""
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class TextColumn(Sequence):
+    """
+    Read-only column of str (or None) stored as UTF-8 bytes and offsets.
+
+    Value i is data[offsets[i]:offsets[i + 1]], decoded only when it is
+    accessed, so attaching or forwarding a batch does no per-record work.
+    Iteration and tolist() decode the whole column at once; take() and
+    sharing the column again copy bytes without decoding.
+
+    Example:
+        >>> names = batch['QNAME']          # TextColumn of an attached batch
+        >>> names[0], len(names)
+        ('read1', 250000)
+        >>> names.tolist()                  # plain list of str
+    """
+
+    __slots__ = ('offsets', 'data', 'missing')
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray,
+                 missing: Optional[np.ndarray] = None):
+        """
+        Args:
+            offsets: int64 array of len(column) + 1 byte offsets into data
+            data: uint8 array with the concatenated UTF-8 values
+            missing: Boolean mask of None values, if any
+        """
+        self.offsets = offsets
+        self.data = data
+        self.missing = missing
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return self.take(np.arange(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TextColumn index out of range")
+        if self.missing is not None and self.missing[index]:
+            return None
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return iter(self.tolist())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and self.tolist() == list(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"TextColumn({self.tolist()!r})"
+
+    def __reduce__(self):
+        return TextColumn, self._packed()
+
+    def _packed(self) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Offsets starting at 0 and just the bytes they cover."""
+        first, last = int(self.offsets[0]), int(self.offsets[-1])
+        return self.offsets - first, self.data[first:last], self.missing
+
+    def tolist(self) -> List[Optional[str]]:
+        """Decode every value into a list of str (None where missing)."""
+        offsets = (self.offsets - self.offsets[0]).tolist()
+        raw = self.data[int(self.offsets[0]):int(self.offsets[-1])].tobytes()
+        if raw.isascii():
+            text = raw.decode('ascii')
+            values = [text[a:b] for a, b in zip(offsets, offsets[1:])]
+        else:
+            values = [raw[a:b].decode('utf-8') for a, b in zip(offsets, offsets[1:])]
+        if self.missing is not None:
+            for i in np.flatnonzero(self.missing).tolist():
+                values[i] = None
+        return values
+
+    def take(self, rows: np.ndarray) -> 'TextColumn':
+        """
+        New column with the given rows, gathered without decoding.
+
+        Args:
+            rows: Integer indices
+
+        Returns:
+            TextColumn owning a compact copy of the selected bytes
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths)
+        missing = None if self.missing is None else self.missing[rows]
+        return TextColumn(offsets, self.data[positions], missing)
+
+
+class SharedRecordBatch(RecordBatch):
+    """
+    RecordBatch whose numeric and text columns are read-only views of a
+    shared segment (text columns as TextColumn).
+
+    The mapping stays valid for as long as the batch or any of its column
+    arrays is alive. When the batch owns the segment, the segment name is
+    removed once the batch is garbage-collected.
+    """
+
+    __slots__ = ('shared', '__weakref__')
+
+    def __init__(self, columns, shared: Optional['SharedBatch'] = None):
+        super().__init__(columns)
+        #: Descriptor while this batch owns a still-linked segment, else None
+        self.shared = shared
+
+
+class SharedBatch:
+    """
+    Picklable descriptor of a RecordBatch stored in shared memory.
+
+    Numeric NumPy columns are stored raw; text columns as one UTF-8 buffer
+    with an int64 offset table (and a mask for None values), attached as
+    TextColumn views; any other column is pickled into the segment.
+
+    Example:
+        >>> shared = share_batch(batch)      # in a worker
+        >>> batch = shared.attach()          # in the parent, no copy of arrays
+    """
+
+    __slots__ = ('name', 'length', 'columns')
+
+    def __init__(self, name: str, length: int, columns: List[Tuple[str, str, tuple]]):
+        """
+        Args:
+            name: Shared memory segment name
+            length: Number of records
+            columns: (name, encoding, layout) for each column in order
+        """
+        self.name = name
+        self.length = length
+        self.columns = columns
+
+    def __getstate__(self):
+        return self.name, self.length, self.columns
+
+    def __setstate__(self, state):
+        self.name, self.length, self.columns = state
+
+    def __repr__(self) -> str:
+        return f"SharedBatch(name={self.name!r}, records={self.length})"
+
+    def attach(self, owner: bool = True) -> SharedRecordBatch:
+        """
+        Map the segment and rebuild the batch.
+
+        Args:
+            owner: Take ownership, removing the segment name when the batch
+                is garbage-collected; False for borrowed (forwarded) batches
+
+        Returns:
+            SharedRecordBatch with numeric and text columns viewing the segment
+        """
+        segment = _Segment(self.name)
+        buffer = np.frombuffer(segment.buf, dtype=np.uint8)
+        columns = {}
+        for name, encoding, layout in self.columns:
+            if encoding == ARRAY:
+                dtype, shape, offset = layout
+                size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                column = buffer[offset:offset + size].view(dtype).reshape(shape)
+                column.flags.writeable = False
+                columns[name] = column
+            elif encoding == TEXT:
+                offsets_at, data_at, data_size, missing_at = layout
+                offsets = buffer[offsets_at:offsets_at + 8 * (self.length + 1)].view(np.int64)
+                missing = None if missing_at is None else \
+                    buffer[missing_at:missing_at + self.length].view(bool)
+                columns[name] = TextColumn(offsets, buffer[data_at:data_at + data_size], missing)
+            else:
+                offset, size = layout
+                columns[name] = pickle.loads(buffer[offset:offset + size].tobytes())
+        batch = SharedRecordBatch(columns, self if owner else None)
+        if owner:
+            weakref.finalize(batch, _unlink, segment)
+        return batch
+
+    def unlink(self) -> None:
+        """Remove a segment that will never be attached."""
+        try:
+            segment = shared_memory.SharedMemory(self.name)
+        except FileNotFoundError:
+            return
+        segment.unlink()
+        segment.close()
+
+
+def _encode_text(values: list) -> Optional[Tuple[bytes, np.ndarray, Optional[np.ndarray]]]:
+    """UTF-8 buffer, offsets and None mask of a list of str; None if not all str."""
+    missing = np.fromiter(map(is_, values, repeat(None)), dtype=bool, count=len(values))
+    if missing.any():
+        values = ['' if value is None else value for value in values]
+    else:
+        missing = None
+    try:
+        joined = ''.join(values)
+    except TypeError:
+        return None
+    if joined.isascii():
+        data = joined.encode('ascii')
+        lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    else:
+        encoded = [value.encode('utf-8') for value in values]
+        data = b''.join(encoded)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(values))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return data, offsets, missing
+
+
+def share_batch(batch: RecordBatch) -> SharedBatch:
+    """
+    Copy a batch into a new shared memory segment.
+
+    The creating handle is closed before returning; ownership passes to
+    whoever attaches the descriptor (or calls its unlink()).
+
+    Args:
+        batch: RecordBatch to share
+
+    Returns:
+        SharedBatch descriptor (a few hundred bytes when pickled)
+    """
+    layouts = []
+    parts = []
+    position = 0
+    for name, column in batch.columns.items():
+        if isinstance(column, np.ndarray) and column.dtype != object:
+            column = np.ascontiguousarray(column)
+            layouts.append((name, ARRAY, (column.dtype.str, column.shape, position)))
+            parts.append((position, column))
+            position += _aligned(column.nbytes)
+            continue
+        if isinstance(column, TextColumn):
+            offsets, data, missing = column._packed()
+        else:
+            text = _encode_text(list(column))
+            if text is None:
+                data = pickle.dumps(column, protocol=pickle.HIGHEST_PROTOCOL)
+                layouts.append((name, OBJECT, (position, len(data))))
+                parts.append((position, data))
+                position += _aligned(len(data))
+                continue
+            data, offsets, missing = text
+        offsets_at = position
+        data_at = offsets_at + _aligned(offsets.nbytes)
+        missing_at = data_at + _aligned(len(data))
+        position = missing_at
+        parts.extend(((offsets_at, offsets), (data_at, data)))
+        if missing is not None:
+            parts.append((missing_at, missing))
+            position += _aligned(len(missing))
+        else:
+            missing_at = None
+        layouts.append((name, TEXT, (offsets_at, data_at, len(data), missing_at)))
+
+    segment = shared_memory.SharedMemory(create=True, size=max(position, 1))
+    try:
+        for offset, data in parts:
+            if isinstance(data, np.ndarray):
+                data = data.view(np.uint8).reshape(-1)
+            segment.buf[offset:offset + len(data)] = data
+    except BaseException:
+        segment.unlink()
+        raise
+    finally:
+        segment.close()
+    return SharedBatch(segment.name, len(batch), layouts)
+
+
+def _share_result(result):
+    """Replace RecordBatch results (alone or inside a tuple) with descriptors."""
+    if isinstance(result, RecordBatch):
+        return share_batch(result)
+    if isinstance(result, tuple):
+        return tuple(_share_result(item) for item in result)
+    return result
+
+
+def receive(result):
+    """Attach descriptors in a result produced by shared_call (taking ownership)."""
+    if isinstance(result, SharedBatch):
+        return result.attach()
+    if isinstance(result, tuple):
+        return tuple(receive(item) for item in result)
+    return result
+
+
+def discard(result) -> None:
+    """Free the segments of a result that will never be received."""
+    if isinstance(result, SharedBatch):
+        result.unlink()
+    elif isinstance(result, tuple):
+        for item in result:
+            discard(item)
+
+
+def shared_call(func: Callable, item):
+    """
+    Worker-side wrapper: borrow a shared input batch, share the output.
+
+    Args:
+        func: Function of one item
+        item: SharedBatch (attached without ownership) or any picklable item
+
+    Returns:
+        func's result with RecordBatch values replaced by SharedBatch descriptors
+    """
+    if isinstance(item, SharedBatch):
+        item = item.attach(owner=False)
+    return _share_result(func(item))
+
+
+def shared_map(func: Callable, items: Iterable, workers: Optional[int] = None,
+               max_pending: Optional[int] = None) -> Iterator:
+    """
+    ordered_map that moves RecordBatch inputs and outputs through shared memory.
+
+    Input batches are handed to workers as descriptors: a batch that was
+    itself received from shared memory is forwarded without copying, any
+    other batch is copied into a segment once. Results containing
+    RecordBatch objects (alone or in a tuple) come back the same way, so a
+    stage's output can feed the next stage's workers without pickling.
+
+    Args:
+        func: Picklable top-level function (or functools.partial of one)
+        items: Iterable of RecordBatch objects or other picklable items
+        workers: Number of worker processes; 0 calls func in-process
+        max_pending: Bound on queued items and in-flight tasks
+
+    Yields:
+        func(item) for each item, in the order of items
+
+    Example:
+        >>> batches = reader.iter_batches(workers=8, shared_memory=True)
+        >>> for kept in shared_map(filter_batch, batches, workers=8):
+        ...     total += len(kept)
+    """
+    if workers == 0:
+        for item in items:
+            yield func(item)
+        return
+
+    # Segments are created in workers and unlinked here; one tracker must see both
+    resource_tracker.ensure_running()
+    # (input kept alive, descriptor created for it) per item not yet answered
+    inflight = deque()
+
+    def descriptors():
+        for item in items:
+            if isinstance(item, SharedRecordBatch) and item.shared is not None:
+                inflight.append((item, None))
+                yield item.shared
+            elif isinstance(item, RecordBatch):
+                shared = share_batch(item)
+                inflight.append((None, shared))
+                yield shared
+            else:
+                inflight.append((None, None))
+                yield item
+
+    results = ordered_map(partial(shared_call, func), descriptors(), workers, max_pending,
+                          discard=discard)
+    try:
+        for result in results:
+            _, created = inflight.popleft()
+            if created is not None:
+                created.unlink()
+            yield receive(result)
+    finally:
+        results.close()
+        for _, created in inflight:
+            if created is not None:
+                created.unlink()
@@ -0,0 +1,523 @@
+"""
+External-memory coordinate sort for SAM and VCF files.
+
+Records are read in chunks, keyed by (reference, position) with numpy and
+copied into one run buffer of a third of the budget. Each full run is sorted
+and spilled to a temporary file as columnar blocks (keys, line ends, line
+bytes). Runs are then merged: every run gets a read buffer of
+budget / (4 * runs), a heap keeps the run whose buffer ends with the smallest
+key, and everything up to that key is merged with one stable argsort, so the
+per-record work stays in numpy. Lines are copied by offset with numpy
+indexing rather than as per-line Python objects. When there are more runs
+than the budget allows buffers for, they are merged in several passes.
+
+Memory use is bounded by memory_budget regardless of the input size.
+"""
+
+from typing import List, Optional, Tuple
+import heapq
+import os
+import shutil
+import struct
+import tempfile
+
+from .registry import sniff_format
+from .streams import DEFAULT_CHUNK_SIZE, iter_line_chunks, open_binary
+
+
+#: Key of records without a reference (SAM RNAME '*'); they sort last
+UNPLACED = 0xffffffff
+
+_BLOCK_HEADER = struct.Struct('<QQ')
+
+# Smallest block of a spilled run, bytes
+_MIN_BLOCK = 64 << 10
+# Memory accounted per record for its key, offsets and their sorted copies
+_RECORD_BYTES = 64
+# Merge read buffers take 1/_MERGE_FACTOR of the budget: the records of one
+# merge step are copied once more, and sort arrays and output need the rest
+_MERGE_FACTOR = 4
+
+# (column of the reference name, column of the position), 0-based
+_KEY_COLUMNS = {'sam': (2, 3), 'vcf': (0, 1)}
+
+
+def _parse_positions(arr, begins, ends):
+    """Vectorised parse of unsigned decimal integers stored in arr[begins:ends]."""
+    import numpy as np
+
+    widths = ends - begins
+    values = np.zeros(len(begins), dtype=np.uint64)
+    if not len(begins):
+        return values
+    for digit in range(int(widths.max())):
+        valid = widths > digit
+        codes = arr[np.where(valid, begins + digit, 0)].astype(np.int64) - 48
+        if ((codes < 0) | (codes > 9))[valid].any():
+            raise ValueError("Non-numeric position in input")
+        values = np.where(valid, values * np.uint64(10) + codes.astype(np.uint64), values)
+    return values
+
+
+class _KeyExtractor:
+    """Computes sort keys for chunks of records; reference ids are shared by all runs."""
+
+    def __init__(self, fmt: str, reference_names: List[str]):
+        self.name_column, self.pos_column = _KEY_COLUMNS[fmt]
+        self.ids = {name.encode(): i for i, name in enumerate(reference_names)}
+        self._next_id = len(reference_names)
+        if fmt == 'sam':
+            self.ids[b'*'] = UNPLACED
+
+    def _ref_id(self, name: bytes) -> int:
+        rid = self.ids.get(name)
+        if rid is None:
+            # References missing from the header sort after the known ones,
+            # in order of first appearance
+            rid = self.ids[name] = self._next_id
+            self._next_id += 1
+        return rid
+
+    def __call__(self, chunk: bytes):
+        """
+        Returns:
+            (keys uint64, line starts, line ends) for the non-empty lines of chunk
+        """
+        import numpy as np
+
+        arr = np.frombuffer(chunk, dtype=np.uint8)
+        ends = np.flatnonzero(arr == 10) + 1
+        if not len(ends) or ends[-1] != len(arr):
+            ends = np.append(ends, len(arr))
+        starts = np.concatenate(([0], ends[:-1]))
+        keep = (ends - starts > 1) & (arr[starts] != ord('#')) & (arr[starts] != ord('@'))
+        starts, ends = starts[keep], ends[keep]
+
+        tabs = np.flatnonzero(arr == 9)
+        first = np.searchsorted(tabs, starts)
+        last_needed = first + self.pos_column
+        if len(starts) and (last_needed[-1] >= len(tabs) or (tabs[last_needed] >= ends).any()):
+            raise ValueError("Record with too few columns in input")
+        name_begin = starts if self.name_column == 0 else tabs[first + self.name_column - 1] + 1
+        name_end = tabs[first + self.name_column]
+        pos_begin = tabs[first + self.pos_column - 1] + 1
+        pos_end = tabs[first + self.pos_column]
+
+        ref_id = self._ref_id
+        names = zip(name_begin.tolist(), name_end.tolist())
+        rids = np.fromiter((ref_id(chunk[b:e]) for b, e in names), dtype=np.uint64,
+                           count=len(starts))
+        positions = _parse_positions(arr, pos_begin, pos_end)
+        positions[rids == UNPLACED] = 0
+        return (rids << np.uint64(32)) | positions, starts, ends
+
+
+def _block_ranges(lengths, block_bytes: int):
+    """Split records into consecutive (first, last) ranges of about block_bytes."""
+    import numpy as np
+
+    cumulative = np.cumsum(lengths)
+    first = 0
+    while first < len(lengths):
+        base = cumulative[first - 1] if first else 0
+        last = int(np.searchsorted(cumulative, base + block_bytes, side='right'))
+        last = max(last, first + 1)
+        yield first, last
+        first = last
+
+
+def _gather(data, starts, ends, piece_bytes: int):
+    """
+    Copy data[starts[i]:ends[i]] for all records into one uint8 array.
+
+    Lines are addressed by offset with a numpy index built for about
+    piece_bytes of output at a time, so no per-line objects are created.
+    """
+    import numpy as np
+
+    lengths = ends - starts
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    position = 0
+    for first, last in _block_ranges(lengths, piece_bytes):
+        piece = lengths[first:last]
+        total = int(piece.sum())
+        index = np.repeat(starts[first:last] - (np.cumsum(piece) - piece), piece)
+        index += np.arange(total)
+        out[position:position + total] = data[index]
+        position += total
+    return out
+
+
+def _write_block(out, keys, lengths, body) -> None:
+    """Write one run block: (count, size), keys, line ends, line bytes."""
+    import numpy as np
+
+    out.write(_BLOCK_HEADER.pack(len(keys), len(body)))
+    out.write(keys.tobytes())
+    out.write(np.cumsum(lengths, dtype=np.uint64).tobytes())
+    out.write(body)
+
+
+def _sorted_blocks(keys, starts, ends, data, block_bytes: int, piece_bytes: int):
+    """
+    Stable-sort records and yield them as (keys, lengths, line bytes) blocks.
+
+    A block holds about block_bytes, counting _RECORD_BYTES per record for
+    the arrays that describe it; lines are gathered piece_bytes at a time.
+    """
+    import numpy as np
+
+    order = np.argsort(keys, kind='stable')
+    keys, starts, ends = keys[order], starts[order], ends[order]
+    del order
+    lengths = ends - starts
+    for first, last in _block_ranges(lengths + _RECORD_BYTES, block_bytes):
+        body = _gather(data, starts[first:last], ends[first:last], piece_bytes)
+        yield keys[first:last], lengths[first:last], body
+
+
+def _piece_bytes(memory_budget: int) -> int:
+    # The gather index takes 16 bytes per byte of a piece: an eighth of the budget
+    return max(4096, memory_budget // 128)
+
+
+class _RunReader:
+    """Sequential reader of one spilled run with a bounded read buffer."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self.keys = None
+        self.position = 0
+        self._starts = self._ends = None
+        self._data = None
+
+    def load(self, limit: int) -> bool:
+        """
+        Replace the buffer with the next blocks of the run.
+
+        Blocks are read while they fit into limit bytes (at least one block,
+        counting _RECORD_BYTES per record). Returns False, closing the file,
+        at the end of the run.
+        """
+        import numpy as np
+
+        keys, ends, bodies = [], [], []
+        size = offset = 0
+        while True:
+            header = self._file.read(_BLOCK_HEADER.size)
+            if not header:
+                break
+            count, body_size = _BLOCK_HEADER.unpack(header)
+            if keys and size + body_size + _RECORD_BYTES * count > limit:
+                self._file.seek(-_BLOCK_HEADER.size, os.SEEK_CUR)
+                break
+            keys.append(np.frombuffer(self._file.read(8 * count), dtype=np.uint64))
+            ends.append(np.frombuffer(self._file.read(8 * count), dtype=np.uint64)
+                        .astype(np.int64) + offset)
+            bodies.append(self._file.read(body_size))
+            offset += body_size
+            size += body_size + _RECORD_BYTES * count
+        if not keys:
+            self._file.close()
+            self.keys = self._data = None
+            return False
+        self.keys = keys[0] if len(keys) == 1 else np.concatenate(keys)
+        self._ends = ends[0] if len(ends) == 1 else np.concatenate(ends)
+        self._starts = np.concatenate(([0], self._ends[:-1]))
+        self._data = np.frombuffer(bodies[0] if len(bodies) == 1 else b''.join(bodies),
+                                   dtype=np.uint8)
+        self.position = 0
+        return True
+
+    @property
+    def exhausted(self) -> bool:
+        return self.keys is None or self.position >= len(self.keys)
+
+    def take(self, stop: int):
+        """Keys, line lengths and line bytes from the current position up to stop."""
+        first, self.position = self.position, stop
+        if first == stop:
+            return self.keys[first:stop], self._ends[first:stop], self._data[:0]
+        begin, end = self._starts[first], self._ends[stop - 1]
+        return (self.keys[first:stop], self._ends[first:stop] - self._starts[first:stop],
+                self._data[begin:end])
+
+
+def _merge_blocks(run_paths: List[str], memory_budget: int, block_bytes: int):
+    """
+    Merge sorted runs, yielding (keys, lengths, line bytes) blocks in sorted order.
+
+    Each run keeps a read buffer of memory_budget / (_MERGE_FACTOR * runs)
+    bytes. A heap holds each run keyed by the last key in its buffer; every
+    record up to the smallest such key can be emitted without reading
+    further. Runs must be given in input order for the merge to be stable.
+    """
+    import numpy as np
+
+    limit = max(block_bytes, memory_budget // (_MERGE_FACTOR * max(1, len(run_paths))))
+    readers = [_RunReader(path) for path in run_paths]
+    heap = [(reader.keys[-1], i) for i, reader in enumerate(readers) if reader.load(limit)]
+    heapq.heapify(heap)
+    while heap:
+        bound, top = heap[0]
+        # Records equal to the bound are taken only from runs up to the top one:
+        # later runs wait until earlier runs cannot hold more of them, which
+        # keeps records with equal keys in input order
+        segments = []
+        for i, reader in enumerate(readers):
+            if not reader.exhausted:
+                side = 'right' if i <= top else 'left'
+                stop = int(np.searchsorted(reader.keys, bound, side=side))
+                segments.append(reader.take(max(stop, reader.position)))
+        keys = np.concatenate([segment[0] for segment in segments])
+        lengths = np.concatenate([segment[1] for segment in segments])
+        data = np.concatenate([segment[2] for segment in segments])
+        del segments
+        ends = np.cumsum(lengths)
+        yield from _sorted_blocks(keys, ends - lengths, ends, data, block_bytes,
+                                  _piece_bytes(memory_budget))
+        del keys, lengths, ends, data
+
+        # The top run's buffer is used up; load the next blocks of exhausted runs
+        while heap and readers[heap[0][1]].exhausted:
+            _, i = heapq.heappop(heap)
+            if readers[i].load(limit):
+                heapq.heappush(heap, (readers[i].keys[-1], i))
+
+
+def _set_sort_order(header_lines: List[bytes]) -> List[bytes]:
+    """Mark a SAM header as coordinate-sorted."""
+    for i, line in enumerate(header_lines):
+        if line.startswith(b'@HD'):
+            fields = [f for f in line.rstrip(b'\r\n').split(b'\t') if not f.startswith(b'SO:')]
+            header_lines[i] = b'\t'.join(fields + [b'SO:coordinate']) + b'\n'
+            return header_lines
+    return [b'@HD\tVN:1.6\tSO:coordinate\n'] + header_lines
+
+
+class ExternalSorter:
+    """
+    Coordinate sort of SAM or VCF files larger than memory.
+
+    Records are ordered by reference (in @SQ / ##contig header order, then
+    references missing from the header in order of appearance) and position;
+    SAM records without a reference go last. Records with equal keys keep
+    their input order within a run.
+
+    Example:
+        >>> sorter = ExternalSorter("aln.sam.gz", memory_budget=16 << 30)
+        >>> sorter.sort("aln.sorted.sam.gz", index=True)  # BGZF + .tbi
+    """
+
+    def __init__(self, filepath: str, memory_budget: int = 1 << 30,
+                 tmp_dir: Optional[str] = None, max_open_runs: int = 64):
+        """
+        Args:
+            filepath: SAM or VCF file (plain or compressed)
+            memory_budget: Approximate bound on memory used for records, bytes
+            tmp_dir: Directory for spilled runs (default: system temp directory)
+            max_open_runs: Maximum runs merged at once; more runs are merged in
+                passes. Lowered further if the budget cannot give each run a
+                read buffer of at least 64 KiB
+        """
+        self.filepath = filepath
+        self.format = sniff_format(filepath)
+        if self.format not in _KEY_COLUMNS:
+            raise ValueError(f"{filepath}: only SAM and VCF files can be sorted")
+        self.memory_budget = memory_budget
+        self.tmp_dir = tmp_dir
+        self.max_open_runs = max(2, max_open_runs)
+        self.run_count = 0
+
+    @property
+    def _run_bytes(self) -> int:
+        # The run buffer and the record arrays (up to as much again) fit into
+        # two thirds of the budget; the rest is left for chunks and output
+        return max(_MIN_BLOCK, self.memory_budget // 3)
+
+    @property
+    def _fan_in(self) -> int:
+        """Runs merged at once: each needs a read buffer of at least _MIN_BLOCK."""
+        affordable = self.memory_budget // (_MERGE_FACTOR * _MIN_BLOCK)
+        return max(2, min(self.max_open_runs, affordable))
+
+    @property
+    def _block_bytes(self) -> int:
+        """Block size of spilled runs, small enough for a merge of _fan_in runs."""
+        return max(_MIN_BLOCK, self.memory_budget // (_MERGE_FACTOR * self._fan_in))
+
+    def _read_header(self, handle) -> Tuple[List[bytes], List[str]]:
+        """Header lines and reference names in header order."""
+        lines, names = [], []
+        while True:
+            offset = handle.tell()
+            line = handle.readline()
+            if not line.startswith(b'@' if self.format == 'sam' else b'#'):
+                handle.seek(offset)
+                break
+            lines.append(line if line.endswith(b'\n') else line + b'\n')
+            text = line.decode('ascii', 'replace')
+            if text.startswith('@SQ'):
+                tags = dict(field.split(':', 1) for field in text.rstrip().split('\t')[1:] if ':' in field)
+                if 'SN' in tags:
+                    names.append(tags['SN'])
+            elif text.startswith('##contig=<'):
+                for item in text.rstrip()[len('##contig=<'):-1].split(','):
+                    if item.startswith('ID='):
+                        names.append(item[3:])
+        return lines, names
+
+    def _spill_runs(self, handle, directory: str, names: List[str]) -> List[str]:
+        """Cut the input into sorted runs on disk."""
+        import numpy as np
+
+        extract = _KeyExtractor(self.format, names)
+        runs = []
+        capacity = self._run_bytes
+        chunk_size = min(DEFAULT_CHUNK_SIZE, max(4096, capacity // 16))
+        buffer = np.empty(capacity, dtype=np.uint8)
+        parts = []
+        used = size = 0
+
+        def spill():
+            keys, starts, ends = (np.concatenate(column) for column in zip(*parts))
+            path = os.path.join(directory, f"run{len(runs):05d}")
+            with open(path, 'wb') as out:
+                for block in _sorted_blocks(keys, starts, ends, buffer[:used], self._block_bytes,
+                                            _piece_bytes(self.memory_budget)):
+                    _write_block(out, *block)
+            runs.append(path)
+
+        for _, chunk in iter_line_chunks(handle, chunk_size):
+            if not chunk.endswith(b'\n'):
+                chunk += b'\n'
+            if parts and used + len(chunk) > len(buffer):
+                spill()
+                parts, used, size = [], 0, 0
+            if len(chunk) > len(buffer):
+                # A single line longer than the run buffer
+                buffer = np.empty(len(chunk), dtype=np.uint8)
+            keys, starts, ends = extract(chunk)
+            buffer[used:used + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+            parts.append((keys, starts + used, ends + used))
+            used += len(chunk)
+            size += len(chunk) + _RECORD_BYTES * len(keys)
+            if size >= capacity:
+                spill()
+                parts, used, size = [], 0, 0
+        if parts:
+            spill()
+        return runs
+
+    def _merge_to_run(self, run_paths: List[str], path: str) -> None:
+        """Merge several runs into one larger run (intermediate pass)."""
+        with open(path, 'wb') as out:
+            for block in _merge_blocks(run_paths, self.memory_budget, self._block_bytes):
+                _write_block(out, *block)
+        for run in run_paths:
+            os.unlink(run)
+
+    def sort(self, output_path: str, bgzf: Optional[bool] = None, index: bool = False,
+             level: int = 6) -> str:
+        """
+        Write a coordinate-sorted copy of the file.
+
+        Args:
+            output_path: Output file
+            bgzf: Write BGZF; by default when output_path ends with '.gz' or '.bgz'
+            index: Also write a tabix index to output_path + '.tbi' (implies bgzf)
+            level: BGZF compression level
+
+        Returns:
+            output_path
+        """
+        if bgzf is None:
+            bgzf = output_path.endswith(('.gz', '.bgz'))
+        if index and not bgzf:
+            raise ValueError("A tabix index requires BGZF output")
+        directory = tempfile.mkdtemp(prefix='formats-sort-', dir=self.tmp_dir)
+        try:
+            with open_binary(self.filepath) as handle:
+                header, names = self._read_header(handle)
+                runs = self._spill_runs(handle, directory, names)
+            self.run_count = len(runs)
+            fan_in = self._fan_in
+            generation = 0
+            while len(runs) > fan_in:
+                # Consecutive groups are merged, so input order is kept for equal keys
+                merged = []
+                for first in range(0, len(runs), fan_in):
+                    group = runs[first:first + fan_in]
+                    if len(group) == 1:
+                        merged.extend(group)
+                        continue
+                    path = os.path.join(directory, f"merge{generation:03d}-{len(merged):05d}")
+                    self._merge_to_run(group, path)
+                    merged.append(path)
+                runs = merged
+                generation += 1
+            if self.format == 'sam':
+                header = _set_sort_order(header)
+            self._write_output(output_path, header, runs, bgzf, index, level)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return output_path
+
+    def _write_output(self, output_path: str, header: List[bytes], runs: List[str],
+                      bgzf: bool, index: bool, level: int) -> None:
+        import numpy as np
+
+        from .bgzf import BgzfWriter
+        from .tabix import TabixIndexBuilder, default_span
+
+        out = BgzfWriter(output_path, level) if bgzf else open(output_path, 'wb')
+        builder = TabixIndexBuilder(self.format) if index else None
+        span = default_span(self.format) if index else None
+        try:
+            out.write(b''.join(header))
+            for keys, lengths, body in _merge_blocks(runs, self.memory_budget,
+                                                     self._block_bytes):
+                if builder is None:
+                    out.write(body.tobytes())
+                    continue
+                body = body.tobytes()
+                ends = np.cumsum(lengths).tolist()
+                for key, begin, end in zip(keys.tolist(), [0] + ends[:-1], ends):
+                    line = body[begin:end]
+                    if key >> 32 == UNPLACED:
+                        builder.unplaced += 1
+                        out.write(line)
+                        continue
+                    start = out.tell()
+                    out.write(line)
+                    name, begin, end = span(line)
+                    builder.push(name, begin, end, start, out.tell())
+        finally:
+            out.close()
+        if builder is not None:
+            builder.write(output_path + '.tbi')
+
+
+def sort_file(filepath: str, output_path: str, memory_budget: int = 1 << 30,
+              bgzf: Optional[bool] = None, index: bool = False,
+              tmp_dir: Optional[str] = None) -> str:
+    """
+    Coordinate-sort a SAM or VCF file within a memory budget.
+
+    Args:
+        filepath: Input SAM or VCF (plain or compressed)
+        output_path: Sorted output
+        memory_budget: Approximate memory bound in bytes
+        bgzf: Write BGZF (default: when output_path ends with '.gz' or '.bgz')
+        index: Write a tabix index next to the output
+        tmp_dir: Directory for temporary runs
+
+    Returns:
+        output_path
+
+    Example:
+        >>> sort_file("calls.vcf", "calls.sorted.vcf.gz", index=True)
+        'calls.sorted.vcf.gz'
+    """
+    sorter = ExternalSorter(filepath, memory_budget, tmp_dir)
+    return sorter.sort(output_path, bgzf, index)
@@ -0,0 +1,197 @@
+"""
+Opt-in instrumentation for readers: per-stage counters and timers.
+"""
+
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+import time
+
+
+class _Stage:
+    """Context manager adding the elapsed time of a block to a stage timer."""
+
+    __slots__ = ('_stats', '_name', '_start')
+
+    def __init__(self, stats: 'ReaderStats', name: str):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stats.add_time(self._name, time.perf_counter() - self._start)
+
+
+class _NullStage:
+    """Shared no-op context manager used when instrumentation is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+class ReaderStats:
+    """
+    Counters and stage timers for one or more readers.
+
+    Standard counters: bytes_read (from disk), bytes_decompressed,
+    records_parsed, records_filtered (dropped by filters), batches.
+    Standard stages: read (I/O + decompression), parse, filter, plot.
+
+    Example:
+        >>> stats = ReaderStats(name='sam')
+        >>> reader = Samreader("aln.sam")
+        >>> reader.stats = stats
+        >>> for batch in reader.iter_batches():
+        ...     pass
+        >>> print(stats.to_prometheus())
+    """
+
+    enabled = True
+
+    def __init__(self, name: str = '',
+                 callback: Optional[Callable[[str, float, 'ReaderStats'], None]] = None):
+        """
+        Args:
+            name: Value of the 'reader' label in Prometheus output
+            callback: Called as callback(stage, seconds, stats) after every timed stage
+        """
+        self.name = name
+        self.callback = callback
+        self.counters = defaultdict(int)  # type: Dict[str, int]
+        self.timers = defaultdict(float)  # type: Dict[str, float]
+
+    def add(self, counter: str, value: int = 1) -> None:
+        """Increase a counter."""
+        self.counters[counter] += value
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """Add elapsed seconds to a stage timer."""
+        self.timers[stage] += seconds
+        if self.callback is not None:
+            self.callback(stage, seconds, self)
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager timing a block as stage `name`."""
+        return _Stage(self, name)
+
+    def reset(self) -> None:
+        """Clear all counters and timers."""
+        self.counters.clear()
+        self.timers.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Copy of counters and timers plus derived throughput figures."""
+        rates = {}
+        for counter, stage in (('bytes_decompressed', 'read'), ('records_parsed', 'parse')):
+            if self.timers.get(stage):
+                rates[f"{counter}_per_second"] = self.counters.get(counter, 0) / self.timers[stage]
+        return {'counters': dict(self.counters), 'timers': dict(self.timers), 'rates': rates}
+
+    def to_prometheus(self, prefix: str = 'formats') -> str:
+        """
+        Render counters and timers in the Prometheus text exposition format.
+
+        Returns:
+            Text with one '<prefix>_<counter>_total' metric per counter and a
+            '<prefix>_stage_seconds_total' metric labelled by stage
+        """
+        label = f'reader="{self.name}"'
+        lines = []
+        for counter in sorted(self.counters):
+            metric = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{{{label}}} {self.counters[counter]}")
+        if self.timers:
+            metric = f"{prefix}_stage_seconds_total"
+            lines.append(f"# TYPE {metric} counter")
+            for stage in sorted(self.timers):
+                lines.append(f'{metric}{{{label},stage="{stage}"}} {self.timers[stage]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def __str__(self) -> str:
+        parts = [f"{name}={value}" for name, value in sorted(self.counters.items())]
+        parts += [f"{name}={value:.3f}s" for name, value in sorted(self.timers.items())]
+        return f"ReaderStats({', '.join(parts)})"
+
+
+class NullStats:
+    """Disabled instrumentation: every method is a no-op."""
+
+    enabled = False
+    name = ''
+    counters = {}
+    timers = {}
+
+    def add(self, counter: str, value: int = 1) -> None:
+        pass
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        pass
+
+    def stage(self, name: str) -> _NullStage:
+        return _NULL_STAGE
+
+    def reset(self) -> None:
+        pass
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {'counters': {}, 'timers': {}, 'rates': {}}
+
+    def to_prometheus(self, prefix: str = 'formats') -> str:
+        return ''
+
+
+#: Shared default for readers without instrumentation
+NULL_STATS = NullStats()
+
+
+class CountingFile:
+    """Binary file wrapper counting bytes read from disk into a stats object."""
+
+    def __init__(self, raw, stats: ReaderStats):
+        self._raw = raw
+        self._stats = stats
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self._stats.add('bytes_read', len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        count = self._raw.readinto(buffer)
+        self._stats.add('bytes_read', count or 0)
+        return count
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self._raw.readline(size)
+        self._stats.add('bytes_read', len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._raw.close()
+
+
+def timed_call(func: Callable, item):
+    """Run func(item) and return (seconds, result); picklable for worker processes."""
+    start = time.perf_counter()
+    result = func(item)
+    return time.perf_counter() - start, result
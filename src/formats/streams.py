@@ -0,0 +1,222 @@
+"""
+Chunked file I/O shared by the format readers.
+Compression is detected from magic bytes, not from the file extension.
+"""
+
+from typing import Callable, Iterator, Optional, Tuple
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+from .stats import NULL_STATS, CountingFile
+
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZ2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_OPENERS = {
+    'gzip': gzip.open,
+    'bgzf': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+
+# Decompressors reading from an already opened file object
+_FILE_DECOMPRESSORS = {
+    'gzip': lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'),
+    'bgzf': lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'),
+    'bz2': lambda raw: bz2.BZ2File(raw, 'rb'),
+    'xz': lambda raw: lzma.LZMAFile(raw, 'rb'),
+}
+
+# (path, size, mtime) -> compression; sniffing is repeated only if the file changes
+_compression_cache = {}
+
+
+def sniff_compression(filepath: str) -> Optional[str]:
+    """
+    Detect compression from the first bytes of a file.
+
+    Args:
+        filepath: Path to file
+
+    Returns:
+        'gzip', 'bgzf', 'bz2', 'xz' or None for uncompressed files
+
+    Example:
+        >>> sniff_compression("reads.fastq.gz")
+        'gzip'
+    """
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime)
+    if key not in _compression_cache:
+        with open(filepath, 'rb') as f:
+            magic = f.read(18)
+        if magic.startswith(GZIP_MAGIC):
+            # BGZF is gzip with FEXTRA set and a 'BC' subfield
+            is_bgzf = len(magic) >= 14 and magic[3] & 4 and magic[12:14] == b'BC'
+            compression = 'bgzf' if is_bgzf else 'gzip'
+        elif magic.startswith(BZ2_MAGIC):
+            compression = 'bz2'
+        elif magic.startswith(XZ_MAGIC):
+            compression = 'xz'
+        elif magic.startswith(ZSTD_MAGIC):
+            raise ValueError(f"{filepath}: zstd compression is not supported")
+        else:
+            compression = None
+        _compression_cache[key] = compression
+    return _compression_cache[key]
+
+
+class _OwnedStream:
+    """Decompressing stream that also closes the raw file it reads from."""
+
+    def __init__(self, stream, raw):
+        self._stream = stream
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    def close(self) -> None:
+        self._stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_binary(filepath: str, stats=NULL_STATS):
+    """
+    Open a file for binary reading, decompressing it transparently.
+
+    Args:
+        filepath: Path to file
+        stats: ReaderStats receiving 'bytes_read' (bytes taken from disk)
+
+    Returns:
+        Binary file object with decompressed content
+    """
+    compression = sniff_compression(filepath)
+    if not stats.enabled:
+        if compression is None:
+            return open(filepath, 'rb')
+        return _OPENERS[compression](filepath, 'rb')
+    raw = CountingFile(open(filepath, 'rb'), stats)
+    if compression is None:
+        return raw
+    return _OwnedStream(_FILE_DECOMPRESSORS[compression](raw), raw)
+
+
+def open_text(filepath: str, encoding: str = 'utf-8'):
+    """Open a file for text reading, decompressing it transparently."""
+    if sniff_compression(filepath) is None:
+        return open(filepath, 'r', encoding=encoding)
+    return io.TextIOWrapper(open_binary(filepath), encoding=encoding)
+
+
+def read_head(filepath: str, size: int = 65536) -> bytes:
+    """Return the first bytes of the decompressed content."""
+    with open_binary(filepath) as f:
+        return f.read(size)
+
+
+def line_boundary(data: bytes) -> int:
+    """Chunk boundary after the last complete line."""
+    return data.rfind(b'\n') + 1
+
+
+def fasta_boundary(data: bytes) -> int:
+    """Chunk boundary before the last FASTA header (0 if there is none)."""
+    return data.rfind(b'\n>') + 1
+
+
+# A cut depends only on this many bytes before it, so a buffer without a
+# boundary never has to be searched again (see iter_record_chunks)
+line_boundary.overlap = 0
+fasta_boundary.overlap = 1
+
+
+def fastq_boundary(data: bytes) -> int:
+    """Chunk boundary after the last complete 4-line FASTQ record."""
+    end = data.rfind(b'\n') + 1
+    for _ in range(data.count(b'\n') % 4):
+        end = data.rfind(b'\n', 0, end - 1) + 1
+    return end
+
+
+def iter_record_chunks(handle, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       boundary: Callable[[bytes], int] = line_boundary
+                       ) -> Iterator[Tuple[int, bytes]]:
+    """
+    Cut a binary stream into chunks that end on a record boundary.
+
+    A record longer than chunk_size (e.g. a whole chromosome in FASTA) is
+    read in several parts that are joined once its end is found. If the
+    boundary function has an ``overlap`` attribute, only each new part and
+    that many preceding bytes are searched; otherwise the pending buffer is
+    searched again and reads grow with it, keeping the total work linear.
+
+    Args:
+        handle: Binary file object positioned at the start of a record
+        chunk_size: Approximate chunk size in bytes
+        boundary: Function returning the cut position in a buffer (0 = no complete record)
+
+    Yields:
+        Tuple of (offset of the chunk in the stream, chunk bytes)
+
+    Example:
+        >>> with open_binary("reads.fastq.gz") as f:
+        ...     for offset, chunk in iter_record_chunks(f, boundary=fastq_boundary):
+        ...         print(offset, chunk.count(b"\\n") // 4)
+    """
+    offset = handle.tell()
+    overlap = getattr(boundary, 'overlap', None)
+    # Data after the last cut; it holds no boundary of its own
+    parts = []
+    pending = 0
+    while True:
+        data = handle.read(chunk_size if overlap is not None else max(chunk_size, pending))
+        if not data:
+            break
+        if overlap is None:
+            if parts:
+                data = b''.join(parts) + data
+            cut = boundary(data)
+        else:
+            window = parts[-1][-overlap:] if parts and overlap else b''
+            cut = boundary(window + data) if window else boundary(data)
+            if cut > 0 and parts:
+                cut += pending - len(window)
+                data = b''.join(parts) + data
+        if cut <= 0:
+            if overlap is None:
+                parts = [data]
+                pending = len(data)
+            else:
+                parts.append(data)
+                pending += len(data)
+            continue
+        yield offset, data[:cut]
+        offset += cut
+        parts = [data[cut:]] if cut < len(data) else []
+        pending = len(data) - cut
+    if parts:
+        yield offset, b''.join(parts)
+
+
+def iter_line_chunks(handle, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """Cut a binary stream into chunks that end on a newline."""
+    return iter_record_chunks(handle, chunk_size, line_boundary)
@@ -0,0 +1,533 @@
+from functools import partial
+import zlib
+
+import numpy as np
+
+from .parallel import ordered_map
+from .streams import DEFAULT_CHUNK_SIZE, fastq_boundary, iter_record_chunks, open_binary
+
+
+# 2-битные коды оснований; 4 — N и любые другие символы (k-мер с ними не используется)
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate(('Aa', 'Cc', 'Gg', 'Tt')):
+    for _base in _bases:
+        _BASE_CODES[ord(_base)] = _code
+
+# Перевод в верхний регистр: soft-masked (строчные) основания сравниваются с адаптером
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[ord('a'):ord('z') + 1] -= 32
+
+_N_BASES = np.zeros(256, dtype=bool)
+_N_BASES[[ord('N'), ord('n')]] = True
+
+# Вероятность ошибки для Phred-качества 0..93
+_ERROR_PROBABILITY = 10.0 ** (-np.arange(94) / 10.0)
+
+#: Счётчики отчёта в порядке, в котором их возвращает FastqTrimmer.trim_chunk
+REPORT_FIELDS = ('reads_in', 'reads_out', 'bases_in', 'bases_out', 'adapter_trimmed',
+                 'too_short', 'too_many_errors', 'too_many_n')
+
+#: Наибольшее число ячеек (риды × позиции) матриц одной группы ридов в FastqTrimmer
+BLOCK_CELLS = 1 << 20
+
+
+def kmer_codes(matrix, k):
+    """
+    2-битные коды всех k-меров в строках матрицы оснований.
+
+    Args:
+        matrix (np.ndarray): uint8 матрица (риды × позиции), короткие риды дополнены нулями.
+        k (int): Длина k-мера, не больше 32.
+
+    Returns:
+        tuple: (codes, valid) — uint64 коды k-меров, начинающихся в каждой позиции,
+               и маска k-меров без N и без выхода за дополнение.
+    """
+    count, width = matrix.shape
+    positions = max(0, width - k + 1)
+    codes = np.zeros((count, positions), dtype=np.uint64)
+    valid = np.ones((count, positions), dtype=bool)
+    bases = _BASE_CODES[matrix]
+    for j in range(k if positions else 0):
+        column = bases[:, j:j + positions]
+        codes = (codes << np.uint64(2)) | (column & 3).astype(np.uint64)
+        valid &= column != 4
+    return codes, valid
+
+
+def sliding_window_cut(quality, lengths, window, threshold):
+    """
+    Обрезка по скользящему окну, как SLIDINGWINDOW в Trimmomatic.
+
+    Рид обрезается перед первым (от 5'-конца) окном из window оснований
+    со средним качеством ниже threshold.
+
+    Returns:
+        np.ndarray: Длины ридов после обрезки.
+    """
+    width = quality.shape[1]
+    if width < window:
+        return lengths.copy()
+    totals = np.zeros((len(lengths), width + 1), dtype=np.int64)
+    np.cumsum(quality, axis=1, out=totals[:, 1:])
+    sums = totals[:, window:] - totals[:, :-window]
+    starts = np.arange(sums.shape[1])
+    failed = (sums < threshold * window) & (starts + window <= lengths[:, None])
+    return np.where(failed.any(axis=1), failed.argmax(axis=1), lengths)
+
+
+def quality_3p_cut(quality, lengths, cutoff):
+    """
+    Обрезка 3'-конца по качеству алгоритмом BWA (как в cutadapt -q).
+
+    С 3'-конца накапливается сумма (cutoff - качество); рид обрезается в позиции,
+    где сумма максимальна, просмотр прекращается, когда сумма становится отрицательной.
+
+    Returns:
+        np.ndarray: Длины ридов после обрезки.
+    """
+    width = quality.shape[1]
+    if not width:
+        return lengths.copy()
+    inside = np.arange(width) < lengths[:, None]
+    deficit = np.where(inside, cutoff - quality.astype(np.int64), 0)
+    # suffix[:, i] — сумма дефицита от позиции i до конца рида
+    suffix = np.cumsum(deficit[:, ::-1], axis=1)[:, ::-1]
+    negative = (suffix < 0) & inside
+    stop = np.where(negative.any(axis=1), width - 1 - negative[:, ::-1].argmax(axis=1), -1)
+    candidate = inside & (np.arange(width) > stop[:, None])
+    scores = np.where(candidate, suffix, -1)
+    # При равенстве сумм — наибольшая позиция, как в BWA (просмотр с конца)
+    best = width - 1 - scores[:, ::-1].argmax(axis=1)
+    best_score = scores[np.arange(len(lengths)), best]
+    return np.where(best_score > 0, best, lengths)
+
+
+def _adapter_kmers(adapter, k):
+    """Коды k-меров адаптера без N и их смещения в адаптере."""
+    kmers, valid = kmer_codes(adapter[None, :], k)
+    positions = np.flatnonzero(valid[0])
+    return kmers[0, positions], positions
+
+
+def _seed_hits(seed_codes, kmers):
+    """
+    Попадания k-меров в отсортированный массив кодов затравок.
+
+    Returns:
+        tuple: (hits, entries) — номер k-мера и номер записи индекса для каждого
+               попадания; k-мер раскрывается во все вхождения своего кода.
+    """
+    low = np.searchsorted(seed_codes, kmers, side='left')
+    counts = np.searchsorted(seed_codes, kmers, side='right') - low
+    hits = np.repeat(np.arange(len(kmers)), counts)
+    entries = np.repeat(low, counts) + \
+        np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return hits, entries
+
+
+def _unique_candidates(rows, starts, span):
+    """
+    Различные пары (rows, starts), упорядоченные по риду и началу.
+
+    Начала лежат в [-span, число позиций), поэтому пара кодируется одним int64
+    и np.unique сортирует одномерный массив вместо пар.
+    """
+    stride = int(starts.max(initial=0)) + span + 1
+    keys = np.unique(rows * stride + (starts + span))
+    return keys // stride, keys % stride - span
+
+
+class AdapterIndex:
+    """
+    Индекс затравок (seed) адаптеров для поиска их в ридах.
+
+    Все k-меры каждого адаптера с их смещениями хранятся в отсортированном
+    массиве кодов. Для блока ридов коды всех k-меров считаются векторно,
+    попадания ищутся через searchsorted, а каждое попадание задаёт возможное
+    начало адаптера в риде, которое проверяется сравнением с допуском
+    max_error_rate несовпадений (без инделов). Адаптер может начинаться до
+    начала рида (димеры адаптеров).
+
+    Длина затравки выбирается по принципу Дирихле: перекрытие длины L с не
+    более чем e несовпадениями содержит точный k-мер при k <= L // (e + 1),
+    поэтому затравка не длиннее len(adapter) // (e + 1). Частичные адаптеры
+    на 3'-конце, для которых это условие не выполнено, ищутся по второму
+    индексу с затравкой min(L // (e + 1)) среди таких перекрытий в последних
+    len(adapter) - 1 основаниях рида; перекрытия короче затравки (от
+    min_overlap оснований) проверяются непосредственно.
+
+    Пример:
+        >>> index = AdapterIndex(['AGATCGGAAGAGC'])
+        >>> index.locate(matrix, lengths)
+    """
+
+    def __init__(self, adapters, seed_length=8, max_error_rate=0.1, min_overlap=3):
+        """
+        Args:
+            adapters (list): Последовательности адаптеров (3').
+            seed_length (int): Наибольшая длина затравки (не больше 32); уменьшается,
+                чтобы адаптер с допустимым числом ошибок всегда содержал затравку.
+            max_error_rate (float): Допустимая доля несовпадений в перекрытии.
+            min_overlap (int): Минимальное перекрытие рида с адаптером.
+        """
+        if not adapters:
+            raise ValueError("Нужен хотя бы один адаптер")
+        self.adapters = [np.frombuffer(adapter.upper().encode('ascii'), dtype=np.uint8)
+                         for adapter in adapters]
+        self.max_error_rate = max_error_rate
+        self.seed_length = max(1, min(seed_length, 32, min(
+            len(a) // (self._max_errors(len(a)) + 1) for a in self.adapters)))
+        self.min_overlap = min_overlap
+        codes, adapter_ids, offsets = [], [], []
+        for adapter_id, adapter in enumerate(self.adapters):
+            adapter_codes, positions = _adapter_kmers(adapter, self.seed_length)
+            codes.append(adapter_codes)
+            adapter_ids.append(np.full(len(positions), adapter_id, dtype=np.int64))
+            offsets.append(positions)
+        codes = np.concatenate(codes)
+        order = np.argsort(codes, kind='stable')
+        self.seed_codes = codes[order]
+        self.seed_adapters = np.concatenate(adapter_ids)[order]
+        self.seed_offsets = np.concatenate(offsets)[order]
+        # Для коротких затравок — таблица присутствия 4^k: большинство k-меров
+        # ридов отсекается одним обращением по индексу, без бинарного поиска
+        self._present = None
+        if self.seed_length <= 12:
+            self._present = np.zeros(4 ** self.seed_length, dtype=bool)
+            self._present[self.seed_codes] = True
+        self._direct_overlaps = []
+        self._tail_seeds = []
+        for adapter in self.adapters:
+            self._add_tail_seeds(adapter)
+
+    def _add_tail_seeds(self, adapter):
+        """
+        Готовит поиск частичных адаптеров на 3'-конце без гарантированной затравки.
+
+        Перекрытия короче seed_length проверяются непосредственно, для остальных
+        строится индекс затравок длины min(L // (e + 1)) с маской этих перекрытий.
+        """
+        overlaps = [overlap for overlap in range(self.min_overlap, len(adapter))
+                    if overlap // (self._max_errors(overlap) + 1) < self.seed_length]
+        self._direct_overlaps.append([overlap for overlap in overlaps
+                                      if overlap < self.seed_length])
+        seeded = [overlap for overlap in overlaps if overlap >= self.seed_length]
+        if not seeded:
+            self._tail_seeds.append(None)
+            return
+        k = min(overlap // (self._max_errors(overlap) + 1) for overlap in seeded)
+        codes, offsets = _adapter_kmers(adapter, k)
+        order = np.argsort(codes, kind='stable')
+        mask = np.zeros(len(adapter), dtype=bool)
+        mask[seeded] = True
+        self._tail_seeds.append((k, codes[order], offsets[order], mask))
+
+    def _max_errors(self, overlap):
+        """Допустимое число несовпадений в перекрытии длины overlap."""
+        return int(np.floor(self.max_error_rate * overlap))
+
+    def _matches(self, matrix, lengths, rows, starts, adapter):
+        """Маска кандидатов (rows, starts), совпадающих с адаптером с допуском ошибок."""
+        columns = starts[:, None] + np.arange(len(adapter))
+        inside = (columns >= 0) & (columns < lengths[rows][:, None])
+        bases = matrix[rows[:, None], np.clip(columns, 0, matrix.shape[1] - 1)]
+        mismatches = ((bases != adapter) & inside).sum(axis=1)
+        overlap = inside.sum(axis=1)
+        return (overlap >= self.min_overlap) & \
+            (mismatches <= np.floor(self.max_error_rate * overlap))
+
+    def _tail_candidates(self, matrix, lengths, adapter_id):
+        """Кандидаты (rows, starts) частичных адаптеров по короткой затравке на 3'-конце."""
+        k, seed_codes, seed_offsets, seeded = self._tail_seeds[adapter_id]
+        window = len(seeded) - 1
+        columns = lengths[:, None] - window + np.arange(window)
+        # Позиции до начала рида заполняются нулём: k-меры с ними не используются
+        tail = np.where(columns >= 0, matrix[np.arange(len(lengths))[:, None],
+                                             np.clip(columns, 0, matrix.shape[1] - 1)], 0)
+        codes, valid = kmer_codes(tail, k)
+        rows, positions = np.nonzero(valid)
+        hits, entries = _seed_hits(seed_codes, codes[rows, positions])
+        rows = rows[hits]
+        overlaps = window - positions[hits] + seed_offsets[entries]
+        starts = lengths[rows] - overlaps
+        kept = (overlaps <= window) & (starts >= 0)
+        kept[kept] = seeded[overlaps[kept]]
+        return _unique_candidates(rows[kept], starts[kept], len(seeded))
+
+    def locate(self, matrix, lengths):
+        """
+        Позиции начала адаптеров в ридах.
+
+        Args:
+            matrix (np.ndarray): uint8 матрица оснований (риды × позиции), регистр не важен.
+            lengths (np.ndarray): Длины ридов; адаптер ищется только в пределах длины.
+
+        Returns:
+            np.ndarray: Для каждого рида — начало самого левого найденного адаптера
+                        (0, если рид начинается внутри адаптера) или длина рида.
+        """
+        cut = lengths.copy()
+        if not len(lengths):
+            return cut
+        matrix = _UPPER[matrix]
+        k = self.seed_length
+        codes, valid = kmer_codes(matrix, k)
+        valid &= np.arange(codes.shape[1]) + k <= lengths[:, None]
+        if self._present is not None:
+            valid &= self._present[codes]
+        rows, positions = np.nonzero(valid)
+        hits, entries = _seed_hits(self.seed_codes, codes[rows, positions])
+        rows = rows[hits]
+        starts = positions[hits] - self.seed_offsets[entries]
+        adapter_ids = self.seed_adapters[entries]
+
+        for adapter_id, adapter in enumerate(self.adapters):
+            selected = adapter_ids == adapter_id
+            candidate_rows, candidate_starts = _unique_candidates(
+                rows[selected], starts[selected], len(adapter))
+            matched = self._matches(matrix, lengths, candidate_rows, candidate_starts, adapter)
+            np.minimum.at(cut, candidate_rows[matched], np.maximum(candidate_starts[matched], 0))
+
+            # Частичный адаптер на 3'-конце, который может не содержать точной затравки
+            if self._tail_seeds[adapter_id] is not None and matrix.shape[1]:
+                tail_rows, tail_starts = self._tail_candidates(matrix, lengths, adapter_id)
+                matched = self._matches(matrix, lengths, tail_rows, tail_starts, adapter)
+                np.minimum.at(cut, tail_rows[matched], tail_starts[matched])
+            for overlap in self._direct_overlaps[adapter_id]:
+                tail_rows = np.flatnonzero(lengths >= overlap)
+                tail_starts = lengths[tail_rows] - overlap
+                matched = self._matches(matrix, lengths, tail_rows, tail_starts, adapter)
+                np.minimum.at(cut, tail_rows[matched], tail_starts[matched])
+        return cut
+
+
+class TrimReport:
+    """
+    Итоговые счётчики обрезки и фильтрации.
+
+    Атрибуты:
+        reads_in, reads_out (int): Риды на входе и прошедшие фильтры.
+        bases_in, bases_out (int): Основания на входе и в результате.
+        adapter_trimmed (int): Риды, в которых найден адаптер.
+        too_short, too_many_errors, too_many_n (int): Отброшенные риды по причинам
+            (каждый рид учитывается по первой сработавшей причине).
+    """
+
+    def __init__(self):
+        for field in REPORT_FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, counts):
+        """Прибавляет счётчики блока (в порядке REPORT_FIELDS)."""
+        for field, value in zip(REPORT_FIELDS, counts):
+            setattr(self, field, getattr(self, field) + int(value))
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in REPORT_FIELDS}
+
+    def __repr__(self):
+        return 'TrimReport(' + ', '.join(f'{k}={v}' for k, v in self.as_dict().items()) + ')'
+
+
+def _padded_matrix(lines, lengths, width):
+    """Упаковывает строки bytes в матрицу uint8, дополненную нулями справа."""
+    matrix = np.zeros((len(lines), width), dtype=np.uint8)
+    matrix[np.arange(width) < lengths[:, None]] = np.frombuffer(b''.join(lines), dtype=np.uint8)
+    return matrix
+
+
+def _length_groups(lengths):
+    """
+    Группы номеров ридов близкой длины для построения матриц.
+
+    Риды сортируются по длине и делятся на классы [2^(e-1), 2^e), так что
+    дополнение нулями не больше длины самих ридов; класс режется на группы
+    не больше BLOCK_CELLS ячеек.
+    """
+    if not len(lengths):
+        return
+    order = np.argsort(lengths, kind='stable')
+    exponents = np.frexp(lengths[order].astype(np.float64))[1]
+    bounds = np.flatnonzero(np.diff(exponents)) + 1
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+        rows = max(1, BLOCK_CELLS // max(1, 1 << int(exponents[start])))
+        for first in range(start, end, rows):
+            yield order[first:min(first + rows, end)]
+
+
+class FastqTrimmer:
+    """
+    Векторная обрезка и фильтрация FASTQ ридов блоками.
+
+    Блок ридов переводится в матрицы оснований и качеств NumPy, после чего
+    все шаги выполняются над всем блоком сразу:
+
+    1. обрезка по скользящему окну (window, window_quality);
+    2. обрезка 3'-конца по качеству (quality_cutoff, алгоритм BWA);
+    3. удаление адаптеров (AdapterIndex) в оставшейся части рида;
+    4. фильтры: min_length, max_expected_errors (сумма вероятностей ошибок
+       по качествам), max_n_fraction (доля N).
+
+    Параметр None отключает соответствующий шаг. Блоки файла обрабатываются
+    в пуле процессов (ordered_map), порядок ридов сохраняется. При записи в
+    '.gz' каждый блок сжимается рабочим процессом в отдельный gzip-член;
+    их конкатенация — корректный gzip-файл, так что сжатие тоже
+    масштабируется по ядрам.
+
+    Пример:
+        >>> trimmer = FastqTrimmer(adapters=['AGATCGGAAGAGC'], quality_cutoff=20, min_length=30)
+        >>> report = trimmer.run("reads.fastq.gz", "reads.trimmed.fastq.gz", workers=8)
+        >>> report.reads_out
+    """
+
+    def __init__(self, adapters=(), quality_cutoff=20, window=4, window_quality=None,
+                 min_length=20, max_expected_errors=None, max_n_fraction=None,
+                 phred_offset=33, seed_length=8, max_error_rate=0.1, min_overlap=3):
+        """
+        Args:
+            adapters (list): 3'-адаптеры; пустой список — без удаления адаптеров.
+            quality_cutoff (int): Порог качества для обрезки 3'-конца.
+            window (int): Размер скользящего окна.
+            window_quality (int): Минимальное среднее качество в окне.
+            min_length (int): Минимальная длина рида после обрезки.
+            max_expected_errors (float): Максимальное ожидаемое число ошибок в риде.
+            max_n_fraction (float): Максимальная доля N в риде.
+            phred_offset (int): Смещение кодировки качества (33 или 64).
+            seed_length, max_error_rate, min_overlap: Параметры AdapterIndex.
+        """
+        self.adapter_index = AdapterIndex(adapters, seed_length, max_error_rate, min_overlap) \
+            if adapters else None
+        self.quality_cutoff = quality_cutoff
+        self.window = window
+        self.window_quality = window_quality
+        self.min_length = min_length
+        self.max_expected_errors = max_expected_errors
+        self.max_n_fraction = max_n_fraction
+        self.phred_offset = phred_offset
+
+    def evaluate(self, sequences, qualities):
+        """
+        Длины после обрезки и решение фильтров для списка ридов.
+
+        Риды обрабатываются группами близкой длины (_length_groups), поэтому
+        матрицы не растут до (число ридов × длина самого длинного рида).
+
+        Args:
+            sequences (list): Последовательности (bytes).
+            qualities (list): Строки качества (bytes) той же длины.
+
+        Returns:
+            tuple: (lengths, keep, counts) — np.ndarray длин после обрезки,
+                   маска прошедших фильтры ридов и счётчики в порядке REPORT_FIELDS.
+        """
+        original = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        if not np.array_equal(original, np.fromiter(map(len, qualities), dtype=np.int64,
+                                                    count=len(qualities))):
+            raise ValueError("Длина строки качества не совпадает с длиной последовательности")
+        lengths = original.copy()
+        keep = np.ones(len(original), dtype=bool)
+        counts = np.zeros(len(REPORT_FIELDS), dtype=np.int64)
+        for rows in _length_groups(original):
+            indices = rows.tolist()
+            lengths[rows], keep[rows], group_counts = self._evaluate_group(
+                [sequences[i] for i in indices], [qualities[i] for i in indices], original[rows])
+            counts += group_counts
+        return lengths, keep, counts.tolist()
+
+    def _evaluate_group(self, sequences, qualities, original):
+        """evaluate для группы ридов близкой длины."""
+        width = int(original.max()) if len(original) else 0
+        bases = _padded_matrix(sequences, original, width)
+        quality = _padded_matrix(qualities, original, width).astype(np.int16)
+        quality -= self.phred_offset
+        np.clip(quality, 0, 93, out=quality)
+
+        lengths = original
+        if self.window_quality is not None:
+            lengths = np.minimum(lengths, sliding_window_cut(quality, original, self.window,
+                                                             self.window_quality))
+        if self.quality_cutoff is not None:
+            lengths = np.minimum(lengths, quality_3p_cut(quality, lengths, self.quality_cutoff))
+        adapter_trimmed = 0
+        if self.adapter_index is not None:
+            cut = self.adapter_index.locate(bases, lengths)
+            adapter_trimmed = int((cut < lengths).sum())
+            lengths = cut
+
+        inside = np.arange(width) < lengths[:, None]
+        keep = np.ones(len(lengths), dtype=bool)
+        rejected = []
+        for enabled, passed in (
+                (self.min_length is not None,
+                 lambda: lengths >= self.min_length),
+                (self.max_expected_errors is not None,
+                 lambda: (_ERROR_PROBABILITY[quality] * inside).sum(axis=1)
+                 <= self.max_expected_errors),
+                (self.max_n_fraction is not None,
+                 lambda: (_N_BASES[bases] & inside).sum(axis=1)
+                 <= self.max_n_fraction * np.maximum(lengths, 1))):
+            if not enabled:
+                rejected.append(0)
+                continue
+            failed = keep & ~passed()
+            rejected.append(int(failed.sum()))
+            keep &= ~failed
+
+        counts = [len(lengths), int(keep.sum()), int(original.sum()), int(lengths[keep].sum()),
+                  adapter_trimmed] + rejected
+        return lengths, keep, counts
+
+    def trim_chunk(self, data, level=None):
+        """
+        Обрезает блок целых FASTQ записей (выполняется в рабочем процессе).
+
+        Args:
+            data (bytes): Блок FASTQ.
+            level (int): Уровень gzip-сжатия результата; None — без сжатия.
+
+        Returns:
+            tuple: (counts, payload) — счётчики в порядке REPORT_FIELDS и
+                   записи FASTQ (или gzip-член с ними).
+        """
+        lines = data.split(b'\n')
+        if lines and not lines[-1]:
+            lines.pop()
+        lines = [line.rstrip(b'\r') for line in lines[:len(lines) - len(lines) % 4]]
+        names, sequences, qualities = lines[0::4], lines[1::4], lines[3::4]
+        lengths, keep, counts = self.evaluate(sequences, qualities)
+        payload = b''.join(b'%s\n%s\n+\n%s\n' % (names[i], sequences[i][:length],
+                                                 qualities[i][:length])
+                           for i, length in zip(np.flatnonzero(keep).tolist(),
+                                                lengths[keep].tolist()))
+        if level is not None:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            payload = compressor.compress(payload) + compressor.flush()
+        return counts, payload
+
+    def run(self, filename, output, workers=0, batch_bytes=DEFAULT_CHUNK_SIZE, level=6):
+        """
+        Обрезает FASTQ-файл и потоково записывает результат.
+
+        Args:
+            filename (str): Входной FASTQ (можно сжатый).
+            output (str): Результат; '.gz' — gzip со сжатием в рабочих процессах.
+            workers (int): Число процессов; 0 — в текущем процессе.
+            batch_bytes (int): Размер блока в байтах.
+            level (int): Уровень gzip-сжатия.
+
+        Returns:
+            TrimReport: Счётчики по всему файлу.
+        """
+        report = TrimReport()
+        trim = partial(_trim_chunk, self, level if output.endswith('.gz') else None)
+        with open_binary(filename) as handle, open(output, 'wb') as out:
+            chunks = (chunk for _, chunk in iter_record_chunks(handle, batch_bytes, fastq_boundary))
+            for counts, payload in ordered_map(trim, chunks, workers):
+                report.add(counts)
+                out.write(payload)
+        return report
+
+
+def _trim_chunk(trimmer, level, data):
+    return trimmer.trim_chunk(data, level)
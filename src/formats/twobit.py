@@ -0,0 +1,490 @@
+"""
+Packed 2-bit sequence store.
+Compact in-memory and on-disk (.2bit) representation of reference sequences.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from .fasta import FastaProcessor
+
+
+TWOBIT_SIGNATURE = 0x1A412743
+
+# UCSC .2bit base order: T=0, C=1, A=2, G=3
+_BASES = np.frombuffer(b'TCAG', dtype=np.uint8)
+_CODES = np.zeros(256, dtype=np.uint8)
+_VALID = np.zeros(256, dtype=bool)
+for _code, _base in enumerate('TCAG'):
+    _CODES[ord(_base)] = _CODES[ord(_base.lower())] = _code
+    _VALID[ord(_base)] = _VALID[ord(_base.lower())] = True
+
+_COMPLEMENT = bytes.maketrans(b'ACGTNacgtn', b'TGCANtgcan')
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+# Bases per prefix-sum block; must be a multiple of 4
+BLOCK_SIZE = 1024
+N_CODE = 4
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (starts, sizes) of True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts.astype(np.uint32), (ends - starts).astype(np.uint32)
+
+
+def _pack(codes: np.ndarray) -> np.ndarray:
+    """Pack an array of 2-bit codes, four bases per byte, first base in high bits."""
+    pad = (-len(codes)) % 4
+    if pad:
+        codes = np.concatenate((codes, np.zeros(pad, dtype=np.uint8)))
+    quads = codes.reshape(-1, 4)
+    return (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+
+class _Runs:
+    """Sorted, non-overlapping runs (N blocks or soft-masked blocks)."""
+
+    __slots__ = ('starts', 'ends', 'cumulative')
+
+    def __init__(self, starts: np.ndarray, sizes: np.ndarray):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = self.starts + np.asarray(sizes, dtype=np.int64)
+        self.cumulative = np.concatenate(([0], np.cumsum(self.ends - self.starts)))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """Indices [lo, hi) of runs overlapping [start, end)."""
+        lo = int(np.searchsorted(self.ends, start, side='right'))
+        hi = int(np.searchsorted(self.starts, end, side='left'))
+        return lo, max(lo, hi)
+
+    def count(self, start: int, end: int) -> int:
+        """Number of positions in [start, end) covered by runs."""
+        lo, hi = self.span(start, end)
+        if lo == hi:
+            return 0
+        total = int(self.cumulative[hi] - self.cumulative[lo])
+        total -= max(0, start - int(self.starts[lo]))
+        total -= max(0, int(self.ends[hi - 1]) - end)
+        return total
+
+    def apply(self, buffer: np.ndarray, start: int, end: int, func) -> None:
+        """Call func(buffer_slice) for every run clipped to [start, end)."""
+        lo, hi = self.span(start, end)
+        for i in range(lo, hi):
+            a = max(int(self.starts[i]), start) - start
+            b = min(int(self.ends[i]), end) - start
+            func(buffer[a:b])
+
+
+class _PackedData:
+    """Forward-strand storage shared by all views of one sequence."""
+
+    __slots__ = ('packed', 'size', 'n_runs', 'mask_runs', '_block_counts')
+
+    def __init__(self, packed: np.ndarray, size: int, n_runs: _Runs, mask_runs: _Runs):
+        self.packed = packed
+        self.size = size
+        self.n_runs = n_runs
+        self.mask_runs = mask_runs
+        self._block_counts = None
+
+    def codes(self, start: int, end: int) -> np.ndarray:
+        """Unpack codes for [start, end); positions inside N runs get N_CODE."""
+        first, last = start // 4, (end + 3) // 4
+        quads = (self.packed[first:last, None] >> _SHIFTS) & 3
+        codes = quads.reshape(-1)[start - first * 4:end - first * 4].astype(np.uint8)
+
+        def set_n(view):
+            view[:] = N_CODE
+
+        self.n_runs.apply(codes, start, end, set_n)
+        return codes
+
+    def block_counts(self) -> np.ndarray:
+        """Cumulative per-block counts of T, C, A, G, N (shape: blocks + 1, 5)."""
+        if self._block_counts is None:
+            n_blocks = (self.size + BLOCK_SIZE - 1) // BLOCK_SIZE
+            counts = np.zeros((n_blocks + 1, 5), dtype=np.uint32)
+            chunk = BLOCK_SIZE * 1024
+            for start in range(0, self.size, chunk):
+                end = min(start + chunk, self.size)
+                codes = self.codes(start, end)
+                block = start // BLOCK_SIZE
+                pad = (-len(codes)) % BLOCK_SIZE
+                if pad:
+                    codes = np.concatenate((codes, np.full(pad, 255, dtype=np.uint8)))
+                blocks = codes.reshape(-1, BLOCK_SIZE)
+                for code in range(5):
+                    counts[block + 1:block + 1 + len(blocks), code] = (blocks == code).sum(axis=1)
+            np.cumsum(counts, axis=0, out=counts)
+            self._block_counts = counts
+        return self._block_counts
+
+    def code_counts(self, start: int, end: int) -> np.ndarray:
+        """Counts of T, C, A, G, N in [start, end) using block prefix sums."""
+        cumulative = self.block_counts()
+        first, last = start // BLOCK_SIZE, end // BLOCK_SIZE
+        if first == last:
+            return np.bincount(self.codes(start, end), minlength=5)[:5].astype(np.int64)
+        counts = cumulative[last].astype(np.int64) - cumulative[first]
+        head = first * BLOCK_SIZE
+        if start > head:
+            counts -= np.bincount(self.codes(head, start), minlength=5)[:5]
+        tail = last * BLOCK_SIZE
+        if end > tail:
+            counts += np.bincount(self.codes(tail, end), minlength=5)[:5]
+        return counts
+
+
+class PackedSequence:
+    """
+    Nucleotide sequence stored at 2 bits per base.
+
+    N bases and soft-masked (lower-case) regions are kept as sparse runs.
+    Slicing and reverse-complement return O(1) views sharing the same
+    packed buffer; text is only produced by str() or to_str().
+
+    Example:
+        >>> seq = PackedSequence.from_string("ACGTNNacgt")
+        >>> str(seq[2:8].reverse_complement())
+        'gtNNAC'
+        >>> seq.gc_content()
+        0.5
+    """
+
+    __slots__ = ('_data', '_start', '_end', '_reverse')
+
+    def __init__(self, data: _PackedData, start: int = 0, end: Optional[int] = None,
+                 reverse: bool = False):
+        self._data = data
+        self._start = start
+        self._end = data.size if end is None else end
+        self._reverse = reverse
+
+    @classmethod
+    def from_string(cls, sequence: Union[str, bytes]) -> 'PackedSequence':
+        """
+        Pack a nucleotide string.
+
+        Any character other than A, C, G or T (in either case) is stored as N;
+        lower-case characters are recorded as soft-masked.
+
+        Args:
+            sequence: Sequence text
+
+        Returns:
+            PackedSequence covering the whole string
+        """
+        if isinstance(sequence, str):
+            sequence = sequence.encode('ascii')
+        raw = np.frombuffer(sequence, dtype=np.uint8)
+        n_starts, n_sizes = _runs(~_VALID[raw])
+        m_starts, m_sizes = _runs((raw >= ord('a')) & (raw <= ord('z')))
+        data = _PackedData(_pack(_CODES[raw]), len(raw),
+                           _Runs(n_starts, n_sizes), _Runs(m_starts, m_sizes))
+        return cls(data)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def _forward_range(self, start: int, stop: int) -> Tuple[int, int]:
+        """Map a [start, stop) range of this view to forward-strand coordinates."""
+        if self._reverse:
+            return self._end - stop, self._end - start
+        return self._start + start, self._start + stop
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError("PackedSequence slices do not support a step")
+            start, stop, _ = key.indices(len(self))
+            stop = max(start, stop)
+            start, stop = self._forward_range(start, stop)
+            return PackedSequence(self._data, start, stop, self._reverse)
+        index = key + len(self) if key < 0 else key
+        if not 0 <= index < len(self):
+            raise IndexError("PackedSequence index out of range")
+        return self.to_str(index, index + 1)
+
+    def reverse_complement(self) -> 'PackedSequence':
+        """Return a reverse-complement view of this sequence (no copy)."""
+        return PackedSequence(self._data, self._start, self._end, not self._reverse)
+
+    @property
+    def is_reverse(self) -> bool:
+        """True if this view is on the reverse strand."""
+        return self._reverse
+
+    def to_str(self, start: int = 0, end: Optional[int] = None) -> str:
+        """
+        Unpack a range of this view to text.
+
+        Args:
+            start: Start position within the view (inclusive)
+            end: End position within the view (exclusive), defaults to the end
+
+        Returns:
+            Sequence string with N and soft-masking restored
+        """
+        end = len(self) if end is None else end
+        a, b = self._forward_range(start, end)
+        data = self._data
+        text = _BASES[np.minimum(data.codes(a, b), 3)]
+
+        def set_n(view):
+            view[:] = ord('N')
+
+        def set_lower(view):
+            view |= 0x20
+
+        data.n_runs.apply(text, a, b, set_n)
+        data.mask_runs.apply(text, a, b, set_lower)
+        raw = text.tobytes()
+        if self._reverse:
+            raw = raw.translate(_COMPLEMENT)[::-1]
+        return raw.decode('ascii')
+
+    def __str__(self) -> str:
+        return self.to_str()
+
+    def __repr__(self) -> str:
+        strand = '-' if self._reverse else '+'
+        return f"PackedSequence(length={len(self)}, strand='{strand}')"
+
+    def base_counts(self, start: int = 0, end: Optional[int] = None) -> Dict[str, int]:
+        """
+        Count bases in a range without unpacking it.
+
+        Args:
+            start: Start position within the view (inclusive)
+            end: End position within the view (exclusive)
+
+        Returns:
+            Dictionary with counts for 'A', 'C', 'G', 'T' and 'N'
+
+        Example:
+            >>> PackedSequence.from_string("AACGN").base_counts()
+            {'A': 2, 'C': 1, 'G': 1, 'T': 0, 'N': 1}
+        """
+        end = len(self) if end is None else end
+        a, b = self._forward_range(start, end)
+        t, c, g_a, g, n = (int(x) for x in self._data.code_counts(a, b))
+        counts = {'A': g_a, 'C': c, 'G': g, 'T': t, 'N': n}
+        if self._reverse:
+            counts = {'A': t, 'C': g, 'G': c, 'T': g_a, 'N': n}
+        return counts
+
+    def gc_content(self, start: int = 0, end: Optional[int] = None) -> float:
+        """
+        GC fraction over the A/C/G/T bases of a range (N excluded).
+
+        Returns:
+            GC fraction, or 0.0 if the range has no called bases
+        """
+        counts = self.base_counts(start, end)
+        called = counts['A'] + counts['C'] + counts['G'] + counts['T']
+        if called == 0:
+            return 0.0
+        return (counts['G'] + counts['C']) / called
+
+    def masked_count(self, start: int = 0, end: Optional[int] = None) -> int:
+        """Number of soft-masked positions in a range."""
+        end = len(self) if end is None else end
+        a, b = self._forward_range(start, end)
+        return self._data.mask_runs.count(a, b)
+
+    def _forward_data(self) -> _PackedData:
+        """Storage for this exact view on the forward strand (repacked if needed)."""
+        data = self._data
+        if self._start == 0 and self._end == data.size and not self._reverse:
+            return data
+        return PackedSequence.from_string(self.to_str())._data
+
+
+class TwoBitFile:
+    """
+    Memory-mapped reader for UCSC .2bit files.
+
+    Sequences are returned as PackedSequence objects whose packed bases are
+    views into the mapped file, so opening a genome costs almost no memory.
+
+    Example:
+        >>> with TwoBitFile("genome.2bit") as genome:
+        ...     chunk = genome["chr1"][10000:10100]
+        ...     print(chunk.gc_content())
+    """
+
+    def __init__(self, filepath: str):
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File {filepath} not found")
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._cache = {}
+        self._read_index()
+
+    def _read_index(self) -> None:
+        buffer = self._mmap
+        signature, = struct.unpack_from('<I', buffer, 0)
+        if signature == TWOBIT_SIGNATURE:
+            self._endian = '<'
+        elif struct.unpack_from('>I', buffer, 0)[0] == TWOBIT_SIGNATURE:
+            self._endian = '>'
+        else:
+            raise ValueError(f"{self.filepath} is not a .2bit file")
+        version, count, _ = struct.unpack_from(self._endian + 'III', buffer, 4)
+        if version not in (0, 1):
+            raise ValueError(f"Unsupported .2bit version {version}")
+        offset_format = self._endian + ('Q' if version == 1 else 'I')
+        offset_size = struct.calcsize(offset_format)
+
+        self._offsets = {}
+        position = 16
+        for _ in range(count):
+            name_size = buffer[position]
+            name = buffer[position + 1:position + 1 + name_size].decode('ascii')
+            position += 1 + name_size
+            self._offsets[name], = struct.unpack_from(offset_format, buffer, position)
+            position += offset_size
+
+    def _uint32_array(self, count: int, offset: int) -> np.ndarray:
+        return np.frombuffer(self._mmap, dtype=self._endian + 'u4', count=count, offset=offset)
+
+    def names(self) -> List[str]:
+        """Sequence names in file order."""
+        return list(self._offsets)
+
+    def sequence_sizes(self) -> Dict[str, int]:
+        """Dictionary of sequence name to length."""
+        return {name: len(self[name]) for name in self._offsets}
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._offsets
+
+    def __iter__(self) -> Iterator[Tuple[str, PackedSequence]]:
+        for name in self._offsets:
+            yield name, self[name]
+
+    def __getitem__(self, name: str) -> PackedSequence:
+        if name not in self._cache:
+            position = self._offsets[name]
+            size, n_count = struct.unpack_from(self._endian + 'II', self._mmap, position)
+            position += 8
+            n_runs = _Runs(self._uint32_array(n_count, position),
+                           self._uint32_array(n_count, position + 4 * n_count))
+            position += 8 * n_count
+            mask_count, = struct.unpack_from(self._endian + 'I', self._mmap, position)
+            position += 4
+            mask_runs = _Runs(self._uint32_array(mask_count, position),
+                              self._uint32_array(mask_count, position + 4 * mask_count))
+            position += 8 * mask_count + 4
+            packed = np.frombuffer(self._mmap, dtype=np.uint8,
+                                   count=(size + 3) // 4, offset=position)
+            self._cache[name] = _PackedData(packed, size, n_runs, mask_runs)
+        return PackedSequence(self._cache[name])
+
+    def close(self) -> None:
+        """Release the memory map (sequences obtained earlier become invalid)."""
+        self._cache.clear()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views still reference the mapping; it is released with them
+            pass
+        self._file.close()
+
+    def __enter__(self) -> 'TwoBitFile':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def write_twobit(filepath: str,
+                 records: Iterable[Tuple[str, Union[str, PackedSequence]]]) -> int:
+    """
+    Write sequences to a UCSC-compatible .2bit file.
+
+    Args:
+        filepath: Output path
+        records: Iterable of (name, sequence) where sequence is a string or PackedSequence
+
+    Returns:
+        Number of sequences written
+
+    Example:
+        >>> processor = FastaProcessor("genome.fa")
+        >>> write_twobit("genome.2bit", processor.sequence_generator())
+    """
+    entries = []
+    for name, sequence in records:
+        if not isinstance(sequence, PackedSequence):
+            sequence = PackedSequence.from_string(sequence)
+        name = name.split()[0] if name.strip() else name
+        if len(name.encode('ascii')) > 255:
+            raise ValueError(f"Sequence name too long for .2bit: {name[:40]}...")
+        entries.append((name, sequence._forward_data()))
+
+    index_size = 16 + sum(1 + len(name) + 4 for name, _ in entries)
+    offsets = []
+    position = index_size
+    for _, data in entries:
+        offsets.append(position)
+        position += (16 + 8 * (len(data.n_runs) + len(data.mask_runs))
+                     + len(data.packed))
+    version = 0
+    if offsets and offsets[-1] > 0xFFFFFFFF:
+        # Version 1 stores 64-bit offsets for files over 4 GB
+        version = 1
+        shift = 4 * len(entries)
+        offsets = [offset + shift for offset in offsets]
+
+    with open(filepath, 'wb') as out:
+        out.write(struct.pack('<IIII', TWOBIT_SIGNATURE, version, len(entries), 0))
+        offset_format = '<Q' if version == 1 else '<I'
+        for (name, _), offset in zip(entries, offsets):
+            encoded = name.encode('ascii')
+            out.write(struct.pack('<B', len(encoded)) + encoded)
+            out.write(struct.pack(offset_format, offset))
+        for _, data in entries:
+            n_runs, mask_runs = data.n_runs, data.mask_runs
+            out.write(struct.pack('<II', data.size, len(n_runs)))
+            out.write(n_runs.starts.astype('<u4').tobytes())
+            out.write((n_runs.ends - n_runs.starts).astype('<u4').tobytes())
+            out.write(struct.pack('<I', len(mask_runs)))
+            out.write(mask_runs.starts.astype('<u4').tobytes())
+            out.write((mask_runs.ends - mask_runs.starts).astype('<u4').tobytes())
+            out.write(struct.pack('<I', 0))
+            out.write(np.asarray(data.packed, dtype=np.uint8).tobytes())
+    return len(entries)
+
+
+def fasta_to_twobit(fasta_path: str, twobit_path: str) -> int:
+    """
+    Quick function to convert a FASTA (optionally gzipped) file to .2bit.
+
+    Args:
+        fasta_path: Path to FASTA file
+        twobit_path: Path of the .2bit file to create
+
+    Returns:
+        Number of sequences written
+
+    Example:
+        >>> fasta_to_twobit("hg38.fa.gz", "hg38.2bit")
+    """
+    processor = FastaProcessor(fasta_path)
+    return write_twobit(twobit_path, processor.sequence_generator())
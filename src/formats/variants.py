@@ -0,0 +1,595 @@
+from functools import lru_cache, partial
+import hashlib
+
+import numpy as np
+
+from .batch import RecordBatch
+from .duplicates import KeyTable, combine_keys
+from .parallel import ordered_map
+from .streams import DEFAULT_CHUNK_SIZE, iter_line_chunks, open_binary
+from .vcf import Vcfreader, parse_vcf_chunk
+
+
+#: 128-битный ключ варианта: hi — (контиг << 40) | POS, lo — аллели
+KEY128_DTYPE = np.dtype([('hi', '<u8'), ('lo', '<u8')])
+
+#: Записи таблицы множеств: хэш для разделов, ключ, номер файла и номер варианта в нём
+SET_DTYPE = np.dtype([('key', '<u8'), ('hi', '<u8'), ('lo', '<u8'), ('source', '<u2'),
+                      ('row', '<u8')])
+
+POSITION_BITS = 40
+# Контиги вне списка: старший бит 24-битного номера и 23 бита хэша имени
+_UNKNOWN_CONTIG = 1 << 23
+
+# Точное кодирование аллелей: 5 + 5 бит длин и по 2 бита на основание
+EXACT_BASES = 26
+_HASHED = np.uint64(1 << 63)
+
+_ALLELE_CODES = np.full(256, 255, dtype=np.uint8)
+for _code, _base in enumerate('ACGT'):
+    _ALLELE_CODES[ord(_base)] = _code
+_SHIFTS = np.arange(2 * (EXACT_BASES - 1), -1, -2, dtype=np.uint64)
+
+# Сколько оснований слева читать из референса за раз при сдвиге indel
+_WINDOW = 64
+
+#: Флаги вариантов в VariantSets
+FIRST = 1
+FIRST_IN_SOURCE = 2
+
+OPERATIONS = ('union', 'intersection', 'difference', 'duplicates')
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(),
+                          'little')
+
+
+class Reference:
+    """
+    Референсные последовательности для нормализации вариантов.
+
+    Принимает файл .2bit (читается через отображение в память), FASTA
+    (последовательности упаковываются в PackedSequence, 2 бита на основание)
+    или словарь имя -> строка/PackedSequence. Последовательности FASTA
+    называются по первому слову заголовка. Reference, открытый по пути,
+    передаётся в рабочие процессы как путь и открывается там один раз.
+
+    Пример:
+        >>> reference = Reference.open("hg38.2bit")
+        >>> reference.fetch("chr1", 10000, 10010)
+        'TAACCCTAAC'
+    """
+
+    def __init__(self, sequences, names=None, path=None):
+        """
+        Args:
+            sequences: Словарь (или TwoBitFile) имя -> последовательность.
+            names (list): Порядок контигов; по умолчанию порядок sequences.
+            path (str): Файл, из которого загружены последовательности.
+        """
+        self.sequences = sequences
+        self.names = list(sequences) if names is None else list(names)
+        self.path = path
+
+    def __reduce__(self):
+        if self.path is not None:
+            return _open_reference, (self.path,)
+        return Reference, (self.sequences, self.names)
+
+    @classmethod
+    def open(cls, path):
+        """Загружает .2bit или FASTA (можно сжатый)."""
+        if path.endswith('.2bit'):
+            from .twobit import TwoBitFile
+            genome = TwoBitFile(path)
+            return cls(genome, genome.names(), path)
+        from .fasta import FastaProcessor
+        from .twobit import PackedSequence
+        sequences = {}
+        for header, sequence in FastaProcessor(path).sequence_generator():
+            name = header.split(None, 1)[0] if header else header
+            sequences[name] = PackedSequence.from_string(sequence)
+        return cls(sequences, path=path)
+
+    def fetch(self, chrom, start, end):
+        """
+        Основания [start, end) в верхнем регистре (0-based).
+
+        Returns:
+            str: Последовательность, обрезанная по границам контига; '' для неизвестного контига.
+        """
+        if chrom not in self.sequences:
+            return ''
+        sequence = self.sequences[chrom]
+        end = min(end, len(sequence))
+        if start >= end:
+            return ''
+        return str(sequence[max(0, start):end]).upper()
+
+
+@lru_cache(maxsize=4)
+def _open_reference(path):
+    return Reference.open(path)
+
+
+def open_reference(reference):
+    """
+    Reference из пути (открывается один раз на процесс), словаря или Reference.
+
+    Returns:
+        Reference или None, если reference равен None.
+    """
+    if reference is None or isinstance(reference, Reference):
+        return reference
+    if isinstance(reference, str):
+        return _open_reference(reference)
+    return Reference(reference)
+
+
+def _is_sequence(allele):
+    return bool(allele) and not allele.strip('ACGTN')
+
+
+def normalize_allele(pos, ref, alt, fetch=None):
+    """
+    Нормализует один биаллельный вариант (алгоритм vt normalize).
+
+    Общие основания справа отрезаются; если аллель становится пустым, к
+    обоим аллелям слева добавляется основание референса (indel сдвигается
+    влево по повтору). Затем отрезаются общие основания слева, пока оба
+    аллеля длиннее одного основания. Символьные аллели (<DEL>, *, BND)
+    не изменяются.
+
+    Args:
+        pos (int): Позиция (1-based).
+        ref (str): Референсный аллель.
+        alt (str): Альтернативный аллель.
+        fetch (callable): fetch(start, end) -> основания контига [start, end)
+            (0-based); без него indel не сдвигаются, только обрезаются.
+
+    Returns:
+        tuple: (pos, ref, alt) после нормализации.
+    """
+    ref, alt = ref.upper(), alt.upper()
+    if ref == alt or not _is_sequence(ref) or not _is_sequence(alt):
+        return pos, ref, alt
+    left = ''
+    while ref[-1] == alt[-1]:
+        if len(ref) > 1 and len(alt) > 1:
+            ref, alt = ref[:-1], alt[:-1]
+            continue
+        # Один из аллелей стал бы пустым: нужно предыдущее основание референса
+        if fetch is None or pos <= 1:
+            break
+        if not left:
+            left = fetch(max(0, pos - 1 - _WINDOW), pos - 1)
+            if not left:
+                break
+        base, left = left[-1], left[:-1]
+        ref, alt = base + ref[:-1], base + alt[:-1]
+        pos -= 1
+    while len(ref) > 1 and len(alt) > 1 and ref[0] == alt[0]:
+        ref, alt = ref[1:], alt[1:]
+        pos += 1
+    return pos, ref, alt
+
+
+def split_multiallelic(batch):
+    """
+    Разбивает мультиаллельные записи: по одной строке на каждый ALT.
+
+    Остальные колонки повторяются без изменений (INFO и FORMAT с полями
+    Number=A/R не переписываются). Добавляется колонка ALT_INDEX — номер
+    аллеля в исходной записи (с 1).
+
+    Returns:
+        RecordBatch: Новый батч.
+    """
+    alleles = [alt.split(',') for alt in batch['ALT']]
+    counts = np.fromiter(map(len, alleles), dtype=np.int64, count=len(alleles))
+    if not len(alleles) or counts.max() == 1:
+        columns = dict(batch.columns)
+        columns['ALT_INDEX'] = np.ones(len(batch), dtype=np.int64)
+        return RecordBatch(columns)
+    rows = np.repeat(np.arange(len(alleles)), counts)
+    result = batch.select(rows)
+    result.columns['ALT'] = [alt for group in alleles for alt in group]
+    result.columns['ALT_INDEX'] = (np.arange(len(rows)) + 1
+                                   - np.repeat(np.cumsum(counts) - counts, counts))
+    return result
+
+
+def normalize_variants(batch, reference=None):
+    """
+    Разбивает мультиаллельные записи и нормализует аллели.
+
+    SNV (REF и ALT по одному основанию) не проверяются по отдельности —
+    они уже нормализованы; цикл на Python идёт только по остальным вариантам.
+
+    Args:
+        batch (RecordBatch): Батч VCF (колонки CHROM, POS, REF, ALT, ...).
+        reference: Reference, путь к .2bit/FASTA или словарь последовательностей;
+            без него indel только обрезаются, но не сдвигаются влево.
+
+    Returns:
+        RecordBatch: Варианты по одному ALT с нормализованными POS, REF, ALT
+            и колонкой ALT_INDEX.
+    """
+    reference = open_reference(reference)
+    batch = split_multiallelic(batch)
+    chroms = batch[batch.fields[0]]
+    positions = np.array(batch['POS'], dtype=np.int64)
+    refs = list(batch['REF'])
+    alts = list(batch['ALT'])
+    if not (''.join(refs) + ''.join(alts)).isupper():
+        refs = [ref.upper() for ref in refs]
+        alts = [alt.upper() for alt in alts]
+    ref_lengths = np.fromiter(map(len, refs), dtype=np.int64, count=len(refs))
+    alt_lengths = np.fromiter(map(len, alts), dtype=np.int64, count=len(alts))
+    for i in np.flatnonzero((ref_lengths != 1) | (alt_lengths != 1)).tolist():
+        fetch = None if reference is None else partial(reference.fetch, chroms[i])
+        positions[i], refs[i], alts[i] = normalize_allele(int(positions[i]), refs[i], alts[i],
+                                                          fetch)
+    columns = dict(batch.columns)
+    columns.update({'POS': positions, 'REF': refs, 'ALT': alts})
+    return RecordBatch(columns)
+
+
+def contig_codes(chroms, contigs=()):
+    """
+    24-битные номера контигов: индекс в contigs, для прочих — хэш имени.
+
+    Returns:
+        np.ndarray: uint64 коды.
+    """
+    names, inverse = np.unique(np.asarray(chroms, dtype=object).astype(str),
+                               return_inverse=True)
+    index = {name: i for i, name in enumerate(contigs)}
+    codes = np.array([index[name] if name in index
+                      else _UNKNOWN_CONTIG | (_hash64(name) & (_UNKNOWN_CONTIG - 1))
+                      for name in names.tolist()], dtype=np.uint64)
+    return codes[inverse.reshape(-1)]
+
+
+def allele_codes(refs, alts):
+    """
+    64-битные коды пар аллелей.
+
+    Аллели только из ACGT общей длиной до EXACT_BASES кодируются точно
+    (длины и по 2 бита на основание, старший бит 0) — так записаны почти
+    все SNV и короткие indel. Остальные получают старший бит 1 и 63 бита
+    хэша BLAKE2b от 'REF>ALT'.
+
+    Returns:
+        np.ndarray: uint64 коды.
+    """
+    count = len(refs)
+    ref_lengths = np.fromiter(map(len, refs), dtype=np.int64, count=count)
+    alt_lengths = np.fromiter(map(len, alts), dtype=np.int64, count=count)
+    codes = np.zeros(count, dtype=np.uint64)
+    if not count:
+        return codes
+    joined = ''.join((ref + alt)[:EXACT_BASES].ljust(EXACT_BASES, 'A')
+                     for ref, alt in zip(refs, alts))
+    matrix = _ALLELE_CODES[np.frombuffer(joined.encode('ascii', 'replace'), dtype=np.uint8)]
+    matrix = matrix.reshape(count, EXACT_BASES)
+    total = ref_lengths + alt_lengths
+    exact = (total <= EXACT_BASES) & np.all(matrix != 255, axis=1)
+    packed = np.bitwise_or.reduce(matrix[exact].astype(np.uint64) << _SHIFTS, axis=1)
+    codes[exact] = (packed | (ref_lengths[exact].astype(np.uint64) << np.uint64(57))
+                    | (alt_lengths[exact].astype(np.uint64) << np.uint64(52)))
+    for i in np.flatnonzero(~exact).tolist():
+        codes[i] = _HASHED | np.uint64(_hash64(refs[i] + '>' + alts[i]) >> 1)
+    return codes
+
+
+def variant_keys(chroms, positions, refs, alts, contigs=(), bits=128):
+    """
+    Ключи фиксированной ширины для вариантов (после normalize_variants).
+
+    128-битный ключ (KEY128_DTYPE) точен для вариантов с короткими
+    аллелями и сортируется в порядке (контиг, позиция). 64-битный ключ —
+    перемешанный хэш 128-битного, вероятность коллизии около n² / 2^65.
+
+    Args:
+        chroms (list): Имена контигов.
+        positions (np.ndarray): Позиции (1-based, меньше 2^40).
+        refs (list): Референсные аллели.
+        alts (list): Альтернативные аллели (по одному).
+        contigs (list): Порядок контигов (из референса или ##contig); должен
+            совпадать для всех сравниваемых файлов.
+        bits (int): 128 или 64.
+
+    Returns:
+        np.ndarray: KEY128_DTYPE или uint64.
+    """
+    if bits not in (64, 128):
+        raise ValueError("bits должен быть 64 или 128")
+    positions = np.asarray(positions, dtype=np.int64)
+    if len(positions) and (positions.min() < 0 or positions.max() >> POSITION_BITS):
+        raise ValueError(f"Позиции должны быть в диапазоне [0, 2^{POSITION_BITS})")
+    keys = np.zeros(len(positions), dtype=KEY128_DTYPE)
+    keys['hi'] = ((contig_codes(chroms, contigs) << np.uint64(POSITION_BITS))
+                  | positions.astype(np.uint64))
+    keys['lo'] = allele_codes(refs, alts)
+    if bits == 64:
+        return combine_keys(keys['hi'], keys['lo'])
+    return keys
+
+
+def _batch_keys(batch, contigs):
+    return variant_keys(batch[batch.fields[0]], batch['POS'], batch['REF'], batch['ALT'],
+                        contigs)
+
+
+def normalized_chunk(data, columns, reference=None, contigs=(), keys_only=False):
+    """
+    Разбор, нормализация и ключи для блока строк VCF (выполняется в рабочем процессе).
+
+    Returns:
+        RecordBatch с колонками ALT_INDEX и KEY (KEY128_DTYPE) или, при
+        keys_only, только массив ключей.
+    """
+    batch = normalize_variants(parse_vcf_chunk(data, columns), reference)
+    keys = _batch_keys(batch, contigs)
+    if keys_only:
+        return keys
+    batch.columns['KEY'] = keys
+    return batch
+
+
+def header_contigs(header_lines):
+    """Имена контигов из строк ##contig=<ID=...> заголовка VCF."""
+    names = []
+    for line in header_lines:
+        if line.startswith('##contig=<'):
+            for item in line.rstrip()[len('##contig=<'):-1].split(','):
+                if item.startswith('ID='):
+                    names.append(item[3:])
+    return names
+
+
+def iter_normalized(filename, reference=None, contigs=None, batch_bytes=DEFAULT_CHUNK_SIZE,
+                    workers=0, keys_only=False):
+    """
+    Нормализованные варианты VCF-файла батчами (см. Vcfreader.iter_normalized).
+
+    Args:
+        contigs (list): Порядок контигов для ключей; по умолчанию — из
+            референса, без него — из ##contig заголовка.
+        keys_only (bool): Возвращать только массивы ключей.
+
+    Yields:
+        RecordBatch (или массив KEY128_DTYPE) в порядке файла.
+    """
+    reader = Vcfreader(filename)
+    with open_binary(filename) as handle:
+        reader._read_batch_header(handle)
+        if contigs is None:
+            opened = open_reference(reference)
+            contigs = opened.names if opened is not None else header_contigs(reader.header_lines)
+        parse = partial(normalized_chunk, columns=tuple(reader.columns), reference=reference,
+                        contigs=tuple(contigs), keys_only=keys_only)
+        chunks = (chunk for _, chunk in iter_line_chunks(handle, batch_bytes))
+        for result in ordered_map(parse, chunks, workers):
+            yield result
+
+
+def join_keys(left, right):
+    """
+    Пары равных ключей двух массивов (слияние отсортированных ключей).
+
+    Args:
+        left (np.ndarray): Ключи KEY128_DTYPE или uint64.
+        right (np.ndarray): Ключи того же типа.
+
+    Returns:
+        tuple: (left_indices, right_indices) — все пары с равными ключами,
+               по возрастанию left_indices (повторы ключей дают все сочетания).
+    """
+    _, ids = np.unique(np.concatenate((left, right)), return_inverse=True)
+    ids = ids.reshape(-1)
+    left_ids, right_ids = ids[:len(left)], ids[len(left):]
+    order = np.argsort(right_ids, kind='stable')
+    sorted_right = right_ids[order]
+    low = np.searchsorted(sorted_right, left_ids, side='left')
+    counts = np.searchsorted(sorted_right, left_ids, side='right') - low
+    total = int(counts.sum())
+    left_indices = np.repeat(np.arange(len(left)), counts)
+    positions = (np.repeat(low, counts) + np.arange(total)
+                 - np.repeat(np.cumsum(counts) - counts, counts))
+    return left_indices, order[positions]
+
+
+class VariantSets:
+    """
+    Операции над множествами вариантов многих VCF по ключам с ограничением памяти.
+
+    Каждый файл читается батчами (можно в нескольких процессах), варианты
+    разбиваются по ALT, нормализуются и заменяются 128-битными ключами.
+    Ключи всех файлов собираются в KeyTable: при превышении memory_budget
+    записи раскладываются по файлам-разделам по хэшу ключа, и каждый
+    раздел обрабатывается отдельно сортировкой. Для каждого варианта
+    каждого файла вычисляется маска файлов, где он встречается (до 64
+    файлов), и флаги первого вхождения — вместо слияния строковых колонок
+    в pandas.
+
+    Номера вариантов — позиции в потоке нормализованных записей файла
+    (после разбиения мультиаллельных), как в Vcfreader.iter_normalized.
+
+    Пример:
+        >>> sets = VariantSets(["a.vcf.gz", "b.vcf.gz"], reference="hg38.2bit").build()
+        >>> sets.counts()
+        {'records': [...], 'union': ..., 'intersection': ..., 'difference': [...], ...}
+        >>> for source, batch in sets.iter_selected('intersection'):
+        ...     store(batch)
+    """
+
+    MAX_SOURCES = 64
+
+    def __init__(self, paths, reference=None, contigs=None, memory_budget=256 << 20,
+                 workers=0, tmp_dir=None, batch_bytes=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            paths (list): VCF-файлы (можно сжатые).
+            reference: Путь к .2bit/FASTA, Reference или словарь последовательностей.
+            contigs (list): Порядок контигов; по умолчанию из референса или
+                ##contig первого файла.
+            memory_budget (int): Предел памяти таблицы ключей в байтах.
+            workers (int): Число процессов для разбора; 0 — в текущем процессе.
+            tmp_dir (str): Каталог для разделов таблицы.
+            batch_bytes (int): Размер блока в байтах.
+        """
+        if not 0 < len(paths) <= self.MAX_SOURCES:
+            raise ValueError(f"Нужно от 1 до {self.MAX_SOURCES} файлов")
+        self.paths = list(paths)
+        self.reference = reference
+        self.contigs = contigs
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self.tmp_dir = tmp_dir
+        self.batch_bytes = batch_bytes
+        #: Для каждого файла — маска файлов (uint64), где встречается вариант
+        self.masks = None
+        #: Для каждого файла — флаги FIRST / FIRST_IN_SOURCE (uint8)
+        self.flags = None
+
+    def _contigs(self):
+        if self.contigs is None:
+            reference = open_reference(self.reference)
+            if reference is not None:
+                self.contigs = reference.names
+            else:
+                reader = Vcfreader(self.paths[0])
+                with open_binary(self.paths[0]) as handle:
+                    reader._read_batch_header(handle)
+                self.contigs = header_contigs(reader.header_lines)
+        return self.contigs
+
+    def _iter(self, path, keys_only):
+        return iter_normalized(path, self.reference, self._contigs(), self.batch_bytes,
+                               self.workers, keys_only)
+
+    def build(self):
+        """
+        Читает все файлы и вычисляет маски и флаги вариантов.
+
+        Returns:
+            VariantSets: self.
+        """
+        table = KeyTable(self.memory_budget, self.tmp_dir, dtype=SET_DTYPE)
+        sizes = []
+        try:
+            for source, path in enumerate(self.paths):
+                rows = 0
+                for keys in self._iter(path, keys_only=True):
+                    entries = np.zeros(len(keys), dtype=SET_DTYPE)
+                    entries['key'] = combine_keys(keys['hi'], keys['lo'])
+                    entries['hi'] = keys['hi']
+                    entries['lo'] = keys['lo']
+                    entries['source'] = source
+                    entries['row'] = np.arange(rows, rows + len(keys))
+                    table.add(entries)
+                    rows += len(keys)
+                sizes.append(rows)
+            self.masks = [np.zeros(size, dtype=np.uint64) for size in sizes]
+            self.flags = [np.zeros(size, dtype=np.uint8) for size in sizes]
+            for partition in table.partitions():
+                self._resolve(partition)
+        finally:
+            table.close()
+        return self
+
+    def _resolve(self, entries):
+        """Маски и флаги для одного раздела: сортировка по (ключ, файл, номер)."""
+        if not len(entries):
+            return
+        entries = entries[np.lexsort((entries['row'], entries['source'],
+                                      entries['lo'], entries['hi']))]
+        hi, lo, sources = entries['hi'], entries['lo'], entries['source']
+        new_key = np.ones(len(entries), dtype=bool)
+        new_key[1:] = (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+        new_source = new_key.copy()
+        new_source[1:] |= sources[1:] != sources[:-1]
+        starts = np.flatnonzero(new_key)
+        bits = np.uint64(1) << sources.astype(np.uint64)
+        masks = np.bitwise_or.reduceat(bits, starts)[np.cumsum(new_key) - 1]
+        flags = new_key * FIRST | new_source * FIRST_IN_SOURCE
+        for source in np.unique(sources).tolist():
+            selected = sources == source
+            rows = entries['row'][selected]
+            self.masks[source][rows] = masks[selected]
+            self.flags[source][rows] = flags[selected]
+
+    def select(self, operation, source=0):
+        """
+        Выбор вариантов для операции.
+
+        Args:
+            operation (str): 'union' — каждый вариант один раз (первое вхождение);
+                'intersection' — варианты, которые есть во всех файлах (один раз);
+                'difference' — варианты файла source, которых нет в других
+                (один раз); 'duplicates' — повторные вхождения внутри своего файла.
+            source (int): Номер файла для 'difference'.
+
+        Returns:
+            list: Для каждого файла булев массив по его нормализованным вариантам.
+        """
+        if self.masks is None:
+            self.build()
+        if operation not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция {operation}; допустимы {OPERATIONS}")
+        everything = np.uint64((1 << len(self.paths)) - 1)
+        selected = []
+        for index, (masks, flags) in enumerate(zip(self.masks, self.flags)):
+            if operation == 'union':
+                chosen = (flags & FIRST) != 0
+            elif operation == 'intersection':
+                chosen = ((flags & FIRST) != 0) & (masks == everything)
+            elif operation == 'difference':
+                only = np.uint64(1 << index)
+                chosen = ((flags & FIRST_IN_SOURCE) != 0) & (masks == only) & (index == source)
+            else:
+                chosen = (flags & FIRST_IN_SOURCE) == 0
+            selected.append(chosen)
+        return selected
+
+    def counts(self):
+        """
+        Сводка по множествам.
+
+        Returns:
+            dict: 'records' — число вариантов в файлах; 'union', 'intersection' —
+                размеры объединения и пересечения; 'difference' и 'duplicates' —
+                списки по файлам.
+        """
+        if self.masks is None:
+            self.build()
+        return {
+            'records': [len(masks) for masks in self.masks],
+            'union': int(sum(chosen.sum() for chosen in self.select('union'))),
+            'intersection': int(sum(chosen.sum() for chosen in self.select('intersection'))),
+            'difference': [int(self.select('difference', i)[i].sum())
+                           for i in range(len(self.paths))],
+            'duplicates': [int(chosen.sum()) for chosen in self.select('duplicates')],
+        }
+
+    def iter_selected(self, operation, source=0):
+        """
+        Выбранные нормализованные варианты, файл за файлом, в порядке файлов.
+
+        Файлы перечитываются батчами, поэтому в памяти остаются только маски.
+
+        Yields:
+            tuple: (номер файла, RecordBatch с колонками ALT_INDEX и KEY).
+        """
+        for index, (path, chosen) in enumerate(zip(self.paths, self.select(operation, source))):
+            if not chosen.any():
+                continue
+            start = 0
+            for batch in self._iter(path, keys_only=False):
+                rows = np.flatnonzero(chosen[start:start + len(batch)])
+                start += len(batch)
+                if len(rows):
+                    yield index, batch.select(rows)
@@ -1,6 +1,40 @@
-import pandas as pd
+from functools import partial
 
-class Vcfreader:
+from .protocol import BatchReader
+from .streams import DEFAULT_CHUNK_SIZE, open_text
+
+
+def parse_vcf_chunk(data, columns):
+    """
+    Разбирает блок строк данных VCF в колоночный батч.
+
+    Args:
+        data (bytes): Блок целых строк VCF (без заголовка).
+        columns (tuple): Имена колонок из строки '#CHROM'.
+
+    Returns:
+        RecordBatch: Колонки VCF; POS — int64, QUAL — float64 (NaN для '.'),
+                     остальные — списки строк.
+    """
+    import numpy as np
+    from .batch import RecordBatch
+
+    rows = [line.split('\t') for line in data.decode('utf-8').splitlines()
+            if line and line[0] != '#']
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    batch = {}
+    for name, column in zip(columns, values):
+        if name == 'POS':
+            batch[name] = np.array(list(map(int, column)), dtype=np.int64)
+        elif name == 'QUAL':
+            batch[name] = np.array([float(q) if q != '.' else np.nan for q in column],
+                                   dtype=np.float64)
+        else:
+            batch[name] = list(column)
+    return RecordBatch(batch)
+
+
+class Vcfreader(BatchReader):
     """
     Класс для чтения и фильтрации данных из VCF файла.
 
@@ -14,8 +48,14 @@ class Vcfreader:
         get_header(): Возвращает список строк заголовка VCF файла.
         filter_by_quality(min_qual): Фильтрует варианты по минимальному значению качества.
         variants_in_region(chrom, start, end): Возвращает варианты из указанного регионa.
+        variants_in_regions(regions): Варианты для множества регионов (BED) за один проход.
+        iter_batches(): Читает варианты колоночными батчами (RecordBatch) без pandas.
+        sort(output): Сортирует файл по координате во внешней памяти (без pandas).
+        iter_normalized(reference): Разбитые по ALT и нормализованные варианты с ключами.
     """
 
+    format_name = 'vcf'
+
     def __init__(self, filename):
         """
         Инициализирует объект с именем файла.
@@ -25,7 +65,9 @@ class Vcfreader:
         """
         self.filename = filename
         self.header_lines = []
+        self.columns = None
         self.df = None
+        self._intervals = None
 
     def read(self):
         """
@@ -35,7 +77,9 @@ class Vcfreader:
         и затем считывает данные вариаций после строки с колонками '#CHROM'.
         Преобразует 'POS' в int, 'QUAL' в числовой тип с заменой ошибок на NaN.
         """
-        with open(self.filename, 'r') as f:
+        import pandas as pd
+
+        with self.stats.stage('parse'), open_text(self.filename) as f:
             header = []
             for line in f:
                 if line.startswith('##'):
@@ -44,16 +88,80 @@ class Vcfreader:
                     columns = line.strip()[1:].split('\t')
                     break
             self.df = pd.read_csv(
-                self.filename,
+                f,
                 comment='#',
                 sep='\t',
                 names=columns,
                 dtype={columns[0]: str}
             )
             self.header_lines = header
+            self.columns = columns
 
             self.df['POS'] = self.df['POS'].astype(int)
             self.df['QUAL'] = pd.to_numeric(self.df['QUAL'], errors='coerce')
+        self.stats.add('records_parsed', len(self.df))
+
+    @property
+    def batch_fields(self):
+        return tuple(self.columns or ())
+
+    def _read_batch_header(self, handle):
+        """Читает заголовок VCF и оставляет handle на первой строке данных."""
+        header = []
+        for line in iter(handle.readline, b''):
+            line = line.decode('utf-8').strip()
+            if line.startswith('##'):
+                header.append(line)
+            elif line.startswith('#CHROM'):
+                self.columns = line[1:].split('\t')
+                break
+        self.header_lines = header
+
+    def _chunk_parser(self):
+        return partial(parse_vcf_chunk, columns=tuple(self.columns))
+
+    def sort(self, output, memory_budget=1 << 30, index=False, tmp_dir=None):
+        """
+        Сортирует VCF по координате, не загружая его в память.
+
+        Отсортированные блоки размером до трети memory_budget сбрасываются во
+        временные файлы и затем сливаются кучей. Порядок хромосом — как в
+        строках ##contig заголовка.
+
+        Args:
+            output (str): Путь к результату; '.gz' — BGZF.
+            memory_budget (int): Примерный предел памяти в байтах.
+            index (bool): Записать индекс tabix (output + '.tbi').
+            tmp_dir (str): Каталог временных файлов.
+
+        Returns:
+            str: output.
+        """
+        from .sorting import sort_file
+        return sort_file(self.filename, output, memory_budget, index=index, tmp_dir=tmp_dir)
+
+    def iter_normalized(self, reference=None, contigs=None, batch_bytes=DEFAULT_CHUNK_SIZE,
+                        workers=0):
+        """
+        Читает варианты батчами, разбивая мультиаллельные записи и нормализуя аллели.
+
+        Indel сдвигаются влево по референсу, у каждого варианта есть
+        128-битный ключ (колонка KEY), по которому варианты разных файлов
+        сравниваются без строковых колонок (см. formats.variants).
+
+        Args:
+            reference: Путь к .2bit/FASTA, Reference или словарь последовательностей;
+                без него аллели только обрезаются.
+            contigs (list): Порядок контигов для ключей; по умолчанию из
+                референса или строк ##contig.
+            batch_bytes (int): Размер блока в байтах.
+            workers (int): Число процессов; 0 — в текущем процессе.
+
+        Yields:
+            RecordBatch: Колонки VCF с нормализованными POS/REF/ALT, ALT_INDEX и KEY.
+        """
+        from .variants import iter_normalized
+        return iter_normalized(self.filename, reference, contigs, batch_bytes, workers)
 
     def get_header(self):
         """
@@ -74,7 +182,9 @@ class Vcfreader:
         Returns:
             pandas.DataFrame: Отфильтрованные варианты с QUAL >= min_qual.
         """
-        return self.df[self.df['QUAL'] >= min_qual]
+        filtered = self.df[self.df['QUAL'] >= min_qual]
+        self.stats.add('records_filtered', len(self.df) - len(filtered))
+        return filtered
 
     def variants_in_region(self, chrom, start, end):
         """
@@ -94,6 +204,45 @@ class Vcfreader:
             (self.df['POS'] <= end)
         ]
         return region_df
+
+    def variants_in_regions(self, regions):
+        """
+        Возвращает варианты, пересекающиеся с любым из множества регионов.
+
+        Варианты один раз сортируются по (хромосома, позиция) в IntervalIndex
+        (индекс кэшируется, пока не изменится df), затем все регионы
+        обрабатываются одним векторным поиском np.searchsorted вместо
+        полного просмотра таблицы на каждый регион. Вариант занимает
+        [POS - 1, POS - 1 + len(REF)) в координатах BED.
+
+        Args:
+            regions: Путь к BED-файлу, IntervalIndex или список кортежей
+                (chrom, start, end) в координатах BED (0-based, полуинтервалы).
+
+        Returns:
+            pandas.DataFrame: Варианты с колонкой REGION — номером региона; вариант,
+                попавший в несколько регионов, повторяется. Порядок — по регионам,
+                внутри региона — по позиции.
+        """
+        from .intervals import as_interval_index
+
+        regions = as_interval_index(regions)
+        region_ids, variant_ids = self._variant_index().overlaps(
+            regions.chroms, regions.starts, regions.ends)
+        result = self.df.iloc[variant_ids].copy()
+        result['REGION'] = region_ids
+        return result
+
+    def _variant_index(self):
+        """IntervalIndex по вариантам df, строится один раз для текущей таблицы."""
+        from .intervals import IntervalIndex
+
+        if self._intervals is None or self._intervals[0] is not self.df:
+            starts = self.df['POS'].to_numpy() - 1
+            index = IntervalIndex(self.df[self.df.columns[0]].astype(str).tolist(), starts,
+                                  starts + self.df['REF'].str.len().to_numpy())
+            self._intervals = (self.df, index)
+        return self._intervals[1]
     
 
 '''ДЕМОНСТРАЦИЯ'''
@@ -0,0 +1,75 @@
+"""
+Tests for CIGAR-aware coverage engine.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.coverage import CoverageEngine, cigar_blocks, reference_blocks
+
+SAM_CONTENT = "\n".join([
+    "@HD\tVN:1.6",
+    "@SQ\tSN:chr1\tLN:30",
+    "r1\t0\tchr1\t1\t60\t10M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII",
+    "r2\t16\tchr1\t5\t60\t2S4M2D4M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII",
+    "r3\t1024\tchr1\t1\t60\t10M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII",
+    "r4\t0\tchr1\t1\t5\t10M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII",
+    "r5\t4\t*\t0\t0\t*\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII",
+]) + "\n"
+
+
+def create_test_sam(content: str) -> str:
+    """Создает временный SAM файл для тестов."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.sam', delete=False) as f:
+        f.write(content)
+        return f.name
+
+
+def test_reference_blocks():
+    """Клипы не сдвигают блоки, делеция разрывает блок."""
+    starts, ends = reference_blocks('2S4M2D4M')
+    assert list(starts) == [0, 6]
+    assert list(ends) == [4, 10]
+    starts, ends, bounds = cigar_blocks(['2S4M2D4M', '5H', '3M1N2M'])
+    assert list(bounds) == [0, 2, 2, 4]
+    assert list(starts) == [0, 6, 0, 4] and list(ends) == [4, 10, 3, 6]
+
+
+def test_depth_with_filters():
+    """Глубина учитывает маску флагов и порог MAPQ."""
+    test_file = create_test_sam(SAM_CONTENT)
+    try:
+        engine = CoverageEngine(test_file, min_mapq=20).compute()
+        depth = engine.depth('chr1')
+        assert len(depth) == 30
+        assert list(depth[:16]) == [1, 1, 1, 1, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1, 0, 0]
+
+        starts, ends, means = engine.binned('chr1', 10)
+        assert list(ends) == [10, 20, 30]
+        assert abs(means[0] - 1.4) < 1e-9
+    finally:
+        os.unlink(test_file)
+
+
+def test_depth_without_sq_and_mixed_cigars():
+    """Без @SQ глубина кончается на последнем блоке; разные CIGAR в одном пакете."""
+    lines = [f"r{i}\t0\tchrU\t{i + 1}\t60\t{i % 3 + 1}M1D{i % 2 + 1}M\t*\t0\t0\tAAA\tIII"
+             for i in range(40)]
+    test_file = create_test_sam("\n".join(lines) + "\n")
+    try:
+        engine = CoverageEngine(test_file, batch_size=7).compute()
+        depth = engine.depth('chrU')
+        expected = [0] * 50
+        for i in range(40):
+            first, second = i % 3 + 1, i % 2 + 1
+            for position in list(range(i, i + first)) + list(range(i + first + 1,
+                                                                   i + first + 1 + second)):
+                expected[position] += 1
+        last = max(i + i % 3 + 2 + i % 2 + 1 for i in range(40))
+        assert depth.tolist() == expected[:last]
+        assert engine.chromosomes() == ['chrU']
+    finally:
+        os.unlink(test_file)
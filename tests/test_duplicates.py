@@ -0,0 +1,154 @@
+"""
+Tests for duplicate detection in SAM and FASTQ.
+"""
+
+import gzip
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.duplicates import DuplicateMarker, FastqDeduplicator
+from formats.fastaq import FastqReader
+from formats.sam import Samreader
+
+SEQ = 'ACGT' * 5
+HIGH = 'I' * 20
+LOW = '5' * 20
+
+SAM = ("@HD\tVN:1.6\n@SQ\tSN:chr1\tLN:10000\n"
+       # Прямая цепь: одинаковая неклипированная 5'-позиция 100 (5S + POS 105)
+       f"a1\t99\tchr1\t100\t60\t20M\t=\t300\t220\t{SEQ}\t{LOW}\n"
+       f"a2\t99\tchr1\t105\t60\t5S15M\t=\t300\t215\t{SEQ}\t{HIGH}\n"
+       # Та же позиция, но другой мат — не дубликат
+       f"a3\t99\tchr1\t100\t60\t20M\t=\t500\t420\t{SEQ}\t{HIGH}\n"
+       # Обратная цепь: 5'-конец справа (100 + 20 - 1), совпадает у b1 и b2
+       f"b1\t16\tchr1\t100\t60\t20M\t*\t0\t0\t{SEQ}\t{HIGH}\n"
+       f"b2\t1040\tchr1\t100\t60\t18M2S\t*\t0\t0\t{SEQ}\t{LOW}\n"
+       # Прямая цепь с той же POS — другой 5'-конец
+       f"b3\t0\tchr1\t100\t60\t20M\t*\t0\t0\t{SEQ}\t{HIGH}\n"
+       # Невыровненные и вторичные не участвуют
+       f"u1\t4\t*\t0\t0\t*\t*\t0\t0\t{SEQ}\t{HIGH}\n"
+       f"u2\t4\t*\t0\t0\t*\t*\t0\t0\t{SEQ}\t{HIGH}\n"
+       f"s1\t256\tchr1\t100\t0\t20M\t*\t0\t0\t{SEQ}\t{HIGH}\n")
+
+EXPECTED = {'a1', 'b2'}
+
+
+def create_file(content: str, suffix: str) -> str:
+    """Создает временный файл с содержимым."""
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, 'w') as f:
+        f.write(content)
+    return path
+
+
+def read_flags(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        return {line.split('\t')[0]: int(line.split('\t')[1]) for line in f if line[0] != '@'}
+
+
+def test_mark_duplicates():
+    """Дубликаты получают 0x400, у остальных флаг снимается."""
+    path = create_file(SAM, '.sam')
+    output = path + '.markdup.sam.gz'
+    try:
+        assert Samreader(path).mark_duplicates(output) == len(EXPECTED)
+        flags = read_flags(output)
+        assert {name for name, flag in flags.items() if flag & 0x400} == EXPECTED
+        assert flags['a2'] == 99 and flags['a1'] == 99 | 0x400
+        Samreader(path).mark_duplicates(output, remove=True)
+        assert set(read_flags(output)) == set(read_flags(path)) - EXPECTED
+    finally:
+        for p in (path, output):
+            if os.path.exists(p):
+                os.unlink(p)
+
+
+def test_pairs_are_marked_together():
+    """Пара оценивается суммой качеств обоих ридов и помечается целиком; 5'-конец мата — из MC."""
+    middle = '?' * 20
+    sam = ("@SQ\tSN:chr1\tLN:10000\n"
+           # У A лучше первый рид, у B — второй, но сумма у A больше
+           f"A\t99\tchr1\t100\t60\t20M\t=\t300\t220\t{SEQ}\t{HIGH}\tMC:Z:20M\n"
+           f"A\t147\tchr1\t300\t60\t20M\t=\t100\t-220\t{SEQ}\t{middle}\tMC:Z:20M\n"
+           # Первый рид B клипирован: POS 103, но неклипированный 5'-конец тот же, 100
+           f"B\t99\tchr1\t103\t60\t3S17M\t=\t300\t220\t{SEQ}\t{LOW}\tMC:Z:20M\n"
+           f"B\t147\tchr1\t300\t60\t20M\t=\t103\t-220\t{SEQ}\t{HIGH}\tMC:Z:3S17M\n")
+    path = create_file(sam, '.sam')
+    try:
+        marker = DuplicateMarker(path)
+        assert marker.find() is not None and marker.duplicate_count == 2
+        output = path + '.markdup.sam'
+        marker.write(output)
+        with open(output) as f:
+            flags = [(line.split('\t')[0], int(line.split('\t')[1]))
+                     for line in f if line[0] != '@']
+        os.unlink(output)
+        assert flags == [('A', 99), ('A', 147), ('B', 99 | 0x400), ('B', 147 | 0x400)]
+    finally:
+        os.unlink(path)
+
+
+def test_partitioned_mode_matches_in_memory():
+    """Разбиение таблицы ключей на диске дает тот же результат, что и в памяти."""
+    rng = random.Random(4)
+    lines = ["@SQ\tSN:chr1\tLN:100000\n"]
+    for i in range(5000):
+        flag = rng.choice((0, 16, 99, 147))
+        quality = ''.join(rng.choice('#5?I') for _ in range(20))
+        lines.append(f"r{i}\t{flag}\tchr1\t{rng.randint(1, 300)}\t60\t20M\t=\t"
+                     f"{rng.randint(1, 50)}\t0\t{SEQ}\t{quality}\n")
+    path = create_file(''.join(lines), '.sam')
+    try:
+        in_memory = DuplicateMarker(path).find()
+        marker = DuplicateMarker(path, memory_budget=4096, batch_bytes=16384)
+        assert (marker.find() == in_memory).all()
+        assert 0 < marker.duplicate_count < 5000
+    finally:
+        os.unlink(path)
+
+
+def test_contigs_without_sq_lines():
+    """Контиги без @SQ не смешиваются между собой и совпадают между блоками."""
+    rng = random.Random(7)
+    lines = []
+    for i in range(2000):
+        chrom, mate = rng.choice(('chrA', 'chrB')), rng.choice(('=', 'chrA', 'chrB'))
+        quality = ''.join(rng.choice('#5?I') for _ in range(20))
+        lines.append(f"r{i}\t{rng.choice((0, 16, 97, 145))}\t{chrom}\t{rng.randint(1, 200)}\t60\t"
+                     f"20M\t{mate}\t{rng.randint(1, 20)}\t0\t{SEQ}\t{quality}\n")
+    header = "@SQ\tSN:chrA\tLN:1000\n@SQ\tSN:chrB\tLN:1000\n"
+    listed = create_file(header + ''.join(lines), '.sam')
+    headerless = create_file(''.join(lines), '.sam')
+    try:
+        expected = DuplicateMarker(listed).find()
+        marker = DuplicateMarker(headerless, batch_bytes=4096)
+        assert (marker.find() == expected).all()
+        assert 0 < marker.duplicate_count < 2000
+    finally:
+        os.unlink(listed)
+        os.unlink(headerless)
+
+
+def test_fastq_prefix_duplicates():
+    """Риды с одинаковым префиксом удаляются, остается лучший по качеству."""
+    reads = [('r1', SEQ + 'AAAA', LOW + '5555'),
+             ('r2', SEQ + 'CCCC', HIGH + 'IIII'),
+             ('r3', 'T' * 24, HIGH + 'IIII'),
+             ('r4', SEQ[:10], LOW[:10])]
+    path = create_file(''.join(f"@{n}\n{s}\n+\n{q}\n" for n, s, q in reads), '.fastq')
+    output = path + '.dedup.fastq.gz'
+    try:
+        assert FastqReader(path).remove_duplicates(output, prefix_length=20) == 1
+        with gzip.open(output, 'rt') as f:
+            names = [line[1:].strip() for i, line in enumerate(f) if i % 4 == 0]
+        assert names == ['r2', 'r3', 'r4']
+        assert FastqDeduplicator(path, prefix_length=24).find().any() == 0
+    finally:
+        for p in (path, output):
+            if os.path.exists(p):
+                os.unlink(p)
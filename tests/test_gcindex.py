@@ -0,0 +1,57 @@
+"""
+Tests for prefix-sum GC index.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.gcindex import GCIndex
+
+SEQUENCE = "GGCCAATTNNacgtGCGCATAT" * 5
+
+
+def create_test_fasta(content: str) -> str:
+    """Создает временный FASTA файл для тестов."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.fasta', delete=False) as f:
+        f.write(content)
+        return f.name
+
+
+def test_window_counts():
+    """Подсчет GC, N и soft-masked в окнах через префиксные суммы."""
+    test_file = create_test_fasta(">chr1\n" + SEQUENCE[:50] + "\n" + SEQUENCE[50:] + "\n")
+    try:
+        index = GCIndex.build(test_file, resolution=10)
+        region = SEQUENCE[10:110]
+        counts = index.counts('chr1', 10, 110)
+        assert counts['gc'] == sum(base in 'GCgc' for base in region)
+        assert counts['n'] == region.count('N')
+        assert counts['masked'] == sum(base.islower() for base in region)
+
+        windows = index.windows('chr1', 20)
+        assert list(windows['end']) == [20, 40, 60, 80, 100, 110]
+        assert windows['n'].sum() == SEQUENCE.count('N')
+
+        reopened = GCIndex.open(test_file, resolution=10)
+        assert reopened.counts('chr1') == index.counts('chr1')
+    finally:
+        os.unlink(test_file)
+        os.unlink(GCIndex.sidecar_path(test_file))
+
+
+def test_unaligned_window_rejected():
+    """Границы окна должны быть кратны разрешению индекса."""
+    test_file = create_test_fasta(">chr1\n" + SEQUENCE + "\n")
+    try:
+        index = GCIndex.build(test_file, resolution=10)
+        try:
+            index.counts('chr1', 5, 20)
+            assert False, "Невыровненное окно должно вызывать ValueError"
+        except ValueError:
+            pass
+    finally:
+        os.unlink(test_file)
+        os.unlink(GCIndex.sidecar_path(test_file))
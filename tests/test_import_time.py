@@ -0,0 +1,48 @@
+"""
+Import-time benchmark: readers must import fast and without heavy backends.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src')
+
+READER_MODULES = ('formats', 'formats.fasta', 'formats.fastaq', 'formats.sam', 'formats.vcf')
+HEAVY_MODULES = ('matplotlib', 'pandas', 'numpy')
+
+# Запас для медленных CI-машин; типичное время импорта — единицы миллисекунд
+MAX_IMPORT_SECONDS = 0.2
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed,
+                   'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    """Импортирует модуль в чистом интерпретаторе и возвращает время и тяжелые зависимости."""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        env=env, stderr=subprocess.STDOUT,
+    )
+    lines = output.decode().strip().splitlines()
+    result = json.loads(lines[-1])
+    result['extra_output'] = lines[:-1]
+    return result
+
+
+def test_reader_imports_are_light():
+    """Импорт читателей не тянет matplotlib/pandas/numpy и не печатает ничего."""
+    for module in READER_MODULES:
+        result = measure_import(module)
+        assert result['loaded'] == [], f"{module} импортирует {result['loaded']}"
+        assert result['extra_output'] == [], f"{module} печатает при импорте"
+        assert result['elapsed'] < MAX_IMPORT_SECONDS, \
+            f"{module} импортируется {result['elapsed']:.3f} с"
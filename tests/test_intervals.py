@@ -0,0 +1,93 @@
+"""
+Tests for batch interval queries over VCF, SAM and FASTA.
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.fasta import FastaProcessor
+from formats.intervals import IntervalIndex, read_bed
+from formats.sam import Samreader
+from formats.vcf import Vcfreader
+
+
+def create_file(content: str, suffix: str) -> str:
+    """Создает временный файл с содержимым."""
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, 'w') as f:
+        f.write(content)
+    return path
+
+
+def brute_force(queries, targets):
+    """Все пересекающиеся пары (запрос, интервал) полным перебором."""
+    return sorted((i, j) for i, (chrom, start, end) in enumerate(queries)
+                  for j, (t_chrom, t_start, t_end) in enumerate(targets)
+                  if chrom == t_chrom and t_start < max(end, start + 1)
+                  and max(t_end, t_start + 1) > start)
+
+
+def test_interval_index_matches_brute_force():
+    """Пакетный поиск совпадает с перебором, включая длинные и нулевые интервалы."""
+    rng = random.Random(1)
+    targets = [(rng.choice(('chr1', 'chr2')), start, start + rng.choice((0, 1, 7, 120, 5000)))
+               for start in (rng.randint(0, 20000) for _ in range(2000))]
+    queries = [(rng.choice(('chr1', 'chr2', 'chrX')), start, start + rng.choice((0, 1, 50, 900)))
+               for start in (rng.randint(0, 20000) for _ in range(1000))]
+    index = IntervalIndex(*zip(*targets))
+    query_ids, target_ids = index.overlaps(*zip(*queries))
+    assert sorted(zip(query_ids.tolist(), target_ids.tolist())) == brute_force(queries, targets)
+    assert list(query_ids) == sorted(query_ids)
+
+
+def test_vcf_regions_from_bed():
+    """Варианты для регионов из BED совпадают с поочередными запросами."""
+    rng = random.Random(2)
+    lines = ["##fileformat=VCFv4.2\n", "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"]
+    for i in range(500):
+        lines.append(f"{rng.choice(('1', '2'))}\t{rng.randint(1, 10000)}\tv{i}\t"
+                     f"{rng.choice(('A', 'ACG'))}\tT\t50\tPASS\t.\n")
+    vcf = create_file(''.join(lines), '.vcf')
+    regions = [(rng.choice(('1', '2')), start, start + 300)
+               for start in (rng.randint(0, 10000) for _ in range(40))]
+    bed = create_file("track name=test\n" + ''.join(f"{c}\t{s}\t{e}\tr{i}\n"
+                                                   for i, (c, s, e) in enumerate(regions)), '.bed')
+    try:
+        assert len(read_bed(bed)) == 40 and read_bed(bed)['NAME'][0] == 'r0'
+        reader = Vcfreader(vcf)
+        reader.read()
+        result = reader.variants_in_regions(bed)
+        for i, (chrom, start, end) in enumerate(regions):
+            # Регион BED [start, end) против пересечения с REF
+            expected = reader.df[(reader.df['CHROM'] == chrom) &
+                                 (reader.df['POS'] - 1 < end) &
+                                 (reader.df['POS'] - 1 + reader.df['REF'].str.len() > start)]
+            assert sorted(result[result['REGION'] == i]['ID']) == sorted(expected['ID'])
+    finally:
+        os.unlink(vcf)
+        os.unlink(bed)
+
+
+def test_sam_and_fasta_regions():
+    """Выравнивания по регионам учитывают длину по CIGAR; FASTA режется по регионам."""
+    sam = create_file("@SQ\tSN:chr1\tLN:1000\n@SQ\tSN:chr2\tLN:1000\n"
+                      "a\t0\tchr1\t100\t60\t10M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII\n"
+                      "b\t0\tchr1\t100\t60\t5M500N5M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII\n"
+                      "c\t4\tchr1\t300\t0\t*\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII\n"
+                      "d\t16\tchr2\t50\t60\t10M\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII\n", '.sam')
+    fasta = create_file(">chr1 description\nACGTACGTAC\nGGGGG\n>chr2\nTTTTAAAA\n", '.fa')
+    regions = [('chr1', 300, 400), ('chr1', 95, 100), ('chr2', 0, 1000)]
+    try:
+        hits = [(region, level['QNAME'])
+                for region, level in Samreader(sam).alignments_in_regions(regions)]
+        assert sorted(hits) == [(0, 'b'), (1, 'a'), (1, 'b'), (2, 'd')]
+        extracted = FastaProcessor(fasta).extract_regions(
+            [('chr1', 8, 12), ('chr2', 6, 20), ('chr3', 0, 5)])
+        assert extracted == [('chr1:9-12', 'ACGG'), ('chr2:7-20', 'AA'), ('chr3:1-5', '')]
+    finally:
+        os.unlink(sam)
+        os.unlink(fasta)
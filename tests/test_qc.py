@@ -0,0 +1,112 @@
+"""
+Tests for QC aggregates and report rendering.
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.fastaq import FastqReader
+from formats import qc as qc_module
+from formats.qc import QCAggregates, position_rows, render_reports, row_starts
+
+
+def create_fastq(records, seed=1):
+    rng = random.Random(seed)
+    reads = []
+    for i in range(records):
+        sequence = ''.join(rng.choice('ACGTN') for _ in range(rng.randint(5, 30)))
+        quality = ''.join(chr(33 + rng.randint(2, 40)) for _ in sequence)
+        reads.append((sequence, quality))
+    handle, path = tempfile.mkstemp(suffix='.fastq')
+    with os.fdopen(handle, 'w') as f:
+        f.write(''.join(f"@r{i}\n{s}\n+\n{q}\n" for i, (s, q) in enumerate(reads)))
+    return path, reads
+
+
+def test_aggregates_match_direct_counts():
+    """Гистограммы блоков, сложенные вместе, совпадают с прямым подсчетом."""
+    path, reads = create_fastq(500)
+    try:
+        qc = QCAggregates.from_file(path, batch_bytes=2000)
+        assert qc.reads == 500
+        assert qc.total_bases == sum(len(s) for s, _ in reads)
+        assert qc.lengths[17] == sum(len(s) == 17 for s, _ in reads)
+        position = [ord(q[3]) - 33 for s, q in reads if len(s) > 3]
+        assert qc.quality[3].sum() == len(position)
+        assert qc.quality_quantiles((0.5,))[0][3] == int(np.percentile(position, 50,
+                                                                       method='inverted_cdf'))
+        assert qc.mean_quality()[3] == pytest.approx(np.mean(position))
+        assert qc.bases[0, 4] == sum(s[0] == 'N' for s, _ in reads)
+        gc = [round(100 * (s.count('G') + s.count('C')) / len(s)) for s, _ in reads]
+        assert qc.gc.tolist() == np.bincount(gc, minlength=101).tolist()
+    finally:
+        os.unlink(path)
+
+
+def test_long_reads_are_binned_while_aggregating(monkeypatch):
+    """Позиции длинных ридов группируются в окна уже в блоке, merge совпадает с одним блоком."""
+    rng = random.Random(7)
+    reads = []
+    for length in (0, 3, 300, 5000, 50000, 49999):
+        reads.append((''.join(rng.choice('ACGT') for _ in range(length)),
+                      ''.join(chr(33 + rng.randint(2, 40)) for _ in range(length))))
+    chunks = [''.join(f"@r\n{s}\n+\n{q}\n" for s, q in reads[i:i + 2]).encode()
+              for i in range(0, len(reads), 2)]
+    whole = QCAggregates.from_chunk(b''.join(chunks))
+    assert len(whole.quality) < 1000 and whole.quality.sum() == whole.total_bases
+    merged = QCAggregates()
+    for chunk in chunks:
+        merged.merge(QCAggregates.from_chunk(chunk))
+    assert merged.quality.tolist() == whole.quality.tolist()
+    assert merged.bases.tolist() == whole.bases.tolist()
+    assert merged.lengths.tolist() == whole.lengths.tolist() and merged.reads == 6
+
+    expected = np.zeros_like(whole.quality)
+    for sequence, quality in reads:
+        np.add.at(expected, (position_rows(np.arange(len(quality))),
+                             np.frombuffer(quality.encode(), dtype=np.uint8) - 33), 1)
+    assert whole.quality.tolist() == expected.tolist()
+    assert position_rows(row_starts(len(whole.quality))).tolist() == \
+        list(range(len(whole.quality)))
+    bins = whole.position_bins()
+    assert len(bins) <= 101 and bins[0] == 0 and bins[-1] == len(whole.quality)
+    assert QCAggregates.from_chunk(b"@r\n\n+\n\n").reads == 1
+    monkeypatch.setattr(qc_module, '_SLICE_BASES', 1000)
+    sliced = QCAggregates.from_chunk(b''.join(chunks))
+    assert sliced.quality.tolist() == whole.quality.tolist()
+    assert sliced.bases.tolist() == whole.bases.tolist() and sliced.gc.tolist() == whole.gc.tolist()
+
+
+def test_reports_single_figure_html_and_batch():
+    """Отчет строится одной фигурой/HTML, пакетно — по сохраненным агрегатам."""
+    pytest.importorskip('matplotlib')
+    paths = [create_fastq(200, seed)[0] for seed in range(3)]
+    outputs = []
+    try:
+        html = paths[0] + '.html'
+        outputs.append(html)
+        qc = FastqReader(paths[0]).qc_report(html)
+        with open(html, encoding='utf-8') as f:
+            page = f.read()
+        assert 'data:image/png;base64,' in page and '<td>200</td>' in page
+        saved = paths[1] + '.npz'
+        qc.save(saved)
+        outputs.append(saved)
+        assert QCAggregates.load(saved).quality.tolist() == qc.quality.tolist()
+        jobs = [(saved, paths[1] + '.png', 'saved'), (paths[2], paths[2] + '.png')]
+        outputs.extend(job[1] for job in jobs)
+        assert render_reports(jobs, workers=2) == [job[1] for job in jobs]
+        for job in jobs:
+            with open(job[1], 'rb') as f:
+                assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+    finally:
+        for p in paths + outputs:
+            if os.path.exists(p):
+                os.unlink(p)
@@ -0,0 +1,147 @@
+"""
+Tests for format registry and common batch protocol.
+"""
+
+import bz2
+import gzip
+import io
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+import formats
+from formats.batch import RecordBatch
+from formats.streams import fasta_boundary, fastq_boundary, iter_record_chunks, line_boundary
+
+CONTENTS = {
+    'fasta': ">seq1 first\nACGT\nACGT\n>seq2\nGGCC\n",
+    'fastq': "@read1\nACGT\n+\nIIII\n@read2\nGGCC\n+\n####\n",
+    'sam': "@HD\tVN:1.6\n@SQ\tSN:chr1\tLN:100\n"
+           "r1\t0\tchr1\t5\t60\t4M\t*\t0\t0\tACGT\tIIII\n",
+    'vcf': "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+           "chr1\t10\trs1\tA\tG\t50\tPASS\tDP=10\n",
+}
+OPENERS = {'.txt': open, '.gz': gzip.open, '.bz2': bz2.open}
+
+
+def create_file(content: str, suffix: str) -> str:
+    """Создает временный файл, сжатый в соответствии с суффиксом."""
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    os.close(handle)
+    with OPENERS[suffix](path, 'wt') as f:
+        f.write(content)
+    return path
+
+
+def test_sniff_format_and_compression():
+    """Формат и сжатие определяются по содержимому, а не по расширению."""
+    for name, content in CONTENTS.items():
+        for suffix in OPENERS:
+            path = create_file(content, suffix)
+            try:
+                assert formats.sniff_format(path) == name
+                reader = formats.open(path)
+                assert reader.format_name == name
+            finally:
+                os.unlink(path)
+
+
+def test_batches_have_declared_fields():
+    """Все читатели отдают RecordBatch с объявленными колонками."""
+    expected_counts = {'fasta': 2, 'fastq': 2, 'sam': 1, 'vcf': 1}
+    for name, content in CONTENTS.items():
+        path = create_file(content, '.gz')
+        try:
+            reader = formats.open(path)
+            batch = RecordBatch.concat(reader.iter_batches(batch_bytes=16))
+            assert len(batch) == expected_counts[name]
+            assert batch.fields == list(reader.batch_fields)
+        finally:
+            os.unlink(path)
+    path = create_file(CONTENTS['fasta'], '.txt')
+    try:
+        batch = RecordBatch.concat(formats.open(path).iter_batches())
+        assert batch['SEQUENCE'] == ['ACGTACGT', 'GGCC']
+    finally:
+        os.unlink(path)
+
+
+def test_record_chunks_longer_than_chunk_size():
+    """Записи длиннее блока собираются целиком, границы те же, что при одном поиске."""
+    rng = random.Random(7)
+    for _ in range(300):
+        data = bytes(rng.choice(b'ACGT\n>') for _ in range(rng.randint(0, 200)))
+        chunk_size = rng.randint(1, 30)
+        for boundary in (line_boundary, fasta_boundary, fastq_boundary):
+            chunks = list(iter_record_chunks(io.BytesIO(data), chunk_size, boundary))
+            assert b''.join(chunk for _, chunk in chunks) == data
+            assert [offset for offset, _ in chunks] == \
+                [sum(len(chunk) for _, chunk in chunks[:i]) for i in range(len(chunks))]
+            for _, chunk in chunks[:-1]:
+                assert boundary(chunk) == len(chunk) or boundary(chunk + b'>') == len(chunk)
+    chunks = list(iter_record_chunks(io.BytesIO(b'>a\n' + b'ACGT' * 50 + b'\n>b\nA\n'), 8,
+                                     fasta_boundary))
+    assert [len(chunk) for _, chunk in chunks] == [204, 5]
+
+
+def test_async_batches_match_sync():
+    """aiter_batches отдает те же батчи, что и iter_batches."""
+    import asyncio
+
+    async def collect(reader):
+        return [batch async for batch in reader.aiter_batches(batch_bytes=16, prefetch=1)]
+
+    for name, content in CONTENTS.items():
+        path = create_file(content, '.gz')
+        try:
+            reader = formats.open(path)
+            expected = list(RecordBatch.concat(reader.iter_batches(batch_bytes=16)).records())
+            batches = asyncio.run(collect(reader))
+            assert list(RecordBatch.concat(batches).records()) == expected
+        finally:
+            os.unlink(path)
+
+
+def test_async_batches_stop_early():
+    """Выход из async for и отмена ждут текущего чтения и закрывают генератор."""
+    import asyncio
+    import time
+
+    path = create_file(CONTENTS['fastq'] * 20, '.txt')
+    closed = []
+
+    def slow_batches(batch_bytes, workers=0):
+        try:
+            for batch in formats.open(path).iter_batches(batch_bytes):
+                time.sleep(0.02)
+                yield batch
+        finally:
+            closed.append(True)
+
+    async def first(reader):
+        async for batch in reader.aiter_batches(batch_bytes=4, prefetch=1):
+            return batch
+
+    async def cancelled(reader):
+        async def consume():
+            async for _ in reader.aiter_batches(batch_bytes=4, prefetch=1):
+                await asyncio.sleep(0)
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+
+    try:
+        reader = formats.open(path)
+        reader.iter_batches = slow_batches
+        assert len(asyncio.run(first(reader))) == 1
+        assert asyncio.run(cancelled(reader))
+        assert closed == [True, True]
+    finally:
+        os.unlink(path)
@@ -0,0 +1,149 @@
+"""
+Tests for SAM module.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.sam import Samreader
+
+SAM_CONTENT = "\n".join([
+    "@HD\tVN:1.6\tSO:coordinate",
+    "@SQ\tSN:chr1\tLN:1000",
+    "@SQ\tSN:chr2\tLN:500",
+    "r1\t99\tchr1\t100\t60\t10M\t=\t200\t110\tACGTACGTAC\tIIIIIIIIII",
+    "r2\t147\tchr1\t200\t60\t10M\t=\t100\t-110\tACGTACGTAC\tIIIIIIIIII",
+    "r3\t0\tchr2\t5\t30\t10M\tchr1\t50\t0\tACGTACGTAC\tIIIIIIIIII",
+    "r4\t4\t*\t0\t0\t*\t*\t0\t0\tACGTACGTAC\tIIIIIIIIII",
+]) + "\n"
+
+
+def create_test_sam(content: str) -> str:
+    """Создает временный SAM файл для тестов."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.sam', delete=False) as f:
+        f.write(content)
+        return f.name
+
+
+class TestSamreader:
+    """Тесты для Samreader."""
+
+    def test_header_model(self):
+        """Таблица @SQ: имена, id и длины."""
+        test_file = create_test_sam(SAM_CONTENT)
+        try:
+            reader = Samreader(test_file)
+            levels = list(reader.read())
+            header = reader.sam_header
+            assert header.reference_names == ['chr1', 'chr2']
+            assert header.ref_length('chr2') == 500
+            assert header.records['HD'][0]['SO'] == 'coordinate'
+            assert len(reader.getheader()['SQ']) == 2
+            assert len(levels) == 4
+        finally:
+            os.unlink(test_file)
+
+    def test_interned_reference_ids(self):
+        """RNAME/RNEXT переводятся в id, '=' совпадает с RNAME."""
+        test_file = create_test_sam(SAM_CONTENT)
+        try:
+            reader = Samreader(test_file)
+            levels = list(reader.read())
+            assert [lvl['RID'] for lvl in levels] == [0, 0, 1, -1]
+            assert [lvl['MRID'] for lvl in levels] == [0, 0, 0, -1]
+            assert levels[0]['RNAME'] is levels[1]['RNAME']
+            assert reader.countlevelsperchrom() == {'chr1': 2, 'chr2': 1, '*': 1}
+        finally:
+            os.unlink(test_file)
+
+
+def test_read_batches_matches_read():
+    """Параллельное чтение батчами дает те же записи в том же порядке."""
+    test_file = create_test_sam(SAM_CONTENT)
+    try:
+        expected = list(Samreader(test_file).read())
+        for workers in (0, 2):
+            batches = list(Samreader(test_file).read_batches(workers=workers, batch_bytes=64))
+            assert len(batches) > 1
+            records = [record for batch in batches for record in batch.records()]
+            assert records == expected
+    finally:
+        os.unlink(test_file)
+
+
+def test_batches_decode_utf8():
+    """UTF-8 в @CO и в тегах Z читается батчами так же, как read()."""
+    content = SAM_CONTENT.replace("@SQ\tSN:chr2", "@CO\tпробный\n@SQ\tSN:chr2")
+    content = content.replace("IIIIIIIIII\n", "IIIIIIIIII\tRG:Z:é\tCB:Z:клетка\tUB:Z:ü\n")
+    test_file = create_test_sam(content)
+    try:
+        reader = Samreader(test_file)
+        expected = list(reader.read())
+        for workers in (0, 2):
+            batched = Samreader(test_file)
+            batches = list(batched.iter_batches(workers=workers, batch_bytes=64))
+            assert [record for batch in batches for record in batch.records()] == expected
+            assert batched.sam_header.lines['CO'] == ['@CO\tпробный']
+        counts = reader.count_barcodes(exclude_flags=0)
+        assert counts['BARCODE'] == ['клетка'] and counts['READS'].tolist() == [4]
+    finally:
+        os.unlink(test_file)
+
+
+def test_repeated_batch_passes_keep_header():
+    """Повторные проходы батчами не дублируют строки заголовка и id референсов."""
+    test_file = create_test_sam(SAM_CONTENT)
+    try:
+        reader = Samreader(test_file)
+        for _ in range(3):
+            batches = list(reader.iter_batches(batch_bytes=64))
+            assert sum(len(batch) for batch in batches) == 4
+        list(reader.alignments_in_regions([('chr1', 0, 1000)]))
+        assert len(reader.header['SQ']) == 2 and len(reader.header['HD']) == 1
+        assert reader.sam_header.reference_names == ['chr1', 'chr2']
+    finally:
+        os.unlink(test_file)
+
+
+def test_regions_without_sq_lines():
+    """Выравнивания на контигах без @SQ (и в файле без заголовка) находятся по регионам."""
+    regions = [('chr1', 0, 150), ('chrX', 0, 10), ('chr2', 0, 10)]
+    headerless = "".join(line + "\n" for line in SAM_CONTENT.splitlines()
+                         if not line.startswith('@'))
+    unlisted = SAM_CONTENT.replace("@SQ\tSN:chr2\tLN:500\n", "").replace("chr2", "chrX")
+    for content, expected in ((headerless, [(0, 'r1'), (2, 'r3')]),
+                              (unlisted, [(0, 'r1'), (1, 'r3')])):
+        test_file = create_test_sam(content)
+        try:
+            hits = Samreader(test_file).alignments_in_regions(regions)
+            assert [(region, level['QNAME']) for region, level in hits] == expected
+        finally:
+            os.unlink(test_file)
+
+
+def test_batches_intern_contigs_without_sq():
+    """Контиги без @SQ получают в батчах те же RID/MRID, что и в read()."""
+    content = SAM_CONTENT + "\n".join([
+        "r5\t65\tchrY\t7\t60\t10M\tchrZ\t9\t0\tACGTACGTAC\tIIIIIIIIII",
+        "r6\t129\tchrZ\t9\t60\t10M\tchrY\t7\t0\tACGTACGTAC\tIIIIIIIIII",
+        "r7\t0\tchrY\t70\t60\t10M\t=\t70\t0\tACGTACGTAC\tIIIIIIIIII",
+    ]) + "\n"
+    headerless = "".join(line + "\n" for line in content.splitlines()
+                         if not line.startswith('@'))
+    for text in (content, headerless):
+        test_file = create_test_sam(text)
+        try:
+            reader = Samreader(test_file)
+            expected = list(reader.read())
+            for workers in (0, 2):
+                batched = Samreader(test_file)
+                for _ in range(2):
+                    batches = list(batched.read_batches(workers=workers, batch_bytes=64))
+                    assert [record for batch in batches
+                            for record in batch.records()] == expected
+                assert batched.sam_header.reference_names == reader.sam_header.reference_names
+        finally:
+            os.unlink(test_file)
@@ -0,0 +1,136 @@
+"""
+Tests for selective SAM tag decoding and barcode grouping.
+"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.barcodes import BarcodeCounter, hash_strings
+from formats.batch import RecordBatch
+from formats.sam import MISSING_INT, Samreader, parse_tag_specs
+
+SAM = ("@SQ\tSN:chr1\tLN:1000\n"
+       "r1\t99\tchr1\t10\t60\t4M\t=\t50\t44\tACGT\tIIII\tNM:i:1\tCB:Z:AAAC-1\tZF:f:0.5\tZB:B:s,1,-2\n"
+       "r2\t147\tchr1\t50\t60\t4M\t=\t10\t-44\tACGT\tIIII\tAS:i:30\tNM:i:0\n"
+       "r3\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\tIIII\n")
+
+
+def create_file(content: str) -> str:
+    """Создает временный SAM файл с содержимым."""
+    handle, path = tempfile.mkstemp(suffix='.sam')
+    with os.fdopen(handle, 'w') as f:
+        f.write(content)
+    return path
+
+
+def test_selected_tags_are_typed_columns():
+    """Декодируются только запрошенные теги, остальные остаются в TAGS."""
+    path = create_file(SAM)
+    try:
+        reader = Samreader(path, tags=('NM', 'CB', 'ZF:f', 'ZB:B'))
+        batch = RecordBatch.concat(reader.iter_batches())
+        assert batch['NM'].dtype.kind == 'i' and batch['NM'].tolist() == [1, 0, MISSING_INT]
+        assert batch['CB'] == ['AAAC-1', None, None]
+        assert batch['ZF'][0] == 0.5 and math.isnan(batch['ZF'][1])
+        assert batch['ZB'][0].dtype.name == 'int16' and batch['ZB'][0].tolist() == [1, -2]
+        assert 'AS' not in batch and batch['TAGS'][1] == 'AS:i:30\tNM:i:0'
+        assert batch['RNEXT'] == ['=', '=', '*'] and batch['TLEN'].tolist() == [44, -44, 0]
+        levels = list(Samreader(path, tags=('NM', 'CB')).read())
+        assert levels[0]['NM'] == 1 and levels[1]['CB'] is None and levels[0]['TLEN'] == 44
+        with pytest.raises(ValueError):
+            parse_tag_specs(['ZZ'])
+        # XS — не стандартный тег: у разных выравнивателей он i или A
+        with pytest.raises(ValueError):
+            parse_tag_specs(['XS'])
+        assert parse_tag_specs(['XS:A']) == (('XS', 'A'),)
+        with pytest.raises(ValueError):
+            RecordBatch.concat(Samreader(path, tags=('NM:Z',)).iter_batches())
+    finally:
+        os.unlink(path)
+
+
+def test_barcode_compaction_threshold_grows(monkeypatch):
+    """Когда уникальных пар много, свёртка не повторяется на каждом блоке."""
+    lines = ["@SQ\tSN:chr1\tLN:100000\n"]
+    lines += [f"r{i}\t0\tchr1\t{i + 1}\t60\t4M\t*\t0\t0\tACGT\tIIII\tCB:Z:C{i % 5}\tUB:Z:U{i}\n"
+              for i in range(3000)]
+    path = create_file(''.join(lines))
+    compactions = []
+    compact = BarcodeCounter._compact
+
+    def counting(parts):
+        compactions.append(sum(len(part[2]) for part in parts))
+        return compact(parts)
+
+    monkeypatch.setattr(BarcodeCounter, 'COMPACT_PAIRS', 100)
+    monkeypatch.setattr(BarcodeCounter, '_compact', staticmethod(counting))
+    try:
+        result = BarcodeCounter(path, batch_bytes=2000).count()
+        assert result['UMIS'].tolist() == [600] * 5 and result['READS'].sum() == 3000
+        # Каждая свёртка хотя бы вдвое больше предыдущей (последняя — итоговая)
+        assert all(b >= 2 * a for a, b in zip(compactions, compactions[1:-1]))
+        assert len(compactions) < 10
+    finally:
+        os.unlink(path)
+
+
+def test_count_barcodes_matches_brute_force():
+    """Число ридов и уникальных UMI по клеткам совпадает с подсчетом словарями."""
+    rng = random.Random(3)
+    cells = [''.join(rng.choice('ACGT') for _ in range(16)) + '-1' for _ in range(30)]
+    lines = ["@SQ\tSN:chr1\tLN:100000\n"]
+    expected = {}
+    for i in range(4000):
+        cell = rng.choice(cells)
+        umi = ''.join(rng.choice('ACGT') for _ in range(rng.choice((3, 10))))
+        flag = rng.choice((0, 16, 256))
+        tags = [f"CB:Z:{cell}", f"UB:Z:{umi}", "NM:i:0"]
+        rng.shuffle(tags)
+        if i % 97 == 0:
+            tags = tags[1:] if tags[0].startswith('NM') else tags[:1]
+        lines.append(f"r{i}\t{flag}\tchr1\t{i + 1}\t60\t4M\t*\t0\t0\tACGT\tIIII\t"
+                     + '\t'.join(tags) + '\n')
+        present = dict(tag.split(':Z:') for tag in tags if ':Z:' in tag)
+        if flag != 256 and 'CB' in present and 'UB' in present:
+            reads, umis = expected.setdefault(present['CB'], (0, set()))
+            umis.add(present['UB'])
+            expected[present['CB']] = (reads + 1, umis)
+    path = create_file(''.join(lines))
+    try:
+        for workers in (0, 2):
+            result = Samreader(path).count_barcodes(workers=workers)
+            got = {b: (r, u) for b, r, u in zip(result['BARCODE'], result['READS'].tolist(),
+                                                result['UMIS'].tolist())}
+            assert got == {cell: (reads, len(umis)) for cell, (reads, umis) in expected.items()}
+            assert result['READS'].tolist() == sorted(result['READS'].tolist(), reverse=True)
+    finally:
+        os.unlink(path)
+
+
+def test_umi_hashes_do_not_depend_on_chunk():
+    """UMI разной длины в разных блоках хэшируется одинаково, уникальные UMI не завышаются."""
+    assert hash_strings(['AC'])[0] == hash_strings(['AC', 'ACGTAA'])[0]
+    assert hash_strings(['бв'])[0] == hash_strings(['ACGTAAAA', 'бв'])[1]
+    rng = random.Random(8)
+    lines = ["@SQ\tSN:chr1\tLN:100000\n"]
+    expected = {}
+    for i in range(3000):
+        cell = f"C{i % 3}"
+        umi = ''.join(rng.choice('ACGT') for _ in range(rng.randint(1, 6)))
+        expected.setdefault(cell, set()).add(umi)
+        lines.append(f"r{i}\t0\tchr1\t{i + 1}\t60\t4M\t*\t0\t0\tACGT\tIIII"
+                     f"\tCB:Z:{cell}\tUB:Z:{umi}\n")
+    path = create_file(''.join(lines))
+    try:
+        result = BarcodeCounter(path, batch_bytes=3000).count()
+        got = dict(zip(result['BARCODE'], result['UMIS'].tolist()))
+        assert got == {cell: len(umis) for cell, umis in expected.items()}
+    finally:
+        os.unlink(path)
@@ -0,0 +1,111 @@
+"""
+Tests for the deduplicated FASTA sequence database.
+"""
+
+import os
+import pickle
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats import seqdb
+from formats.fasta import FastaProcessor
+from formats.parallel import ordered_map
+from formats.seqdb import SequenceDB
+
+
+def create_fasta(records):
+    handle, path = tempfile.mkstemp(suffix='.fasta')
+    with os.fdopen(handle, 'w') as f:
+        f.write(''.join(f">{header}\n{sequence}\n" for header, sequence in records))
+    return path
+
+
+def amplicons(count, seed=3):
+    rng = random.Random(seed)
+    pool = [''.join(rng.choice('ACGT') for _ in range(rng.randint(0, 40))) for _ in range(15)]
+    return [(f"amp_{rng.randint(0, count // 2)}", rng.choice(pool)) for _ in range(count)]
+
+
+def lookup(db, header):
+    return db.get(header), len(db.headers_for(db.get(header, '')))
+
+
+def test_deduplicated_lookups_match_records():
+    """Повторы хранятся один раз, поиск по заголовку и по последовательности точен."""
+    records = amplicons(300)
+    path = create_fasta(records)
+    try:
+        db = FastaProcessor(path).sequence_db()
+        assert list(db.records()) == records
+        assert db.sequence_count == len(set(s for _, s in records))
+        assert db.header_count == len(set(h for h, _ in records))
+        stats = db.get_statistics()
+        assert stats['arena_bytes'] == sum(len(s) for s in set(s for _, s in records))
+        assert stats['sequence_bytes'] == sum(len(s) for _, s in records)
+        first = {}
+        for header, sequence in records:
+            first.setdefault(header, sequence)
+        for header, sequence in first.items():
+            assert db[header] == sequence
+        for sequence in set(s for _, s in records):
+            assert db.headers_for(sequence) == [h for h, s in records if s == sequence]
+        assert 'missing' not in db and db.get('missing') is None
+        assert db.find_sequence('ACGTNNNN') is None and db.headers_for('ACGTNNNN') == []
+    finally:
+        os.unlink(path)
+
+
+def test_hash_collisions_are_resolved(monkeypatch):
+    """При совпадении хэшей строки различаются сравнением байтов."""
+    monkeypatch.setattr(seqdb, '_hash', lambda data: 5)
+    records = [('a', 'AC'), ('b', 'GT'), ('c', 'AC'), ('d', '')]
+    db = SequenceDB.build(records)
+    assert db.sequence_count == 3
+    assert [db[h] for h, _ in records] == [s for _, s in records]
+    assert db.headers_for('AC') == ['a', 'c'] and db.headers_for('') == ['d']
+
+
+def test_batches_share_ids_and_table(monkeypatch):
+    """Строки из разных пакетов получают общие номера, таблица растет и остается корректной."""
+    records = amplicons(400, seed=5)
+    expected = SequenceDB.build(records)
+    monkeypatch.setattr(seqdb._Interner, 'BATCH_STRINGS', 7)
+    db = SequenceDB.build(records)
+    assert list(db.records()) == records
+    # Слоты хэш-таблицы зависят от порядка вставки, остальные массивы — нет
+    for name in set(seqdb.ARRAYS) - {'sequence_table', 'header_table'}:
+        assert db._arrays[name].tolist() == expected._arrays[name].tolist(), name
+    for sequence in set(s for _, s in records):
+        assert db.headers_for(sequence) == [h for h, s in records if s == sequence]
+    monkeypatch.setattr(seqdb, '_hash', lambda data: len(data) % 3)
+    collided = SequenceDB.build(records)
+    assert list(collided.records()) == records
+    assert collided.sequence_count == expected.sequence_count
+
+
+def test_mapped_file_shared_with_workers():
+    """Сохраненная база открывается через mmap и передается процессам по пути."""
+    records = amplicons(200, seed=4)
+    handle, path = tempfile.mkstemp(suffix='.sdb')
+    os.close(handle)
+    try:
+        SequenceDB.build(records).save(path)
+        with SequenceDB.open(path) as db:
+            assert list(db.records()) == records
+            assert len(pickle.dumps(db)) < 200
+            headers = sorted(set(h for h, _ in records))
+            expected = [lookup(db, h) for h in headers]
+            items = [(db, h) for h in headers]
+            assert list(ordered_map(_lookup_item, items, workers=2)) == expected
+        empty = SequenceDB.build([])
+        empty.save(path)
+        assert len(SequenceDB.open(path)) == 0 and SequenceDB.open(path).get('x') is None
+    finally:
+        os.unlink(path)
+
+
+def _lookup_item(item):
+    return lookup(*item)
@@ -0,0 +1,115 @@
+"""
+Tests for passing record batches between processes through shared memory.
+"""
+
+import gc
+import os
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.batch import RecordBatch
+from formats.sam import Samreader
+from formats.sharedmem import TextColumn, share_batch, shared_map
+
+SHM_DIR = '/dev/shm'
+
+
+def create_sam(records):
+    lines = ["@SQ\tSN:chr1\tLN:100000\n"]
+    for i in range(records):
+        tags = f"\tNM:i:{i % 3}\tCB:Z:cell{i % 7}" if i % 5 else ""
+        lines.append(f"r{i}\t{0 if i % 4 else 16}\tchr1\t{i + 1}\t{i % 61}\t4M\t*\t0\t0"
+                     f"\tACGT\tIIII{tags}\n")
+    handle, path = tempfile.mkstemp(suffix='.sam')
+    with os.fdopen(handle, 'w') as f:
+        f.write(''.join(lines))
+    return path
+
+
+def segments():
+    """Имена сегментов разделяемой памяти текущей системы."""
+    gc.collect()
+    return {name for name in os.listdir(SHM_DIR) if name.startswith('psm_')}
+
+
+def columns(batch):
+    return {name: column.tolist() if isinstance(column, np.ndarray) else column
+            for name, column in batch.columns.items()}
+
+
+def keep_high_quality(batch):
+    return batch.select(batch['MAPQ'] >= 30), len(batch)
+
+
+def test_batch_round_trip_without_copy():
+    """Числовые колонки читаются из сегмента на месте, текст и объекты восстанавливаются."""
+    batch = RecordBatch({
+        'POS': np.arange(5, dtype=np.int64),
+        'AF': np.linspace(0, 1, 10).reshape(5, 2),
+        'NAME': ['a', 'бв', '', None, 'e'],
+        'ARRAYS': [np.array([1, 2], dtype=np.int16), None, None, None, None],
+    })
+    shared = share_batch(batch)
+    assert len(pickle.dumps(shared)) < 1000
+    received = pickle.loads(pickle.dumps(shared)).attach()
+    assert columns(received)['POS'] == list(range(5))
+    assert received['AF'].tolist() == batch['AF'].tolist()
+    assert received['NAME'] == batch['NAME']
+    assert received['ARRAYS'][0].tolist() == [1, 2] and received['ARRAYS'][1] is None
+    assert not received['POS'].flags.writeable
+    positions = received['POS']
+    del received
+    # Массив переживает пакет: отображение закрывается только после него
+    assert positions.sum() == 10
+    empty = share_batch(RecordBatch({}))
+    assert len(empty.attach()) == 0
+
+
+def test_text_columns_are_lazy_views():
+    """Текст не декодируется при attach; выборка и повторная передача идут без декодирования."""
+    names = ['a', 'бв', '', None, 'e', 'длинная строка']
+    batch = RecordBatch({'NAME': names, 'N': np.arange(6)})
+    received = share_batch(batch).attach()
+    column = received['NAME']
+    assert isinstance(column, TextColumn) and column.data.base is not None
+    assert len(column) == 6 and column[1] == 'бв' and column[3] is None and column[-1] == names[-1]
+    assert column == names and list(column) == names and column.tolist() == names
+    assert column[1:4] == names[1:4] and column[::-2] == names[::-2]
+    with pytest.raises(IndexError):
+        column[6]
+    selected = received.select(np.array([5, 3, 1]))
+    assert isinstance(selected['NAME'], TextColumn) and selected['NAME'] == [names[5], None, 'бв']
+    assert pickle.loads(pickle.dumps(selected['NAME'])) == [names[5], None, 'бв']
+    # Повторная передача выборки копирует байты, а не строки
+    again = share_batch(selected).attach()
+    assert again['NAME'] == [names[5], None, 'бв'] and again['N'].tolist() == [5, 3, 1]
+    assert RecordBatch.concat([received, again])['NAME'] == names + [names[5], None, 'бв']
+
+
+@pytest.mark.skipif(not os.path.isdir(SHM_DIR), reason="нужен /dev/shm")
+def test_parallel_reader_and_pipeline_stage():
+    """Пакеты из процессов и следующая стадия совпадают с обычным разбором, сегменты удаляются."""
+    path = create_sam(3000)
+    before = segments()
+    try:
+        reader = Samreader(path, tags=('NM', 'CB'))
+        expected = [columns(b) for b in reader.iter_batches(batch_bytes=20000)]
+        shared = list(reader.iter_batches(batch_bytes=20000, workers=2, shared_memory=True))
+        assert [columns(b) for b in shared] == expected and len(expected) > 3
+        stage = list(shared_map(keep_high_quality, shared, workers=2))
+        assert [n for _, n in stage] == [len(b) for b in shared]
+        assert [columns(kept) for kept, _ in stage] == \
+            [columns(b.select(b['MAPQ'] >= 30)) for b in shared]
+        del shared, stage
+        for batch in reader.iter_batches(batch_bytes=20000, workers=2, shared_memory=True):
+            break
+        del batch
+        assert segments() == before
+    finally:
+        os.unlink(path)
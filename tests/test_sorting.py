@@ -0,0 +1,166 @@
+"""
+Tests for external sort, BGZF and tabix indexes.
+"""
+
+import gzip
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.bgzf import BgzfReader, BgzfWriter
+from formats.sam import Samreader
+from formats.sorting import ExternalSorter
+from formats.tabix import TabixIndex, default_span, iter_region_lines
+from formats.vcf import Vcfreader
+
+CHROMS = ['chr2', 'chr1', 'chrM']
+
+
+def create_test_sam(records: int = 3000) -> str:
+    """Создает временный неотсортированный SAM файл с повторяющимися позициями."""
+    rng = random.Random(1)
+    handle, path = tempfile.mkstemp(suffix='.sam')
+    with os.fdopen(handle, 'w') as f:
+        f.write("@HD\tVN:1.6\tSO:unsorted\n")
+        for chrom in CHROMS:
+            f.write(f"@SQ\tSN:{chrom}\tLN:1000000\n")
+        for i in range(records):
+            seq = 'ACGT' * 25
+            if rng.random() < 0.05:
+                f.write(f"r{i}\t4\t*\t0\t0\t*\t*\t0\t0\t{seq}\t{'I' * 100}\n")
+                continue
+            cigar = rng.choice(('100M', '50M500N50M', '10S90M'))
+            pos = rng.randint(1, 200) * 1000
+            f.write(f"r{i}\t0\t{rng.choice(CHROMS)}\t{pos}\t60\t{cigar}\t*\t0\t0\t"
+                    f"{seq}\t{'I' * 100}\n")
+    return path
+
+
+def create_test_vcf(records: int = 2000) -> str:
+    """Создает временный неотсортированный VCF файл."""
+    rng = random.Random(2)
+    handle, path = tempfile.mkstemp(suffix='.vcf')
+    with os.fdopen(handle, 'w') as f:
+        f.write("##fileformat=VCFv4.2\n")
+        for chrom in CHROMS:
+            f.write(f"##contig=<ID={chrom},length=1000000>\n")
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for i in range(records):
+            ref = rng.choice(('A', 'AC', 'ACGTACGT'))
+            f.write(f"{rng.choice(CHROMS)}\t{rng.randint(1, 900000)}\tv{i}\t{ref}\tT\t50\tPASS\t"
+                    f"DP={'9' * rng.randint(1, 60)}\n")
+    return path
+
+
+def body_lines(lines, prefix):
+    return [line for line in lines if not line.startswith(prefix)]
+
+
+def expected_sam_order(path):
+    """Стабильная сортировка в памяти для сравнения."""
+    with open(path) as f:
+        records = body_lines(f, '@')
+
+    def key(line):
+        fields = line.split('\t')
+        if fields[2] == '*':
+            return (len(CHROMS), 0)
+        return (CHROMS.index(fields[2]), int(fields[3]))
+    return sorted(records, key=key)
+
+
+def test_external_sort_matches_in_memory_sort():
+    """Много прогонов и несколько проходов слияния дают стабильную сортировку."""
+    path = create_test_sam()
+    output = path + '.sorted.sam'
+    try:
+        sorter = ExternalSorter(path, memory_budget=200000, max_open_runs=3)
+        sorter.sort(output)
+        assert sorter.run_count > 3
+        with open(output) as f:
+            lines = f.readlines()
+        assert lines[0] == "@HD\tVN:1.6\tSO:coordinate\n"
+        assert body_lines(lines, '@') == expected_sam_order(path)
+    finally:
+        for p in (path, output):
+            if os.path.exists(p):
+                os.unlink(p)
+
+
+def test_external_sort_stays_within_memory_budget():
+    """Пик памяти (tracemalloc) не превышает бюджет при многих прогонах и проходах слияния."""
+    path = create_test_sam(20000)
+    output = path + '.sorted.sam'
+    budget = 1 << 20
+    try:
+        assert os.path.getsize(path) > 4 * budget
+        np.zeros(1)
+        tracemalloc.start()
+        try:
+            sorter = ExternalSorter(path, memory_budget=budget)
+            sorter.sort(output)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert sorter.run_count > sorter._fan_in
+        assert peak < budget
+        with open(output) as f:
+            assert body_lines(f, '@') == expected_sam_order(path)
+    finally:
+        for p in (path, output):
+            if os.path.exists(p):
+                os.unlink(p)
+
+
+def test_sorted_bgzf_with_index_answers_region_queries():
+    """BGZF + .tbi: запросы по регионам совпадают с полным перебором."""
+    for create, preset, reader_class in ((create_test_vcf, 'vcf', Vcfreader),
+                                         (create_test_sam, 'sam', Samreader)):
+        path = create()
+        output = path + '.sorted.gz'
+        try:
+            reader_class(path).sort(output, memory_budget=150000, index=True)
+            with gzip.open(output, 'rt') as f:
+                records = [line.encode() for line in body_lines(f, '#@'[preset == 'sam'])]
+            index = TabixIndex.load(output + '.tbi')
+            span = default_span(preset)
+            spans = [span(line) for line in records]
+            rng = random.Random(3)
+            for _ in range(50):
+                chrom = rng.choice(CHROMS + ['chrX'])
+                begin = rng.randint(0, 1000000)
+                end = begin + rng.randint(1, 100000)
+                expected = [line for line, (name, b, e) in zip(records, spans)
+                            if name == chrom and b < end and e > begin]
+                assert list(iter_region_lines(output, index, chrom, begin, end, span)) == expected
+        finally:
+            for p in (path, output, output + '.tbi'):
+                if os.path.exists(p):
+                    os.unlink(p)
+
+
+def test_bgzf_virtual_offsets():
+    """Виртуальные смещения писателя ведут читателя к тем же строкам."""
+    handle, path = tempfile.mkstemp(suffix='.gz')
+    os.close(handle)
+    try:
+        lines = [f"line {i} {'x' * (i % 300)}\n".encode() for i in range(3000)]
+        offsets = []
+        with BgzfWriter(path) as out:
+            for line in lines:
+                offsets.append(out.tell())
+                out.write(line)
+        with gzip.open(path, 'rb') as f:
+            assert f.read() == b''.join(lines)
+        with BgzfReader(path) as reader:
+            for i in (0, 1, 500, 2999):
+                reader.seek(offsets[i])
+                assert reader.readline() == lines[i]
+    finally:
+        os.unlink(path)
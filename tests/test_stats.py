@@ -0,0 +1,91 @@
+"""
+Tests for reader instrumentation.
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+import formats
+from formats.stats import NULL_STATS, ReaderStats
+
+SAM = ("@HD\tVN:1.6\n@SQ\tSN:chr1\tLN:100\n"
+       "r1\t0\tchr1\t5\t60\t4M\t*\t0\t0\tACGT\tIIII\n"
+       "r2\t4\t*\t0\t0\t*\t*\t0\t0\tGGCC\tIIII\n"
+       "r3\t16\tchr1\t9\t60\t4M\t*\t0\t0\tTTAA\tIIII\n")
+
+
+def create_test_sam(compressed: bool = False) -> str:
+    """Создает временный SAM файл (опционально gzip)."""
+    handle, path = tempfile.mkstemp(suffix='.sam.gz' if compressed else '.sam')
+    os.close(handle)
+    with (gzip.open if compressed else open)(path, 'wt') as f:
+        f.write(SAM)
+    return path
+
+
+def test_batch_counters_and_stage_times():
+    """Батчевое чтение считает байты, записи и время стадий read/parse."""
+    path = create_test_sam(compressed=True)
+    try:
+        seen = []
+        stats = ReaderStats(name='sam', callback=lambda stage, seconds, s: seen.append(stage))
+        reader = formats.open(path)
+        reader.stats = stats
+        batches = list(reader.iter_batches())
+
+        counters = stats.snapshot()['counters']
+        assert counters['records_parsed'] == 3
+        assert counters['batches'] == len(batches)
+        assert counters['bytes_read'] == os.path.getsize(path)
+        body = len(SAM) - SAM.index('\nr1\t') - 1
+        assert counters['bytes_decompressed'] == body
+        assert set(stats.timers) == {'read', 'parse'}
+        assert 'parse' in seen and 'read' in seen
+    finally:
+        os.unlink(path)
+
+
+def test_filter_counters():
+    """Фильтры считают отброшенные записи."""
+    path = create_test_sam()
+    try:
+        reader = formats.open(path)
+        reader.stats = ReaderStats()
+        list(reader.read())
+        mapped = list(reader.filterlevels(0x10))
+        assert len(mapped) == 1
+        assert reader.stats.counters['records_parsed'] == 3
+        assert reader.stats.counters['records_filtered'] == 2
+    finally:
+        os.unlink(path)
+
+
+def test_prometheus_output():
+    """Экспорт в текстовом формате Prometheus."""
+    stats = ReaderStats(name='fastq')
+    stats.add('records_parsed', 10)
+    stats.add_time('parse', 0.5)
+    text = stats.to_prometheus()
+    assert '# TYPE formats_records_parsed_total counter' in text
+    assert 'formats_records_parsed_total{reader="fastq"} 10' in text
+    assert 'formats_stage_seconds_total{reader="fastq",stage="parse"} 0.500000' in text
+    assert stats.snapshot()['rates']['records_parsed_per_second'] == 20
+    stats.reset()
+    assert stats.to_prometheus() == '\n'
+
+
+def test_disabled_by_default():
+    """Без явно заданного ReaderStats инструментирование ничего не собирает."""
+    path = create_test_sam()
+    try:
+        reader = formats.open(path)
+        assert reader.stats is NULL_STATS
+        list(reader.iter_batches())
+        list(reader.read())
+        assert NULL_STATS.snapshot() == {'counters': {}, 'timers': {}, 'rates': {}}
+    finally:
+        os.unlink(path)
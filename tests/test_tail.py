@@ -0,0 +1,85 @@
+"""
+Tests for incremental reading of growing FASTQ and SAM files.
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.fastaq import FastqReader
+from formats.sam import Samreader
+from formats.stats import ReaderStats
+from formats.streams import fastq_boundary
+from formats.tail import TailCursor
+
+HEADER = "@HD\tVN:1.6\n@SQ\tSN:chr1\tLN:1000\n"
+
+
+def alignment(name, pos):
+    return f"{name}\t0\tchr1\t{pos}\t60\t4M\t*\t0\t0\tACGT\tIIII\n"
+
+
+def append(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+
+def test_fastq_statistics_follow_growing_file():
+    """Статистика обновляется только по новым целым записям."""
+    handle, path = tempfile.mkstemp(suffix='.fastq')
+    os.close(handle)
+    try:
+        reader = FastqReader(path)
+        reader.stats = ReaderStats()
+        assert reader.update_statistics() == (0, 0)
+        append(path, "@r1\nACGT\n+\nIIII\n@r2\nAC")
+        assert reader.update_statistics() == (1, 4)
+        append(path, "GTA\n+\nIIIII\n@r3\nAA\n+\nII\n")
+        assert reader.update_statistics() == (3, 11)
+        assert reader.get_sequence_count() == 3 and reader.get_average_length() == 11 / 3
+        # Разобраны только новые данные: каждая запись — ровно один раз
+        assert reader.stats.counters['records_parsed'] == 3
+        with open(path, 'w') as f:
+            f.write("@x\nA\n+\nI\n")
+        assert reader.update_statistics() == (1, 1)
+    finally:
+        os.unlink(path)
+
+
+def test_sam_read_new_resumes_after_last_line():
+    """read_new возвращает только дописанные выравнивания, неполная строка ждет."""
+    handle, path = tempfile.mkstemp(suffix='.sam')
+    os.close(handle)
+    try:
+        reader = Samreader(path)
+        append(path, HEADER + alignment('a', 1) + alignment('b', 2)[:10])
+        assert [lvl['QNAME'] for lvl in reader.read_new()] == ['a']
+        assert reader.sam_header.reference_names == ['chr1']
+        assert list(reader.read_new()) == []
+        append(path, alignment('b', 2)[10:] + alignment('c', 3))
+        assert [lvl['QNAME'] for lvl in reader.read_new()] == ['b', 'c']
+        assert [lvl['POS'] for lvl in reader.levels] == [1, 2, 3]
+    finally:
+        os.unlink(path)
+
+
+def test_cursor_on_growing_gzip():
+    """Незавершенный gzip-поток читается до последней целой записи."""
+    handle, path = tempfile.mkstemp(suffix='.fastq.gz')
+    os.close(handle)
+    try:
+        records = [f"@r{i}\nACGTACGT\n+\nIIIIIIII\n".encode() for i in range(2000)]
+        compressed = gzip.compress(b''.join(records))
+        with open(path, 'wb') as f:
+            f.write(compressed[:len(compressed) // 2])
+        cursor = TailCursor(path, fastq_boundary, chunk_size=4096)
+        first = b''.join(cursor.poll())
+        assert 0 < first.count(b'\n') < 8000 and first.count(b'\n') % 4 == 0
+        with open(path, 'wb') as f:
+            f.write(compressed)
+        assert first + b''.join(cursor.poll()) == b''.join(records)
+    finally:
+        os.unlink(path)
@@ -0,0 +1,173 @@
+"""
+Tests for vectorised FASTQ trimming and filtering.
+"""
+
+import gzip
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.fastaq import FastqReader
+from formats import trimming
+from formats.trimming import AdapterIndex, FastqTrimmer, quality_3p_cut, sliding_window_cut
+
+ADAPTER = 'AGATCGGAAGAGCACACGTCTGAACTCCAGTCA'
+
+
+def bwa_trim(qualities, cutoff):
+    """Скалярный алгоритм BWA для сравнения."""
+    total, best, best_index = 0, 0, len(qualities)
+    for i in range(len(qualities) - 1, -1, -1):
+        total += cutoff - qualities[i]
+        if total < 0:
+            break
+        if total > best:
+            best, best_index = total, i
+    return best_index
+
+
+def window_trim(qualities, window, threshold):
+    for i in range(len(qualities) - window + 1):
+        if sum(qualities[i:i + window]) < threshold * window:
+            return i
+    return len(qualities)
+
+
+def random_qualities(rng, count=300, width=60):
+    rows = [[rng.choice((2, 10, 20, 30, 38)) for _ in range(rng.randint(0, width))]
+            for _ in range(count)]
+    lengths = np.array([len(row) for row in rows])
+    matrix = np.zeros((count, width), dtype=np.int16)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return rows, matrix, lengths
+
+
+def test_quality_trimming_matches_scalar():
+    """Векторные обрезки совпадают со скалярными реализациями."""
+    rows, matrix, lengths = random_qualities(random.Random(1))
+    assert quality_3p_cut(matrix, lengths, 20).tolist() == [bwa_trim(r, 20) for r in rows]
+    assert sliding_window_cut(matrix, lengths, 4, 20).tolist() == \
+        [window_trim(r, 4, 20) for r in rows]
+
+
+def test_adapter_index_finds_full_partial_and_mismatched_adapters():
+    """Адаптер находится целиком, с ошибкой, частично на 3'-конце и в димерах."""
+    insert = 'TTGCAGCTTACCGGATTACA'
+    reads = [insert + ADAPTER[:30],                      # полный
+             insert + ADAPTER[:12] + 'T' + ADAPTER[13:30],  # одно несовпадение
+             insert + ADAPTER[:5],                       # частичный, короче затравки
+             ADAPTER[3:33],                              # рид начинается внутри адаптера
+             insert * 2]                                 # без адаптера
+    lengths = np.array([len(r) for r in reads])
+    matrix = np.zeros((len(reads), lengths.max()), dtype=np.uint8)
+    for i, read in enumerate(reads):
+        matrix[i, :len(read)] = np.frombuffer(read.encode(), dtype=np.uint8)
+    cut = AdapterIndex([ADAPTER]).locate(matrix, lengths)
+    assert cut.tolist() == [20, 20, 20, 0, 40]
+    # Soft-masked (строчные) основания ридов совпадают с адаптером
+    lower = np.zeros_like(matrix)
+    for i, read in enumerate(reads):
+        lower[i, :len(read)] = np.frombuffer(read.lower().encode(), dtype=np.uint8)
+    assert AdapterIndex([ADAPTER.lower()]).locate(lower, lengths).tolist() == cut.tolist()
+
+
+def brute_force_cut(read, adapter, max_error_rate=0.1, min_overlap=3):
+    """Самое левое начало адаптера в риде перебором (без начал до рида)."""
+    for start in range(len(read) - min_overlap + 1):
+        overlap = min(len(adapter), len(read) - start)
+        mismatches = sum(a != b for a, b in zip(read[start:], adapter))
+        if mismatches <= int(max_error_rate * overlap):
+            return start
+    return len(read)
+
+
+def test_seeds_cover_every_allowed_mismatch():
+    """Адаптер с допустимым числом несовпадений в любой позиции находится всегда."""
+    adapter = 'AGATCGGAAGAGC'
+    read = 'GGATTGCCGTGGGGGGGGAGATCGTAAGAGCCACGC'
+    matrix = np.frombuffer(read.encode(), dtype=np.uint8)[None, :]
+    assert AdapterIndex([adapter]).locate(matrix, np.array([len(read)])).tolist() == [18]
+
+    # Длинный адаптер: частичные хвосты с ошибками ищутся по короткой затравке
+    for adapter, seed in ((adapter, 3), (ADAPTER, 5)):
+        rng = random.Random(seed)
+        reads = []
+        for _ in range(400):
+            insert = ''.join(rng.choice('CT') for _ in range(rng.randint(0, 30)))
+            tail = list(adapter[:rng.randint(3, len(adapter))])
+            for _ in range(int(0.1 * len(tail))):
+                position = rng.randrange(len(tail))
+                tail[position] = 'ACGT'[('ACGT'.index(tail[position]) + 1) % 4]
+            reads.append(insert + ''.join(tail))
+        lengths = np.array([len(r) for r in reads])
+        matrix = np.zeros((len(reads), lengths.max()), dtype=np.uint8)
+        for i, r in enumerate(reads):
+            matrix[i, :len(r)] = np.frombuffer(r.encode(), dtype=np.uint8)
+        assert AdapterIndex([adapter]).locate(matrix, lengths).tolist() == \
+            [brute_force_cut(r, adapter) for r in reads]
+
+
+def test_length_groups_do_not_change_results(monkeypatch):
+    """Разбиение блока на группы по длине даёт тот же результат, что и одна матрица."""
+    rng = random.Random(6)
+    sequences, qualities = [], []
+    for _ in range(500):
+        insert = ''.join(rng.choice('ACGTN') for _ in range(rng.choice((5, 40, 300, 2000))))
+        sequence = (insert + ADAPTER)[:rng.randint(0, len(insert) + 20)].encode()
+        sequences.append(sequence)
+        qualities.append(bytes(33 + rng.choice((5, 20, 35)) for _ in sequence))
+    trimmer = FastqTrimmer(adapters=[ADAPTER], window_quality=15, max_expected_errors=5,
+                           max_n_fraction=0.1)
+    lengths, keep, counts = trimmer.evaluate(sequences, qualities)
+    monkeypatch.setattr(trimming, 'BLOCK_CELLS', 1 << 40)
+    single_lengths, single_keep, single_counts = trimmer.evaluate(sequences, qualities)
+    assert lengths.tolist() == single_lengths.tolist()
+    assert keep.tolist() == single_keep.tolist() and counts == single_counts
+    monkeypatch.setattr(trimming, 'BLOCK_CELLS', 64)
+    assert trimmer.evaluate(sequences, qualities)[0].tolist() == lengths.tolist()
+    assert trimmer.evaluate([], [])[2] == [0] * len(trimming.REPORT_FIELDS)
+
+
+def test_trim_file_parallel_gzip():
+    """Файл обрабатывается одинаково в процессе и в пуле, результат — gzip FASTQ."""
+    rng = random.Random(2)
+    records = []
+    for i in range(2000):
+        insert = ''.join(rng.choice('ACGT') for _ in range(rng.randint(30, 80)))
+        sequence = (insert + ADAPTER)[:100]
+        if i % 50 == 0:
+            sequence = 'N' * 40 + sequence[40:]
+        quality = ''.join(chr(33 + (5 if rng.random() < 0.05 else 35)) for _ in sequence)
+        records.append(f"@read{i}\n{sequence}\n+\n{quality}\n")
+    handle, path = tempfile.mkstemp(suffix='.fastq')
+    with os.fdopen(handle, 'w') as f:
+        f.write(''.join(records))
+    outputs = [path + '.serial.fastq.gz', path + '.parallel.fastq.gz']
+    try:
+        options = dict(adapters=[ADAPTER], min_length=20, max_expected_errors=5,
+                       max_n_fraction=0.1, window_quality=15)
+        reader = FastqReader(path)
+        report = reader.trim(outputs[0], **options)
+        parallel = FastqTrimmer(**options).run(path, outputs[1], workers=2, batch_bytes=20000)
+        assert report.as_dict() == parallel.as_dict()
+        with gzip.open(outputs[0], 'rb') as first, gzip.open(outputs[1], 'rb') as second:
+            content = first.read()
+            assert content == second.read()
+        lines = content.decode().splitlines()
+        assert len(lines) == 4 * report.reads_out
+        assert report.reads_in == 2000 and report.too_many_n == 40
+        assert report.reads_in == report.reads_out + report.too_short + \
+            report.too_many_errors + report.too_many_n
+        assert report.adapter_trimmed > 1500
+        assert all(ADAPTER[:10] not in seq for seq in lines[1::4])
+        assert all(len(s) == len(q) >= 20 for s, q in zip(lines[1::4], lines[3::4]))
+    finally:
+        for p in [path] + outputs:
+            if os.path.exists(p):
+                os.unlink(p)
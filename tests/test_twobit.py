@@ -0,0 +1,59 @@
+"""
+Tests for packed 2-bit sequence store.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.twobit import PackedSequence, TwoBitFile, fasta_to_twobit
+
+SEQUENCE = "NNACGTACGTacgtaaTTGGCCNNNNgattaca"
+COMPLEMENT = str.maketrans('ACGTNacgtn', 'TGCANtgcan')
+
+
+class TestPackedSequence:
+    """Тесты для PackedSequence."""
+
+    def test_roundtrip_and_slicing(self):
+        """Упаковка и распаковка сохраняют N и soft-masking."""
+        packed = PackedSequence.from_string(SEQUENCE)
+        assert str(packed) == SEQUENCE
+        assert len(packed) == len(SEQUENCE)
+        assert str(packed[5:20]) == SEQUENCE[5:20]
+        assert packed[-1] == SEQUENCE[-1]
+
+    def test_reverse_complement_view(self):
+        """Обратно-комплементарный вид и срезы от него."""
+        packed = PackedSequence.from_string(SEQUENCE)
+        expected = SEQUENCE.translate(COMPLEMENT)[::-1]
+        assert str(packed.reverse_complement()) == expected
+        assert str(packed.reverse_complement()[3:17]) == expected[3:17]
+
+    def test_base_counts(self):
+        """Подсчет состава через префиксные суммы."""
+        packed = PackedSequence.from_string(SEQUENCE)
+        region = SEQUENCE[2:30].upper()
+        counts = packed.base_counts(2, 30)
+        assert counts == {base: region.count(base) for base in 'ACGTN'}
+        assert packed.masked_count() == sum(ch.islower() for ch in SEQUENCE)
+
+
+def test_twobit_file_roundtrip():
+    """Запись в .2bit и чтение через memory map."""
+    directory = tempfile.mkdtemp()
+    fasta_path = os.path.join(directory, 'ref.fasta')
+    twobit_path = os.path.join(directory, 'ref.2bit')
+    with open(fasta_path, 'w') as f:
+        f.write(">chr1 first\n" + SEQUENCE[:20] + "\n" + SEQUENCE[20:] + "\n>chr2\nACGT\n")
+    try:
+        assert fasta_to_twobit(fasta_path, twobit_path) == 2
+        with TwoBitFile(twobit_path) as genome:
+            assert genome.names() == ['chr1', 'chr2']
+            assert str(genome['chr1']) == SEQUENCE
+            assert genome.sequence_sizes() == {'chr1': len(SEQUENCE), 'chr2': 4}
+    finally:
+        os.unlink(fasta_path)
+        os.unlink(twobit_path)
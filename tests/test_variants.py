@@ -0,0 +1,163 @@
+"""
+Tests for variant normalisation, allele keys and VCF set operations.
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from formats.batch import RecordBatch
+from formats.variants import (VariantSets, join_keys, normalize_allele, normalize_variants,
+                              variant_keys)
+from formats.vcf import Vcfreader
+
+HEADER = ("##fileformat=VCFv4.2\n##contig=<ID=chr1,length=300>\n##contig=<ID=chr2,length=300>\n"
+          "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+
+
+def random_reference(length, seed):
+    """Референс с короткими тандемными повторами, чтобы indel было куда сдвигать."""
+    rng = random.Random(seed)
+    parts = []
+    while sum(map(len, parts)) < length:
+        unit = ''.join(rng.choice('ACGT') for _ in range(rng.randint(1, 3)))
+        parts.append(unit * rng.randint(1, 5))
+    return ''.join(parts)[:length]
+
+
+def leftmost(reference, start, deleted, inserted):
+    """Перебором: самая левая запись VCF для indel с тем же гаплотипом."""
+    haplotype = reference[:start] + inserted + reference[start + deleted:]
+    for p in range(1, start + 1):
+        if deleted:
+            if reference[:p] + reference[p + deleted:] == haplotype:
+                return p, reference[p - 1:p + deleted], reference[p - 1]
+        else:
+            candidate = haplotype[p:p + len(inserted)]
+            if reference[:p] + candidate + reference[p:] == haplotype:
+                return p, reference[p - 1], reference[p - 1] + candidate
+    raise AssertionError("нет якорного основания")
+
+
+def write(text):
+    handle, path = tempfile.mkstemp(suffix='.vcf')
+    with os.fdopen(handle, 'w') as f:
+        f.write(text)
+    return path
+
+
+def test_indels_are_left_aligned_like_brute_force():
+    """Любое представление indel в повторе сдвигается в одну самую левую запись."""
+    rng = random.Random(5)
+    reference = random_reference(400, 5)
+    fetch = lambda start, end: reference[max(0, start):end]
+    for _ in range(300):
+        start = rng.randint(80, 380)
+        if rng.random() < 0.5:
+            deleted, inserted = rng.randint(1, 4), ''
+        else:
+            deleted = 0
+            inserted = ''.join(rng.choice('ACGT') for _ in range(rng.randint(1, 4)))
+        expected = leftmost(reference, start, deleted, inserted)
+        # Запись справа, с лишним общим контекстом с обеих сторон
+        right = start + deleted + 2
+        ref = reference[start - 2:right]
+        alt = reference[start - 2:start] + inserted + reference[start + deleted:right]
+        assert normalize_allele(start - 1, ref, alt, fetch) == expected
+        assert normalize_allele(*expected, fetch) == expected
+    assert normalize_allele(10, 'CAG', 'CTG') == (11, 'A', 'T')
+    assert normalize_allele(10, 'A', '<DEL>', fetch) == (10, 'A', '<DEL>')
+
+
+def test_multiallelic_split_and_keys():
+    """Мультиаллельная запись разбивается, ключи точны и упорядочены по позиции."""
+    batch = RecordBatch({'CHROM': ['chr1', 'chr2'], 'POS': np.array([5, 3]),
+                         'REF': ['GCA', 'T'], 'ALT': ['GA,GCAA', 'C'], 'ID': ['x', 'y']})
+    reference = {'chr1': 'TTTTGCAAAT', 'chr2': 'AAT'}
+    result = normalize_variants(batch, reference)
+    assert result['CHROM'] == ['chr1', 'chr1', 'chr2'] and result['ID'] == ['x', 'x', 'y']
+    assert result['POS'].tolist() == [5, 6, 3] and result['ALT_INDEX'].tolist() == [1, 2, 1]
+    assert result['REF'] == ['GC', 'C', 'T'] and result['ALT'] == ['G', 'CA', 'C']
+
+    long_alt = 'A' * 40
+    keys = variant_keys(['chr1', 'chr1', 'chr1', 'chrX', 'chr2'], [7, 7, 7, 1, 2],
+                        ['A', 'A', 'A', 'A', 'A'], ['C', 'AC', long_alt, 'C', 'C'],
+                        contigs=['chr1', 'chr2'])
+    assert len(set(keys.tolist())) == 5
+    assert keys['lo'][2] >> np.uint64(63) == 1 and keys['lo'][0] >> np.uint64(63) == 0
+    assert np.argsort(keys, order=('hi', 'lo')).tolist()[:3] == [0, 1, 2]
+    hashed = variant_keys(['chr1', 'chr1', 'chr1', 'chrX', 'chr2'], [7, 7, 7, 1, 2],
+                          ['A', 'A', 'A', 'A', 'A'], ['C', 'AC', long_alt, 'C', 'C'],
+                          contigs=['chr1', 'chr2'], bits=64)
+    assert hashed.dtype == np.uint64 and len(set(hashed.tolist())) == 5
+
+    left = keys[[0, 1, 1, 4]]
+    right = keys[[1, 3, 0, 1]]
+    left_rows, right_rows = join_keys(left, right)
+    expected = [(i, j) for i in range(4) for j in range(4) if left[i] == right[j]]
+    assert sorted(zip(left_rows.tolist(), right_rows.tolist())) == expected
+
+
+def test_variant_sets_match_python_sets():
+    """Объединение, пересечение и разности совпадают с множествами Python, и при сбросе на диск."""
+    rng = random.Random(11)
+    reference = random_reference(300, 11)
+    handle, fasta = tempfile.mkstemp(suffix='.fa')
+    with os.fdopen(handle, 'w') as f:
+        f.write(f">chr1 test\n{reference}\n>chr2\n{reference[::-1]}\n")
+    fetches = {'chr1': reference, 'chr2': reference[::-1]}
+    pool = []
+    for _ in range(60):
+        chrom = rng.choice(['chr1', 'chr2'])
+        start = rng.randint(10, 280)
+        deleted = rng.randint(0, 2)
+        inserted = '' if deleted else rng.choice('ACGT')
+        pool.append((chrom, start, deleted, inserted))
+    paths = []
+    expected = []
+    try:
+        for _ in range(3):
+            lines, keys = [], []
+            for chrom, start, deleted, inserted in rng.sample(pool, 40):
+                sequence = fetches[chrom]
+                # Один и тот же indel записан в разных местах повтора
+                shift = rng.randint(0, 2)
+                right = start + deleted + shift
+                ref = sequence[start - 1:right]
+                alt = sequence[start - 1:start] + inserted + sequence[start + deleted:right]
+                lines.append((chrom, start, ref, alt))
+                fetch = lambda a, b, s=sequence: s[max(0, a):b]
+                keys.append((chrom,) + normalize_allele(start, ref, alt, fetch))
+            lines.append(lines[0])
+            keys.append(keys[0])
+            lines.sort(key=lambda line: (line[0], line[1]))
+            paths.append(write(HEADER + ''.join(f"{c}\t{p}\t.\t{r}\t{a}\t50\tPASS\t.\n"
+                                                for c, p, r, a in lines)))
+            expected.append(set(keys))
+        sets = VariantSets(paths, reference=fasta, memory_budget=256).build()
+        counts = sets.counts()
+        assert counts['records'] == [41, 41, 41]
+        assert counts['union'] == len(set.union(*expected))
+        assert counts['intersection'] == len(set.intersection(*expected))
+        assert counts['difference'][1] == len(expected[1] - expected[0] - expected[2])
+        assert counts['duplicates'] == [41 - len(keys) for keys in expected]
+        found = set()
+        for source, batch in sets.iter_selected('intersection'):
+            found.update(zip(batch['CHROM'], batch['POS'].tolist(), batch['REF'], batch['ALT']))
+        assert found == set.intersection(*expected)
+        normalized = list(Vcfreader(paths[0]).iter_normalized(fasta, workers=2,
+                                                              batch_bytes=400))
+        assert sum(len(batch) for batch in normalized) == 41
+        assert set(zip(*(RecordBatch.concat(normalized)[name]
+                         for name in ('CHROM', 'POS', 'REF', 'ALT')))) == expected[0]
+        with pytest.raises(ValueError):
+            sets.select('merge')
+    finally:
+        for path in paths + [fasta]:
+            os.unlink(path)